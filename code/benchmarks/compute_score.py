@@ -0,0 +1,79 @@
+## Cost of choosing the transposition weights as the regions get heavier.
+##
+## The weights of a transposition used to be chosen by trying every
+## weight of the heaviest black edge and, for each one, every weight of
+## the last black edge, so a region of weight w cost O(w^2) calls. Now
+## best_transposition_weights and compute_score find the same weights in
+## closed form, and their cost must not depend on w. For comparison we
+## also time the old outer loop, which still calls compute_score once
+## per weight, so it is only run up to a small weight.
+##
+## usage: python3 benchmarks/compute_score.py [weights] [repetitions] [exhaustive up to]
+##     python3 benchmarks/compute_score.py 10,1000,100000,1000000 2000 300
+
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from engine_loader import load_engine
+
+
+## The search the lemmas used to run.
+def exhaustive_search(sorter, gray_ws, black_ws):
+	ws = [[0,0],[0,0],[0,0]]
+	best_score, best_weight, best_black = 100000000000000, 100000000000000, -1
+	for heaviest_black in (0,1,2):
+		for weight in range(0, int(black_ws[heaviest_black])+1):
+			score = sorter.compute_score(gray_ws, black_ws, ws, heaviest_black, weight)
+			if score >= 0 and score < best_score:
+				best_score, best_weight, best_black = score, weight, heaviest_black
+	return best_score, best_weight, best_black
+
+
+def random_regions(weight, count, rng):
+	regions = []
+	for _ in range(count):
+		black_ws = [rng.randint(0, weight) for _ in range(3)]
+		gray_ws  = [rng.randint(0, 2*weight) for _ in range(3)]
+		regions.append((gray_ws, black_ws))
+	return regions
+
+
+def time_search(search, regions):
+	start = time.perf_counter()
+	results = [search(gray_ws, black_ws) for gray_ws, black_ws in regions]
+	return (time.perf_counter() - start) / len(regions), results
+
+
+def main():
+	weights = [10, 100, 1000, 10000, 100000, 1000000]
+	repetitions, exhaustive = 2000, 300
+	if len(sys.argv) > 1:
+		weights = [int(w) for w in sys.argv[1].split(",")]
+	if len(sys.argv) > 2:
+		repetitions = int(sys.argv[2])
+	if len(sys.argv) > 3:
+		exhaustive = int(sys.argv[3])
+
+	engine = load_engine()
+	sorter = engine.Intergenic_Rev.__new__(engine.Intergenic_Rev)
+	rng = random.Random(1501)
+
+	print("%10s %16s %18s" % ("weight", "closed (us)", "exhaustive (us)"))
+	for weight in weights:
+		regions = random_regions(weight, repetitions, rng)
+		closed, results = time_search(sorter.best_transposition_weights, regions)
+		if weight <= exhaustive:
+			regions = regions[:max(1, repetitions // weight)]
+			old, expected = time_search(lambda g, b: exhaustive_search(sorter, g, b), regions)
+			if expected != results[:len(expected)]:
+				print("the closed form disagrees with the exhaustive search")
+			print("%10d %16.2f %18.2f" % (weight, 1e6*closed, 1e6*old))
+		else:
+			print("%10d %16.2f %18s" % (weight, 1e6*closed, "-"))
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,61 @@
+## Cost of writing and reading back the sequences of operations, as
+## the repr of the output line (read back with eval) and as the binary
+## encoding of the engine (encode_operations_text, read back with
+## decode_operations_text).
+##
+## We sort the first instances of an instance file once and then time
+## only the output of their sequences. Reading the encoding is timed
+## twice: opening it (base64 and zlib, after which the Operation_Buffer
+## copies nothing) and turning every record back into a tuple.
+##
+## usage: python3 benchmarks/encoding.py [instance file] [instances] [model]
+##     python3 benchmarks/encoding.py Instances/input/srt_400_0.5.in 20 RT
+
+import os
+import sys
+import time
+import ast
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from engine_loader import load_engine
+
+
+def timed(function, sequences):
+	start = time.perf_counter()
+	results = [function(sequence) for sequence in sequences]
+	return time.perf_counter() - start, results
+
+
+def main():
+	fileinput, instances, model = "Instances/input/srt_400_0.5.in", 20, "RT"
+	if len(sys.argv) > 1:
+		fileinput = sys.argv[1]
+	if len(sys.argv) > 2:
+		instances = int(sys.argv[2])
+	if len(sys.argv) > 3:
+		model = sys.argv[3]
+
+	engine = load_engine()
+	sequences = []
+	with open(fileinput) as file:
+		for number, line in enumerate(file):
+			if number == instances:
+				break
+			pi, bpi, biota = (engine.parse_int_list(text) for text in line.split())
+			sequences.append(engine.sort_genome(pi, bpi, biota, model).operations)
+	operations = sum(len(sequence) for sequence in sequences)
+
+	write_repr, texts = timed(lambda sequence: str(sequence).replace(" ", ""), sequences)
+	read_repr, _ = timed(ast.literal_eval, texts)
+	write_encoded, encoded = timed(engine.encode_operations_text, sequences)
+	open_encoded, buffers = timed(engine.decode_operations_text, encoded)
+	read_encoded, _ = timed(list, buffers)
+
+	print("%d sequences, %d operations" % (len(sequences), operations))
+	print("%10s %12s %12s %14s %12s" % ("", "size (KB)", "write (ms)", "open (ms)", "read (ms)"))
+	print("%10s %12.1f %12.2f %14s %12.2f" % ("repr", sum(map(len, texts)) / 1024, 1e3*write_repr, "-", 1e3*read_repr))
+	print("%10s %12.1f %12.2f %14.2f %12.2f" % ("encoded", sum(map(len, encoded)) / 1024, 1e3*write_encoded, 1e3*open_encoded, 1e3*read_encoded))
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,66 @@
+## Cost of reading the instances of a file, from the text (.in) and
+## from the binary container of binary_instances.py (.bin).
+##
+## The text is split and parsed line by line, as the runner does. The
+## binary file is converted first (if there is no .bin next to the .in
+## file or it is out of date) and then read in two ways: every instance as lists of int, and
+## a single instance k, as a worker does with its chunk, which only
+## maps the file and looks up two offsets per list.
+##
+## usage: python3 benchmarks/instances.py [instance file] [repetitions]
+##     python3 benchmarks/instances.py Instances/input/srt_400_0.5.in 5
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import binary_instances
+
+
+def read_text(fileinput):
+	with open(fileinput) as file:
+		return [[binary_instances.parse_int_list(text) for text in line.split()] for line in file]
+
+
+def read_binary(fileinput):
+	with binary_instances.Instance_File(fileinput) as instances:
+		return list(instances)
+
+
+def read_one(fileinput, k):
+	with binary_instances.Instance_File(fileinput) as instances:
+		return instances[k]
+
+
+def timed(function, repetitions):
+	start = time.perf_counter()
+	for _ in range(repetitions):
+		function()
+	return (time.perf_counter() - start) / repetitions
+
+
+def main():
+	fileinput, repetitions = "Instances/input/srt_400_0.5.in", 5
+	if len(sys.argv) > 1:
+		fileinput = sys.argv[1]
+	if len(sys.argv) > 2:
+		repetitions = int(sys.argv[2])
+
+	binary = binary_instances.binary_path(fileinput)
+	if not binary_instances.up_to_date(fileinput, binary):
+		binary_instances.convert(fileinput, binary)
+	count = len(read_text(fileinput))
+
+	text = timed(lambda: read_text(fileinput), repetitions)
+	every = timed(lambda: read_binary(binary), repetitions)
+	one = timed(lambda: read_one(binary, count // 2), 100 * repetitions)
+
+	print("%d instances, %.1f MB of text, %.1f MB of binary" % (count, os.path.getsize(fileinput) / 2**20, os.path.getsize(binary) / 2**20))
+	print("%24s %12.2f ms" % ("text, every instance", 1e3*text))
+	print("%24s %12.2f ms" % ("binary, every instance", 1e3*every))
+	print("%24s %12.3f ms" % ("binary, one instance", 1e3*one))
+
+
+if __name__ == '__main__':
+	main()
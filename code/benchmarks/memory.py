@@ -0,0 +1,95 @@
+## Peak memory per instance, measured with tracemalloc.
+##
+## For every n with an instance file (Instances/input/t_<n>_<op>.in)
+## we sort the first instances of the file and report the mean and the
+## largest peak of the sort. A synthetic genome with 100000 genes is
+## too large to be sorted here, so for it we only build the graph and
+## compute its cycles, which is what a worker holds for the whole sort.
+##
+## usage: python3 benchmarks/memory.py [instances] [backends] [synthetic n] [op]
+##     python3 benchmarks/memory.py 5 list,tree 100000 0.5
+
+import sys
+import os
+import random
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from engine_loader import load_engine
+
+
+## Peak of the traced memory while running function(), not counting
+## what was allocated before.
+def peak_bytes(function):
+	tracemalloc.reset_peak()
+	before = tracemalloc.get_traced_memory()[0]
+	result = function()
+	peak = tracemalloc.get_traced_memory()[1] - before
+	return peak, result
+
+
+def instance_peaks(engine, fileinput, instances, backend):
+	peaks = []
+	with open(fileinput) as file:
+		for number, line in enumerate(file):
+			if number == instances:
+				break
+			pi, bpi, biota = (engine.parse_int_list(text) for text in line.split())
+			model = "T" if os.path.basename(fileinput).startswith("t_") else "RT"
+			peak, _ = peak_bytes(lambda: engine.sort_genome(pi, bpi, biota, model, backend = backend))
+			peaks.append(peak)
+	return peaks
+
+
+def synthetic_peak(engine, n, backend):
+	rng = random.Random(n)
+	pi = list(range(1, n+1))
+	rng.shuffle(pi)
+	breve_pi   = [rng.randint(0, 100) for _ in range(n+1)]
+	breve_iota = [rng.randint(0, 100) for _ in range(n+1)]
+	config, grayw, blackw = engine.construct_str_cycle(pi, breve_iota, breve_pi)
+
+	def build():
+		graph = engine.GRAPH_BACKENDS[backend](config, grayw, blackw, n+1)
+		graph.calculate_cycles()
+		return graph
+
+	peak, graph = peak_bytes(build)
+	return peak
+
+
+def main():
+	instances, backends, synthetic, op = 5, ["list", "tree"], 100000, "0.5"
+	if len(sys.argv) > 1:
+		instances = int(sys.argv[1])
+	if len(sys.argv) > 2:
+		backends = sys.argv[2].split(",")
+	if len(sys.argv) > 3:
+		synthetic = int(sys.argv[3])
+	if len(sys.argv) > 4:
+		op = sys.argv[4]
+
+	engine = load_engine()
+	tracemalloc.start()
+
+	print("%8s %8s %16s %16s" % ("n", "backend", "mean peak (KB)", "max peak (KB)"))
+	for n in range(50, 501, 50):
+		fileinput = "Instances/input/t_%d_%s.in" % (n, op)
+		if not os.path.exists(fileinput):
+			continue
+		for backend in backends:
+			peaks = instance_peaks(engine, fileinput, instances, backend)
+			print("%8d %8s %16.1f %16.1f" % (n, backend, sum(peaks) / len(peaks) / 1024, max(peaks) / 1024))
+
+	if synthetic:
+		print()
+		print("%8s %8s %16s" % ("n", "backend", "graph peak (MB)"))
+		for backend in backends:
+			peak = synthetic_peak(engine, synthetic, backend)
+			print("%8d %8s %16.1f" % (synthetic, backend, peak / 1024 / 1024))
+
+	tracemalloc.stop()
+
+
+if __name__ == '__main__':
+	main()
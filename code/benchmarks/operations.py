@@ -0,0 +1,92 @@
+## Cost of one rearrangement on the cycle graph as the genome grows.
+##
+## Each operation finds its black edges in the positions index and
+## renumbers only the nodes it moves, so with segments of a fixed width
+## the cost per operation must stay flat. For comparison, we also time
+## one walk over the whole graph (reset_indices), which every operation
+## used to pay twice: once to find its black edges and once to renumber
+## the nodes.
+##
+## With the tree backend (tree_configuration_graph) the cost no longer
+## depends on the width of the segments either, so wide segments on a
+## large genome show the difference between the two backends.
+##
+## usage: python3 benchmarks/operations.py [sizes] [width] [ops] [backend]
+##     python3 benchmarks/operations.py 50,500,5000,50000 8 2000
+##     python3 benchmarks/operations.py 10000,100000 2000 500 tree
+
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from engine_loader import load_engine
+
+
+def random_graph(engine, n, rng, backend = "list"):
+	pi = list(range(1, n+1))
+	rng.shuffle(pi)
+	breve_pi   = [rng.randint(0, 100) for _ in range(n+1)]
+	breve_iota = [rng.randint(0, 100) for _ in range(n+1)]
+	config, grayw, blackw = engine.construct_str_cycle(pi, breve_iota, breve_pi)
+	return engine.GRAPH_BACKENDS[backend](config, grayw, blackw, n+1)
+
+
+def time_operations(graph, width, ops, rng):
+	positions = []
+	for _ in range(ops):
+		i = rng.randint(1, graph.n - 2*width - 1)
+		positions.append(i)
+
+	start = time.perf_counter()
+	for i in positions:
+		graph.transposition2(i, i + width, i + 2*width, [0], [0], [0])
+	transposition = (time.perf_counter() - start) / ops
+
+	start = time.perf_counter()
+	for i in positions:
+		graph.reversal2(i, i + width, 0, 0, [0], [0])
+	reversal = (time.perf_counter() - start) / ops
+
+	start = time.perf_counter()
+	for i in positions:
+		graph.indel(1, i, 0, [], [1])
+	indel = (time.perf_counter() - start) / ops
+
+	return transposition, reversal, indel
+
+
+def time_walk(graph, repetitions = 5):
+	start = time.perf_counter()
+	for _ in range(repetitions):
+		graph.reset_indices()
+	return (time.perf_counter() - start) / repetitions
+
+
+def main():
+	sizes = [50, 500, 5000, 50000]
+	width, ops = 8, 2000
+	backend = "list"
+	if len(sys.argv) > 1:
+		sizes = [int(n) for n in sys.argv[1].split(",")]
+	if len(sys.argv) > 2:
+		width = int(sys.argv[2])
+	if len(sys.argv) > 3:
+		ops = int(sys.argv[3])
+	if len(sys.argv) > 4:
+		backend = sys.argv[4]
+
+	engine = load_engine()
+	rng = random.Random(1501)
+
+	print("%8s %14s %14s %14s %14s" % ("n", "transp (us)", "rev (us)", "indel (us)", "walk (us)"))
+	for n in sizes:
+		graph = random_graph(engine, n, rng, backend)
+		transposition, reversal, indel = time_operations(graph, width, ops, rng)
+		walk = time_walk(graph)
+		print("%8d %14.2f %14.2f %14.2f %14.2f" % (n, 1e6*transposition, 1e6*reversal, 1e6*indel, 1e6*walk))
+
+
+if __name__ == '__main__':
+	main()
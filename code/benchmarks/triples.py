@@ -0,0 +1,74 @@
+## Cost of finding the transposition triples of a long cycle.
+##
+## find_all_triples and find_all_triples_two_adj yield their triples one
+## at a time, so a lemma that takes the first one pays for it alone,
+## and the triples with two adjacent black edges are enumerated
+## directly, O(k^2) on a cycle with k black edges. For comparison we
+## also time the old way of building every triple of the cycle, O(k^3),
+## and keeping the ones with two adjacent edges.
+##
+## usage: python3 benchmarks/triples.py [genome sizes] [repetitions]
+##     python3 benchmarks/triples.py 50,100,200,400 3
+
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from engine_loader import load_engine
+
+
+## The longest cycle of the graph of a random permutation of n genes.
+def long_cycle(engine, n, rng):
+	pi = list(range(1, n+1))
+	rng.shuffle(pi)
+	config, grayw, blackw = engine.construct_str_cycle(pi, [0] * (n+1), [0] * (n+1))
+	graph = engine.cycle_configuration_graph(config, grayw, blackw, n+1)
+	graph.calculate_cycles()
+	_, vertices = graph.get_cycles(want_vertices = True)
+	return max(vertices, key = len)
+
+
+## The search the lemmas used to run: every triple of the cycle, then a
+## filter for the two adjacent edges.
+def all_triples_two_adj(sorter, cycle):
+	triples = []
+	for i, j, k in list(sorter.find_all_triples(cycle)):
+		if i == k.ap.ac or j == i.ap.ac or k == j.ap.ac:
+			triples.append([i, j, k])
+	return triples
+
+
+def timed(function, repetitions):
+	start = time.perf_counter()
+	for _ in range(repetitions):
+		result = function()
+	return (time.perf_counter() - start) / repetitions, result
+
+
+def main():
+	sizes, repetitions = [50, 100, 200, 400], 3
+	if len(sys.argv) > 1:
+		sizes = [int(n) for n in sys.argv[1].split(",")]
+	if len(sys.argv) > 2:
+		repetitions = int(sys.argv[2])
+
+	engine = load_engine()
+	sorter = engine.Intergenic_Rev.__new__(engine.Intergenic_Rev)
+	rng = random.Random(1501)
+
+	print("%8s %8s %14s %14s %16s %16s" % ("n", "k", "first (ms)", "all (ms)", "two adj (ms)", "old two adj (ms)"))
+	for n in sizes:
+		cycle = long_cycle(engine, n, rng)
+		first, _ = timed(lambda: next(sorter.find_all_triples(cycle), None), repetitions)
+		every, _ = timed(lambda: list(sorter.find_all_triples(cycle)), repetitions)
+		adjacent, triples = timed(lambda: list(sorter.find_all_triples_two_adj(cycle)), repetitions)
+		old, expected = timed(lambda: all_triples_two_adj(sorter, cycle), repetitions)
+		if triples != expected:
+			print("the triples with two adjacent edges differ from the old ones")
+		print("%8d %8d %14.3f %14.3f %16.3f %16.3f" % (n, len(cycle) // 2, 1e3*first, 1e3*every, 1e3*adjacent, 1e3*old))
+
+
+if __name__ == '__main__':
+	main()
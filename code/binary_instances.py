@@ -0,0 +1,181 @@
+## Binary container for the instance files (Instances/input/*.in).
+##
+## A .in file has one instance per line: pi, breve_pi and breve_iota
+## as comma-separated lists. The .bin file keeps the same instances as
+## three arrays of integers, with all the lists of each kind one after
+## the other, and a table with the offset of every list, so an instance
+## is read with two lookups and no parsing:
+##     header  : b"GIN2", the typecodes of the three arrays ("h" if all
+##               of its values fit in 16 bits, "i" otherwise), one
+##               padding byte, the number of instances (count), and
+##               the size and the modification time (ns) of the .in
+##               file it was converted from (0 if there is none);
+##     offsets : three tables of count+1 int64, one per array, where
+##               the k-th list goes from offsets[k] to offsets[k+1];
+##     arrays  : pi, breve_pi and breve_iota, each one padded to a
+##               multiple of 8 bytes.
+## Everything is little-endian. The lists are parsed by the engine
+## (parse_int_list), as the runner parses the lines of a .in file, and
+## up_to_date tells whether a .bin file still matches its .in file, as
+## line_index.py does for its index.
+##
+## usage: python3 binary_instances.py [.in files]
+##     python3 binary_instances.py Instances/input/*.in
+## writes Instances/input/t_50_0.1.bin and so on, next to each .in file.
+
+import os
+import sys
+import mmap
+import array
+import struct
+
+from engine_loader import load_engine
+
+HEADER = struct.Struct("<4s3sxQQQ")
+MAGIC  = b"GIN2"
+
+engine = None
+
+def parse_int_list(text):
+	global engine
+	if engine is None:
+		engine = load_engine()
+	return engine.parse_int_list(text)
+
+
+def typecode(values):
+	if all(-32768 <= value <= 32767 for value in values):
+		return "h"
+	return "i"
+
+
+def binary_path(path):
+	if path.endswith(".in"):
+		path = path[:-3]
+	return path + ".bin"
+
+
+## Writes the instances, a list of (pi, breve_pi, breve_iota) lists,
+## to the given path. The source is the (size, modification time) of
+## the .in file they were read from.
+def write_instances(path, instances, source = (0, 0)):
+	columns = []
+	for column in range(3):
+		values, offsets = [], array.array("q", [0])
+		for instance in instances:
+			values.extend(instance[column])
+			offsets.append(len(values))
+		columns.append((array.array(typecode(values), values), offsets))
+
+	codes = "".join(values.typecode for values, _ in columns).encode("ascii")
+	with open(path, "wb") as out:
+		out.write(HEADER.pack(MAGIC, codes, len(instances), *source))
+		for values, offsets in columns:
+			if sys.byteorder == "big":
+				offsets.byteswap()
+			out.write(offsets.tobytes())
+		for values, offsets in columns:
+			if sys.byteorder == "big":
+				values.byteswap()
+			data = values.tobytes()
+			out.write(data + bytes(-len(data) % 8))
+
+
+## Converts a .in file to the binary container and returns the number
+## of instances.
+def convert(fileinput, output = None):
+	status = os.stat(fileinput)
+	instances = []
+	with open(fileinput) as file:
+		for number, line in enumerate(file, 1):
+			fields = line.split()
+			if not fields:
+				continue
+			if len(fields) < 3:
+				raise ValueError("line %d of %s is not an instance" % (number, fileinput))
+			instances.append([parse_int_list(text) for text in fields[:3]])
+	write_instances(output or binary_path(fileinput), instances, (status.st_size, status.st_mtime_ns))
+	return len(instances)
+
+
+## Whether the binary file exists and was converted from the .in file
+## as it is now (same size and modification time).
+def up_to_date(fileinput, binary = None):
+	binary = binary or binary_path(fileinput)
+	if not os.path.exists(binary):
+		return False
+	with open(binary, "rb") as file:
+		header = file.read(HEADER.size)
+	if len(header) < HEADER.size or header[:4] != MAGIC:
+		return False
+	_, _, _, size, mtime = HEADER.unpack(header)
+	status = os.stat(fileinput)
+	return (size, mtime) == (status.st_size, status.st_mtime_ns)
+
+
+## A .bin file mapped in memory. Nothing is read when it is opened: the
+## offsets and the arrays are memoryviews of the map, and instance k is
+## looked up only when it is asked for. arrays(k) gives the three lists
+## as memoryviews, without copying them, and instance(k) (or
+## instances[k]) as lists of int, ready for sort_genome.
+class Instance_File:
+	def __init__(self, path):
+		with open(path, "rb") as file:
+			self.map = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+		view = memoryview(self.map)
+		magic, codes, count, _, _ = HEADER.unpack_from(view)
+		if magic != MAGIC:
+			raise ValueError("%s is not a binary instance file" % path)
+		if sys.byteorder == "big":
+			raise ValueError("binary instance files are little-endian")
+
+		self.count   = count
+		self.offsets = []
+		place = HEADER.size
+		for _ in range(3):
+			self.offsets.append(view[place:place + 8*(count+1)].cast("q"))
+			place += 8*(count+1)
+
+		self.columns = []
+		for code, offsets in zip(codes.decode("ascii"), self.offsets):
+			size = array.array(code).itemsize * offsets[count]
+			self.columns.append(view[place:place + size].cast(code))
+			place += size + (-size % 8)
+
+	def __len__(self):
+		return self.count
+
+	def arrays(self, k):
+		if not 0 <= k < self.count:
+			raise IndexError(k)
+		return tuple(column[offsets[k]:offsets[k+1]] for column, offsets in zip(self.columns, self.offsets))
+
+	def instance(self, k):
+		return tuple(values.tolist() for values in self.arrays(k))
+
+	def __getitem__(self, k):
+		return self.instance(k)
+
+	def __iter__(self):
+		for k in range(self.count):
+			yield self.instance(k)
+
+	def close(self):
+		self.offsets, self.columns = [], []
+		self.map.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exception):
+		self.close()
+
+
+def main():
+	for fileinput in sys.argv[1:]:
+		count = convert(fileinput)
+		print("%s -> %s (%d instances)" % (fileinput, binary_path(fileinput), count))
+
+
+if __name__ == '__main__':
+	main()
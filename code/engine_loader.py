@@ -0,0 +1,20 @@
+## Loads the engine for the runner, binary_instances.py and the benchmarks.
+##
+## The engine file name has hyphens, so it cannot be imported with a
+## plain import statement. We load it from its path once and reuse
+## the module for every instance. The path is relative to the code
+## directory, where the runner and the benchmarks are run from.
+##
+## usage: from engine_loader import load_engine
+## (the benchmarks put the code directory in sys.path first)
+
+import importlib.util
+
+ENGINE = "unweighted/r-t-rt-indel-intergenic.py"
+
+
+def load_engine(path = ENGINE):
+	spec = importlib.util.spec_from_file_location("intergenic", path)
+	engine = importlib.util.module_from_spec(spec)
+	spec.loader.exec_module(engine)
+	return engine
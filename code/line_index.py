@@ -0,0 +1,137 @@
+## Sidecar index of the lines of an instance file (Instances/input/*.in).
+##
+## The index of t_500_1.in is t_500_1.in.idx: the byte offset where
+## each instance line starts, plus the size of the file, so the lines
+## start, ..., stop-1 are the bytes offsets[start] to offsets[stop] of
+## the file. A worker reads only the bytes of its own lines, a run can
+## resume at instance k and any instance can be read right away:
+##     header  : b"LIX1", four padding bytes, the number of lines, and
+##               the size and the modification time (ns) of the file
+##               when the index was built;
+##     offsets : number of lines + 1 int64.
+## Everything is little-endian. Blank lines are not indexed (a range
+## of lines may still contain them, lines() skips them). The index is
+## built in one pass over the mapped file when it is first needed and
+## again whenever the size or the modification time of the file change.
+##
+## usage: python3 line_index.py [.in files]
+##     python3 line_index.py Instances/input/*.in
+
+import os
+import sys
+import mmap
+import array
+import struct
+
+HEADER = struct.Struct("<4s4xQQQ")
+MAGIC  = b"LIX1"
+
+
+def index_path(path):
+	return path + ".idx"
+
+
+## Offsets of the lines of the mapped file, in an array("q").
+def line_offsets(data):
+	offsets = array.array("q")
+	size, place = len(data), 0
+	while place < size:
+		end = data.find(b"\n", place)
+		if end < 0:
+			end = size
+		if data[place:end].strip():
+			offsets.append(place)
+		place = end + 1
+	offsets.append(size)
+	return offsets
+
+
+## Builds the index of the given file and returns the number of lines.
+def build_index(path, output = None):
+	status = os.stat(path)
+	if status.st_size:
+		with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ) as data:
+			offsets = line_offsets(data)
+	else:
+		offsets = array.array("q", [0])
+
+	if sys.byteorder == "big":
+		offsets.byteswap()
+	with open(output or index_path(path), "wb") as out:
+		out.write(HEADER.pack(MAGIC, len(offsets) - 1, status.st_size, status.st_mtime_ns))
+		out.write(offsets.tobytes())
+	return len(offsets) - 1
+
+
+def read_index(path):
+	with open(index_path(path), "rb") as file:
+		data = file.read()
+	magic, count, size, mtime = HEADER.unpack_from(data)
+	if magic != MAGIC:
+		raise ValueError("%s is not a line index" % index_path(path))
+	offsets = array.array("q")
+	offsets.frombytes(data[HEADER.size:HEADER.size + 8*(count+1)])
+	if sys.byteorder == "big":
+		offsets.byteswap()
+	return size, mtime, offsets
+
+
+## An instance file with its index, building the index first if it is
+## missing or out of date. The file is mapped, so only the lines that
+## are asked for are read.
+class Line_Index:
+	def __init__(self, path):
+		self.path = path
+		status = os.stat(path)
+		if os.path.exists(index_path(path)):
+			size, mtime, offsets = read_index(path)
+		if not os.path.exists(index_path(path)) or (size, mtime) != (status.st_size, status.st_mtime_ns):
+			build_index(path)
+			size, mtime, offsets = read_index(path)
+		self.offsets = offsets
+
+		self.map = None
+		if size:
+			with open(path, "rb") as file:
+				self.map = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+
+	def __len__(self):
+		return len(self.offsets) - 1
+
+	## Bytes of the lines start, ..., stop-1 in the file.
+	def byte_range(self, start, stop):
+		stop = min(stop, len(self))
+		start = min(start, stop)
+		return self.offsets[start], self.offsets[stop]
+
+	def lines(self, start, stop):
+		begin, end = self.byte_range(start, stop)
+		if begin == end:
+			return []
+		text = self.map[begin:end].decode("ascii")
+		return [line for line in text.splitlines() if line.strip()]
+
+	def line(self, k):
+		if not 0 <= k < len(self):
+			raise IndexError(k)
+		return self.lines(k, k+1)[0]
+
+	def close(self):
+		if self.map:
+			self.map.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exception):
+		self.close()
+
+
+def main():
+	for fileinput in sys.argv[1:]:
+		count = build_index(fileinput)
+		print("%s -> %s (%d lines)" % (fileinput, index_path(fileinput), count))
+
+
+if __name__ == '__main__':
+	main()
@@ -1,35 +1,297 @@
 import sys
 import os
+import io
+import json
+import argparse
+import contextlib
+import traceback
+import multiprocessing
+
+import binary_instances
+import line_index
+import stats
+from engine_loader import ENGINE, load_engine
 
 operations = [0.1, 0.3, 0.5, 1]
 qtd = 1000
 
-os.system("mkdir -p output-unweighted")
 
-for n in range(50, 501, 50):
-	for op in operations:
-		for model in ["T"]:
-			fileinput = "Instances/input/%s_%s_%s.in" % (model.lower(), n, op)
-			output = "output-unweighted/%s_%s_%s.out" % (model.lower(), n, op)
+def instance_files():
+	for n in range(50, 501, 50):
+		for op in operations:
+			for model in ["T"]:
+				fileinput = "Instances/input/%s_%s_%s.in" % (model.lower(), n, op)
+				output = "output-unweighted/%s_%s_%s.out" % (model.lower(), n, op)
+				yield model, fileinput, output
 
-			with open(fileinput) as file:
+	for n in range(50, 501, 50):
+		for op in operations:
+			for model in ["RT"]:
+				fileinput = "Instances/input/%s_%s_%s.in" % ("s"+model.lower(), n, op)
+				output = "output-unweighted/%s_%s_%s.out" % ("s"+model.lower(), n, op)
+				yield model, fileinput, output
+
+
+## One python process per instance, as the experiments were first run.
+def run_file_subprocess(model, fileinput, output, backend = "list", distance_only = False, encoded = False, profile = False, timing = False):
+	flag = (" --distance" if distance_only else "") + (" --encoded" if encoded else "") + (" --profile" if profile else "") + (" --timing" if timing else "")
+	with open(fileinput) as file:
+		for line in file:
+			pi, bpi, biota = line.split()
+
+			command = "python3 %s --backend %s%s -- %s %s %s %s >> %s" % (ENGINE, backend, flag, pi, bpi, biota, model, output)
+			print(command)
+			os.system(command)
+
+
+## Sorts the given instance lines in this process. The engine prints
+## the result line (or the message of a Sorting_Error), so the caller
+## decides where stdout goes. Any other exception, including a line
+## that is not an instance, is reported on stderr, as a crashing
+## subprocess would, and the run goes on. Blank lines are skipped, as
+## in line_index.py and binary_instances.py. In place of its result
+## the instance gets the line ERROR-CRASH <exception>, so the output
+## keeps one line per instance (see --resume).
+def run_lines(engine, model, lines, backend = "list", distance_only = False, encoded = False, profile = False, timing = False):
+	for line in lines:
+		if not line.strip():
+			continue
+		try:
+			pi, bpi, biota = line.split()[:3]
+			engine.run_instance(pi, bpi, biota, model, backend, distance_only, encoded, profile, timing)
+		except Exception as exception:
+			traceback.print_exc()
+			print("ERROR-CRASH %s" % type(exception).__name__)
+
+
+## As run_lines, for the instances start, ..., stop-1 of a binary
+## instance file (see binary_instances.py), which are read from the
+## mapped file with no parsing.
+def run_binary(engine, model, fileinput, start, stop, backend = "list", distance_only = False, encoded = False, profile = False, timing = False):
+	with binary_instances.Instance_File(fileinput) as instances:
+		for k in range(start, min(stop, len(instances))):
+			pi, bpi, biota = instances[k]
+			try:
+				engine.run_lists(pi, bpi, biota, model, backend, distance_only, encoded, profile, timing)
+			except Exception as exception:
+				traceback.print_exc()
+				print("ERROR-CRASH %s" % type(exception).__name__)
+
+
+## As run_lines, for the lines start, ..., stop-1 of an instance file,
+## which are found with its line index (see line_index.py) so only
+## their bytes are read.
+def run_text(engine, model, fileinput, start, stop, backend = "list", distance_only = False, encoded = False, profile = False, timing = False):
+	with line_index.Line_Index(fileinput) as index:
+		lines = index.lines(start, stop)
+	run_lines(engine, model, lines, backend, distance_only, encoded, profile, timing)
+
+
+## Sorts the instances start, ..., stop-1 of a text or binary instance
+## file.
+def run_range(engine, model, fileinput, start, stop, backend = "list", distance_only = False, encoded = False, profile = False, timing = False):
+	if fileinput.endswith(".bin"):
+		run_binary(engine, model, fileinput, start, stop, backend, distance_only, encoded, profile, timing)
+	else:
+		run_text(engine, model, fileinput, start, stop, backend, distance_only, encoded, profile, timing)
+
+
+## Number of instances of a text or binary instance file.
+def count_instances(fileinput):
+	if fileinput.endswith(".bin"):
+		with binary_instances.Instance_File(fileinput) as instances:
+			return len(instances)
+	with line_index.Line_Index(fileinput) as index:
+		return len(index)
+
+
+## Summary of an output file (see stats.py) kept up to date as its
+## lines are written, starting from the lines already in the file. It
+## is saved as JSON next to the output file (t_50_0.1.summary.json for
+## t_50_0.1.out) every SUMMARY_LINES lines and when the file is done,
+## so the progress of a sweep can be followed while it runs and nobody
+## has to read the outputs again.
+SUMMARY_LINES = 100
+
+def summary_path(output):
+	if output.endswith(".out"):
+		output = output[:-4]
+	return output + ".summary.json"
+
+class Output_Summary:
+	def __init__(self, output):
+		self.output  = output
+		self.summary = stats.Summary(output)
+		self.pending = ""
+		self.unsaved = 0
+		if os.path.exists(output):
+			with open(output, "rb") as file:
 				for line in file:
-					pi, bpi, biota = line.split()
+					self.summary.add(line)
+
+	## Text as written to the output file, which may end in the middle
+	## of a line.
+	def add_text(self, text):
+		lines = (self.pending + text).split("\n")
+		self.pending = lines.pop()
+		for line in lines:
+			self.summary.add(line)
+		self.unsaved += len(lines)
+		if self.unsaved >= SUMMARY_LINES:
+			self.save(False)
 
-					command = "python3 unweighted/r-t-rt-indel-intergenic.py %s %s %s %s >> %s" % (pi, bpi, biota, model, output)
-					print(command)
-					os.system(command)
+	def save(self, finished):
+		if finished and self.pending:
+			self.summary.add(self.pending)
+			self.pending = ""
+		result = self.summary.result()
+		result["finished"] = finished
+		path = summary_path(self.output)
+		with open(path + ".tmp", "w") as file:
+			json.dump(result, file, indent = 1)
+		os.replace(path + ".tmp", path)
+		self.unsaved = 0
 
-for n in range(50, 501, 50):
-	for op in operations:
-		for model in ["RT"]:
-			fileinput = "Instances/input/%s_%s_%s.in" % ("s"+model.lower(), n, op)
-			output = "output-unweighted/%s_%s_%s.out" % ("s"+model.lower(), n, op)
+## Stands for the output file in redirect_stdout and passes what is
+## written to its summary as well.
+class Summary_Writer:
+	def __init__(self, out, summary):
+		self.out, self.summary = out, summary
 
+	def write(self, text):
+		self.summary.add_text(text)
+		return self.out.write(text)
+
+	def flush(self):
+		self.out.flush()
+
+
+## Every instance of the file from start on is sorted in this process
+## and the engine output goes straight to the output file.
+def run_file_batch(engine, model, fileinput, output, backend = "list", distance_only = False, encoded = False, profile = False, timing = False, start = 0):
+	print("%s -> %s" % (fileinput, output))
+	summary = Output_Summary(output)
+	with open(output, "a") as out, contextlib.redirect_stdout(Summary_Writer(out, summary)):
+		if start == 0 and not fileinput.endswith(".bin"):
 			with open(fileinput) as file:
-				for line in file:
-					pi, bpi, biota = line.split()
+				run_lines(engine, model, file, backend, distance_only, encoded, profile, timing)
+		else:
+			run_range(engine, model, fileinput, start, sys.maxsize, backend, distance_only, encoded, profile, timing)
+	summary.save(True)
+
+
+## Each worker of the pool loads the engine once.
+worker_engine = None
+
+def init_worker():
+	global worker_engine
+	worker_engine = load_engine()
+
+## The chunk of a task is the path of an instance file and a range of
+## its instances, which the worker reads by itself.
+def run_chunk(task):
+	output, model, chunk, backend, distance_only, encoded, profile, timing = task
+	buffer = io.StringIO()
+	with contextlib.redirect_stdout(buffer):
+		run_range(worker_engine, model, *chunk, backend, distance_only, encoded, profile, timing)
+	return output, buffer.getvalue()
+
+
+## Splits every instance file, from its first instance to run on, in
+## chunks of at most chunk_size instances, so a large file is shared
+## among several workers. Only the index of the file is read here.
+def chunk_tasks(files, chunk_size, backend = "list", distance_only = False, encoded = False, profile = False, timing = False):
+	for model, fileinput, output, first in files:
+		for start in range(first, count_instances(fileinput), chunk_size):
+			yield output, model, (fileinput, start, start + chunk_size), backend, distance_only, encoded, profile, timing
+
+
+## The chunks are spread over a pool of processes. imap returns the
+## results in the order the chunks were created, so each output file
+## gets its lines in the same order as in a serial run.
+def run_parallel(files, workers, chunk_size, backend = "list", distance_only = False, encoded = False, profile = False, timing = False):
+	out, current, summary = None, None, None
+	with multiprocessing.Pool(workers, initializer = init_worker) as pool:
+		for output, text in pool.imap(run_chunk, chunk_tasks(files, chunk_size, backend, distance_only, encoded, profile, timing)):
+			if output != current:
+				if out:
+					out.close()
+					summary.save(True)
+				print(output)
+				summary = Output_Summary(output)
+				out, current = open(output, "a"), output
+			out.write(text)
+			summary.add_text(text)
+	if out:
+		out.close()
+		summary.save(True)
+
+
+## Lines already written to an output file, one per instance (the
+## result or the message of a Sorting_Error).
+def count_lines(output):
+	with open(output, "rb") as file:
+		return sum(1 for line in file if line.strip())
+
+
+def main():
+	parser = argparse.ArgumentParser(description = "Run the unweighted experiments.")
+	parser.add_argument("--subprocess", action = "store_true",
+						help = "start one python process per instance (old behaviour)")
+	parser.add_argument("--workers", type = int, default = 1,
+						help = "number of worker processes, 0 uses every core (default: 1)")
+	parser.add_argument("--chunk-size", type = int, default = 25,
+						help = "instances sent to a worker at a time (default: 25)")
+	parser.add_argument("--backend", choices = ["list", "tree"], default = "list",
+						help = "graph backend of the engine, see tree_configuration_graph for tree (default: list)")
+	parser.add_argument("--distance-only", action = "store_true",
+						help = "print only the distance, the number of operations of each kind, the approximation and the time")
+	parser.add_argument("--binary", action = "store_true",
+						help = "read the instances from the .bin file next to each .in file, converting it first if it is missing or older than the .in file (see binary_instances.py)")
+	parser.add_argument("--resume", action = "store_true",
+						help = "skip the instances that already have a line in the output file")
+	parser.add_argument("--encoded-ops", action = "store_true",
+						help = "write the operations in base64 (see encode_operations_text in the engine) instead of their repr")
+	parser.add_argument("--profile", action = "store_true",
+						help = "time and count the lemmas of each instance (see Lemma_Profile in the engine); stats.py adds them up per file")
+	parser.add_argument("--timing", action = "store_true",
+						help = "append the wall clock and processor time of the parse, construct, sort and output phases of each instance (see Phase_Times in the engine)")
+	args = parser.parse_args()
+	if args.subprocess and (args.binary or args.resume):
+		parser.error("--binary and --resume cannot be used with --subprocess")
+
+	os.system("mkdir -p output-unweighted")
+
+	files = []
+	for model, fileinput, output in instance_files():
+		if not os.path.exists(fileinput):
+			print("skipping %s (not found)" % fileinput)
+			continue
+		if args.binary:
+			binary = binary_instances.binary_path(fileinput)
+			if not binary_instances.up_to_date(fileinput, binary):
+				binary_instances.convert(fileinput, binary)
+			fileinput = binary
+		first = 0
+		if args.resume and os.path.exists(output):
+			first = count_lines(output)
+			if first >= count_instances(fileinput):
+				print("skipping %s (done)" % fileinput)
+				continue
+		files.append((model, fileinput, output, first))
+
+	if args.subprocess:
+		for model, fileinput, output, _ in files:
+			run_file_subprocess(model, fileinput, output, args.backend, args.distance_only, args.encoded_ops, args.profile, args.timing)
+			Output_Summary(output).save(True)
+	elif args.workers != 1:
+		workers = args.workers if args.workers > 0 else os.cpu_count()
+		run_parallel(files, workers, args.chunk_size, args.backend, args.distance_only, args.encoded_ops, args.profile, args.timing)
+	else:
+		engine = load_engine()
+		for model, fileinput, output, first in files:
+			run_file_batch(engine, model, fileinput, output, args.backend, args.distance_only, args.encoded_ops, args.profile, args.timing, first)
+
 
-					command = "python3 unweighted/r-t-rt-indel-intergenic.py %s %s %s %s >> %s" % (pi, bpi, biota, model, output)
-					print(command)
-					os.system(command)
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,250 @@
+## Summary of the output files, as stats.sh and check_error.sh print
+## it, reading every file once and several files at a time.
+##
+## For each file we count the exact results (the approximation, column
+## 6, is 1; the grep "1.0000" of stats.sh also matched approximations
+## such as 2.120000, as "." matches any character), the mean, min and
+## max of the distance (column 4) and of the approximation, the mean
+## time (column 7), its percentiles 50, 90 and 99 (only in the JSON)
+## and the lines with ERROR (as check_error.sh).
+## Lines that are not result lines (e.g. the message of a Sorting_Error)
+## only count as failed. The numbers are printed as datamash prints
+## them, in the sections of stats.sh followed by an error section, or
+## as JSON with --json.
+##
+## Lines written with --profile end with profile=<json> (see
+## Lemma_Profile in the engine): the passes and the fields of each
+## lemma are added up over the file and printed in a lemmas section,
+## one line per file and lemma, with the share of the time of the file.
+## Lines written with --timing have a phase=wall/cpu field for each
+## phase (see Phase_Times in the engine): the mean wall clock and
+## processor time of each phase are printed in a phases section.
+##
+## usage: python3 stats.py [directory] [suffix] [--json] [--workers N]
+##     python3 stats.py output-unweighted/ .out > results.txt
+##     python3 stats.py output-unweighted/ .out --json --workers 4
+
+import os
+import sys
+import math
+import glob
+import json
+import argparse
+import multiprocessing
+
+## The fields of each lemma in a profile, as PROFILE_FIELDS in the engine.
+PROFILE_FIELDS = ("scans", "fired", "tried", "operations", "seconds")
+
+## The phases of an instance, as PHASES in the engine.
+PHASES = ("parse", "construct", "sort", "output")
+
+
+## Mean, min and max of a column, kept as the lines are read.
+class Column:
+	def __init__(self):
+		self.count, self.total = 0, 0.0
+		self.min, self.max = None, None
+
+	def add(self, value):
+		self.count += 1
+		self.total += value
+		if self.min is None or value < self.min:
+			self.min = value
+		if self.max is None or value > self.max:
+			self.max = value
+
+	def mean(self):
+		return self.total / self.count if self.count else None
+
+
+## Quantiles of a stream of non-negative values without keeping them:
+## each value is counted in the bucket k with gamma^(k-1) < value <=
+## gamma^k, so a quantile is known up to the given relative accuracy
+## and the number of buckets grows only with the log of the range.
+class Quantile_Sketch:
+	def __init__(self, accuracy = 0.01):
+		self.gamma = (1 + accuracy) / (1 - accuracy)
+		self.log_gamma = math.log(self.gamma)
+		self.buckets = {}
+		self.zeros, self.count = 0, 0
+
+	def add(self, value):
+		self.count += 1
+		if value <= 0:
+			self.zeros += 1
+			return
+		k = math.ceil(math.log(value) / self.log_gamma)
+		self.buckets[k] = self.buckets.get(k, 0) + 1
+
+	def quantile(self, q):
+		if not self.count:
+			return None
+		rank = q * (self.count - 1)
+		seen = self.zeros
+		if rank < seen:
+			return 0.0
+		for k in sorted(self.buckets):
+			seen += self.buckets[k]
+			if rank < seen:
+				return 2 * self.gamma**k / (self.gamma + 1)
+		return 2 * self.gamma**max(self.buckets) / (self.gamma + 1)
+
+
+## Summary of one output file, updated line by line, so it can be
+## built while the file is written (see run-unweighted.py) or by
+## reading it afterwards (summarize).
+class Summary:
+	def __init__(self, path):
+		self.path = path
+		self.exact, self.errors, self.failed = 0, 0, 0
+		self.distance, self.approx, self.seconds = Column(), Column(), Column()
+		self.sketch = Quantile_Sketch()
+		self.profiled, self.passes, self.lemmas = 0, 0, {}
+		self.phases = {name : (Column(), Column()) for name in PHASES}
+
+	def add(self, line):
+		if isinstance(line, bytes):
+			line = line.decode("ascii", "replace")
+		if "ERROR" in line:
+			self.errors += 1
+		fields = line.split()
+		if not fields:
+			return
+		try:
+			values = float(fields[3]), float(fields[5]), float(fields[6])
+		except (IndexError, ValueError):
+			self.failed += 1
+			return
+		if values[1] == 1.0:
+			self.exact += 1
+		for field in fields[7:]:
+			name, _, value = field.partition("=")
+			if name == "profile":
+				self.add_profile(value)
+			elif name in self.phases:
+				self.add_phase(name, value)
+		self.distance.add(values[0])
+		self.approx.add(values[1])
+		self.seconds.add(values[2])
+		self.sketch.add(values[2])
+
+	## Adds the profile of one instance: {"passes": n, "lemmas": {name:
+	## [scans, fired, tried, operations, seconds]}}.
+	def add_profile(self, text):
+		try:
+			profile = json.loads(text)
+		except ValueError:
+			return
+		self.profiled += 1
+		self.passes += profile["passes"]
+		for name, values in profile["lemmas"].items():
+			totals = self.lemmas.setdefault(name, [0] * len(values))
+			for k, value in enumerate(values):
+				totals[k] += value
+
+	def add_phase(self, name, text):
+		try:
+			wall, cpu = map(float, text.split("/"))
+		except ValueError:
+			return
+		self.phases[name][0].add(wall)
+		self.phases[name][1].add(cpu)
+
+	def result(self):
+		return {
+			"file"     : self.path,
+			"lines"    : self.distance.count,
+			"exact"    : self.exact,
+			"distance" : {"mean" : self.distance.mean(), "min" : self.distance.min, "max" : self.distance.max},
+			"approx"   : {"mean" : self.approx.mean(), "min" : self.approx.min, "max" : self.approx.max},
+			"time"     : {"mean" : self.seconds.mean(), "p50" : self.sketch.quantile(0.5),
+						  "p90" : self.sketch.quantile(0.9), "p99" : self.sketch.quantile(0.99)},
+			"errors"   : self.errors,
+			"failed"   : self.failed,
+			"profiled" : self.profiled,
+			"passes"   : self.passes,
+			"lemmas"   : {name : dict(zip(PROFILE_FIELDS, values)) for name, values in sorted(self.lemmas.items())},
+			"phases"   : {name : {"wall" : wall.mean(), "cpu" : cpu.mean(), "timed" : wall.count}
+						  for name, (wall, cpu) in self.phases.items()},
+		}
+
+
+def summarize(path):
+	summary = Summary(path)
+	with open(path, "rb") as file:
+		for line in file:
+			summary.add(line)
+	return summary.result()
+
+
+def number(value):
+	if value is None:
+		return "nan"
+	return "%.10g" % value
+
+
+def print_sections(summaries):
+	print("exact")
+	for summary in summaries:
+		print("%s\t%d" % (summary["file"], summary["exact"]))
+
+	for section, column in (("dist", "distance"), ("approx", "approx")):
+		print(section)
+		for summary in summaries:
+			values = summary[column]
+			print("%s\t%s\t%s\t%s" % (summary["file"], number(values["mean"]), number(values["min"]), number(values["max"])))
+
+	print("time")
+	for summary in summaries:
+		print("%s\t%s" % (summary["file"], number(summary["time"]["mean"])))
+
+	print("errors")
+	for summary in summaries:
+		print("%s\t%d\t%d" % (summary["file"], summary["errors"], summary["failed"]))
+
+	if any(summary["phases"]["sort"]["timed"] for summary in summaries):
+		print("phases")
+		for summary in summaries:
+			for name, values in summary["phases"].items():
+				if values["timed"]:
+					print("%s\t%s\t%s\t%s" % (summary["file"], name, number(values["wall"]), number(values["cpu"])))
+
+	if not any(summary["profiled"] for summary in summaries):
+		return
+	print("lemmas")
+	for summary in summaries:
+		total = summary["time"]["mean"] * summary["lines"] if summary["lines"] else 0
+		for name, values in summary["lemmas"].items():
+			share = values["seconds"] / total if total else None
+			print("%s\t%s\t%d\t%d\t%d\t%d\t%s\t%s" % (summary["file"], name, values["scans"], values["fired"],
+				values["tried"], values["operations"], number(values["seconds"]), number(share)))
+
+
+def main():
+	parser = argparse.ArgumentParser(description = "Summarize the output files of the experiments.")
+	parser.add_argument("directory", nargs = "?", default = "output-unweighted/")
+	parser.add_argument("suffix", nargs = "?", default = ".out")
+	parser.add_argument("--json", action = "store_true",
+						help = "print a JSON list with the summary of each file")
+	parser.add_argument("--workers", type = int, default = 0,
+						help = "number of worker processes, 0 uses every core (default: 0)")
+	args = parser.parse_args()
+
+	## The same files, in the same order, as ls $pre/*$suf.
+	paths = sorted(glob.glob(args.directory + "/*" + args.suffix))
+	workers = args.workers if args.workers > 0 else os.cpu_count()
+	if workers == 1 or len(paths) < 2:
+		summaries = [summarize(path) for path in paths]
+	else:
+		with multiprocessing.Pool(min(workers, len(paths))) as pool:
+			summaries = pool.map(summarize, paths)
+
+	if args.json:
+		json.dump(summaries, sys.stdout, indent = 1)
+		print()
+	else:
+		print_sections(summaries)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,71 @@
+## Checks of the GIN2 binary instance files (binary_instances.py).
+##
+## usage: python3 -m pytest tests        (from the code directory)
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+CODE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, CODE)
+import binary_instances
+from engine_loader import ENGINE, load_engine
+
+## The engine is found from the code directory, and the tests may run
+## from elsewhere.
+binary_instances.engine = load_engine(os.path.join(CODE, ENGINE))
+
+
+class Binary_Instances_Test(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def path(self, name):
+		return os.path.join(self.directory, name)
+
+	def test_write_and_read(self):
+		instances = [([1, -3, 0, 2], [5, 0, 7, 1, 2], [5, 4, 7, 3, 1]),
+		             ([], [0], [40000]),
+		             ([-2, 1], [70000, 3, 9], [1, 1, 1])]
+		binary_instances.write_instances(self.path("a.bin"), instances)
+		with binary_instances.Instance_File(self.path("a.bin")) as instance_file:
+			self.assertEqual(len(instance_file), 3)
+			self.assertEqual([column.format for column in instance_file.columns], ["h", "i", "i"])
+			self.assertEqual([tuple(map(list, instance)) for instance in instance_file], instances)
+			self.assertEqual(instance_file[2], instances[2])
+			self.assertEqual(list(instance_file.arrays(0)[0]), instances[0][0])
+			with self.assertRaises(IndexError):
+				instance_file.arrays(3)
+
+	def test_convert(self):
+		fileinput = os.path.join(CODE, "Instances", "input", "srt_50_0.3.in")
+		shutil.copy(fileinput, self.path("srt.in"))
+		self.assertFalse(binary_instances.up_to_date(self.path("srt.in")))
+		count = binary_instances.convert(self.path("srt.in"))
+		self.assertTrue(binary_instances.up_to_date(self.path("srt.in")))
+
+		with open(fileinput) as file:
+			expected = [tuple(binary_instances.parse_int_list(text) for text in line.split()) for line in file if line.strip()]
+		with binary_instances.Instance_File(self.path("srt.bin")) as instance_file:
+			self.assertEqual(count, len(expected))
+			self.assertEqual(list(instance_file), expected)
+
+		with open(self.path("srt.in"), "a") as file:
+			file.write("1,2 0,0,0 0,0,0\n")
+		self.assertFalse(binary_instances.up_to_date(self.path("srt.in")))
+
+	def test_not_binary(self):
+		with open(self.path("a.bin"), "wb") as file:
+			file.write(b"LIX1" + bytes(binary_instances.HEADER.size))
+		with self.assertRaises(ValueError):
+			binary_instances.Instance_File(self.path("a.bin"))
+		self.assertFalse(binary_instances.up_to_date(self.path("a.bin"), self.path("a.bin")))
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,134 @@
+## Checks of the engine against the code it replaced.
+##
+## The operations of a sort must come back unchanged from their binary
+## and text encodings, best_transposition_weights must give the weights
+## of the search over every weight with compute_score, interval_index
+## the pair of the search over every pair, and the output of bundled
+## instances must be the output of the baseline engine (data/
+## baseline.out, one line per instance: file, line, model and the line
+## printed by the baseline engine) but for the time column.
+##
+## usage: python3 -m pytest tests        (from the code directory)
+##     python3 -m unittest discover tests
+
+import os
+import sys
+import random
+import unittest
+
+CODE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, CODE)
+from engine_loader import ENGINE, load_engine
+
+engine = load_engine(os.path.join(CODE, ENGINE))
+
+BASELINE  = os.path.join(CODE, "tests", "data", "baseline.out")
+INSTANCES = os.path.join(CODE, "Instances", "input")
+
+
+def read_instance(name, k):
+	with open(os.path.join(INSTANCES, name + ".in")) as file:
+		for number, line in enumerate(file):
+			if number == k:
+				return [engine.parse_int_list(text) for text in line.split()[:3]]
+
+
+## The output line without its time column (column 7).
+def without_time(line):
+	columns = line.split(" ")
+	return columns[:6] + columns[7:]
+
+
+class Operation_Encoding_Test(unittest.TestCase):
+	def sequences(self):
+		yield [("DEL", 3, 0, [], [7]),
+		       ("INS", 2, 5, [4, -1], [0, 3, 9]),
+		       ("INS", 44, 0, [[37], []], [8, [22]]),
+		       ("REV", 1, 9, 4, 0),
+		       ("TRANSP", 2, 5, 8, [1, 0, 6])]
+		yield []
+		for name, k, model in (("t_50_1", 0, "T"), ("srt_50_1", 1, "RT"), ("srt_100_0.5", 2, "RT")):
+			yield engine.sort_genome(*read_instance(name, k), model).operations
+
+	def test_bytes(self):
+		for operations in self.sequences():
+			buffer = engine.Operation_Buffer(engine.operations_to_bytes(operations))
+			self.assertEqual(len(buffer), len(operations))
+			self.assertEqual(list(buffer), operations)
+			self.assertEqual([buffer.kind(t) for t in range(len(buffer))], [op[0] for op in operations])
+
+	def test_text(self):
+		for operations in self.sequences():
+			text = engine.encode_operations_text(operations)
+			self.assertTrue(text.startswith("b64:"))
+			self.assertEqual(list(engine.decode_operations_text(text)), operations)
+
+	def test_not_encoded(self):
+		with self.assertRaises(ValueError):
+			engine.Operation_Buffer(b"OPS0" + bytes(16))
+
+
+class Transposition_Weights_Test(unittest.TestCase):
+	## The search the lemmas used to run (as benchmarks/compute_score.py).
+	def exhaustive_search(self, sorter, gray_ws, black_ws):
+		ws = [[0,0],[0,0],[0,0]]
+		best_score, best_weight, best_black = 100000000000000, 100000000000000, -1
+		for heaviest_black in (0,1,2):
+			for weight in range(0, int(black_ws[heaviest_black])+1):
+				score = sorter.compute_score(gray_ws, black_ws, ws, heaviest_black, weight)
+				if score >= 0 and score < best_score:
+					best_score, best_weight, best_black = score, weight, heaviest_black
+		return best_score, best_weight, best_black
+
+	def test_exhaustive(self):
+		sorter = engine.Intergenic_Rev.__new__(engine.Intergenic_Rev)
+		rng = random.Random(1501)
+		for weight in (0, 1, 3, 10, 40):
+			for _ in range(300):
+				black_ws = [rng.randint(0, weight) for _ in range(3)]
+				gray_ws  = [rng.randint(0, 2*weight) for _ in range(3)]
+				self.assertEqual(sorter.best_transposition_weights(gray_ws, black_ws),
+				                 self.exhaustive_search(sorter, gray_ws, black_ws), (gray_ws, black_ws))
+
+
+class Interval_Index_Test(unittest.TestCase):
+	## As in the divergent search: the intervals are added from the last
+	## place to the first, and each query asks for the lowest place of an
+	## interval that meets it, before its own interval is added.
+	def test_brute_force(self):
+		rng = random.Random(2064)
+		for size in (1, 2, 5, 20, 60):
+			for _ in range(30):
+				intervals = []
+				for _ in range(size):
+					low = rng.randint(-30, 30)
+					intervals.append((low, low + rng.randint(0, 10)))
+				queries = [(low + shift, high + shift) for low, high in intervals for shift in (0, rng.randint(-5, 5))]
+				keys = sorted(set(end for interval in intervals + queries for end in interval))
+
+				index, added = engine.interval_index(keys, size), []
+				for u in range(size-1, -1, -1):
+					for low, high in queries[2*u:2*u+2]:
+						expected = min([place for place, (a, b) in added if a <= high and low <= b], default = size)
+						self.assertEqual(index.first(low, high), expected)
+					index.add(intervals[u][0], intervals[u][1], u)
+					added.append((u, intervals[u]))
+
+
+class Baseline_Output_Test(unittest.TestCase):
+	def check_backend(self, backend):
+		with open(BASELINE) as file:
+			for line in file:
+				name, k, model, expected = line.rstrip("\n").split(" ", 3)
+				result = engine.sort_genome(*read_instance(name, int(k)), model, backend = backend)
+				self.assertEqual(without_time(engine.format_result(result)), without_time(expected), (name, k, model))
+
+	def test_list(self):
+		self.check_backend("list")
+
+	def test_tree(self):
+		self.check_backend("tree")
+
+
+if __name__ == '__main__':
+	unittest.main()
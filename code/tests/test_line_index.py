@@ -0,0 +1,69 @@
+## Checks of the LIX1 line index (line_index.py).
+##
+## usage: python3 -m pytest tests        (from the code directory)
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+CODE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, CODE)
+import line_index
+
+
+class Line_Index_Test(unittest.TestCase):
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.path = os.path.join(self.directory, "a.in")
+
+	def tearDown(self):
+		shutil.rmtree(self.directory)
+
+	def write(self, text):
+		with open(self.path, "w") as file:
+			file.write(text)
+
+	def test_lines(self):
+		lines = ["1,2 0,0,0 0,0,0", "-2,1 3,4,5 6,7,8", "2,1 1,1,1 2,2,2"]
+		self.write(lines[0] + "\n\n" + lines[1] + "\n  \n" + lines[2])
+		self.assertEqual(line_index.build_index(self.path), 3)
+
+		size, _, offsets = line_index.read_index(self.path)
+		self.assertEqual(size, os.path.getsize(self.path))
+		self.assertEqual(list(offsets), [0, 17, 37, size])
+
+		with line_index.Line_Index(self.path) as index:
+			self.assertEqual(len(index), 3)
+			self.assertEqual([index.line(k) for k in range(3)], lines)
+			self.assertEqual(index.lines(0, 3), lines)
+			self.assertEqual(index.lines(1, 10), lines[1:])
+			self.assertEqual(index.lines(5, 10), [])
+			with self.assertRaises(IndexError):
+				index.line(3)
+
+	def test_out_of_date(self):
+		self.write("1,2 0,0,0 0,0,0\n")
+		with line_index.Line_Index(self.path) as index:
+			self.assertEqual(len(index), 1)
+		self.write("1,2 0,0,0 0,0,0\n2,1 1,1,1 2,2,2\n")
+		with line_index.Line_Index(self.path) as index:
+			self.assertEqual(index.lines(0, 2), ["1,2 0,0,0 0,0,0", "2,1 1,1,1 2,2,2"])
+
+	def test_empty(self):
+		self.write("")
+		with line_index.Line_Index(self.path) as index:
+			self.assertEqual(len(index), 0)
+			self.assertEqual(index.lines(0, 1), [])
+
+	def test_not_an_index(self):
+		self.write("1,2 0,0,0 0,0,0\n")
+		with open(line_index.index_path(self.path), "wb") as file:
+			file.write(b"GIN2" + bytes(line_index.HEADER.size))
+		with self.assertRaises(ValueError):
+			line_index.read_index(self.path)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,44 @@
+## Checks of the quantiles of stats.py.
+##
+## usage: python3 -m pytest tests        (from the code directory)
+
+import os
+import sys
+import random
+import unittest
+
+CODE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, CODE)
+import stats
+
+
+class Quantile_Sketch_Test(unittest.TestCase):
+	## The value of rank q*(count-1), as the sketch counts it, is known
+	## up to the accuracy of the sketch.
+	def check(self, values, accuracy):
+		sketch = stats.Quantile_Sketch(accuracy)
+		for value in values:
+			sketch.add(value)
+		ordered = sorted(values)
+		for q in (0, 0.1, 0.5, 0.9, 0.99, 1):
+			exact = ordered[int(q * (len(values) - 1))]
+			self.assertLessEqual(abs(sketch.quantile(q) - exact), accuracy * exact, (q, exact))
+
+	def test_accuracy(self):
+		rng = random.Random(64)
+		self.check([rng.expovariate(1 / 0.05) for _ in range(5000)], 0.01)
+		self.check([rng.uniform(1e-4, 100) for _ in range(1000)], 0.02)
+		self.check([0.0] * 30 + [rng.uniform(0.5, 2) for _ in range(70)], 0.01)
+
+	def test_empty(self):
+		self.assertIsNone(stats.Quantile_Sketch().quantile(0.5))
+
+	def test_single(self):
+		sketch = stats.Quantile_Sketch()
+		sketch.add(3.0)
+		for q in (0, 0.5, 1):
+			self.assertAlmostEqual(sketch.quantile(q), 3.0, delta = 0.03)
+
+
+if __name__ == '__main__':
+	unittest.main()
@@ -5,16 +5,216 @@ import sys
 import random
 import itertools
 import time
+import bisect
+import heapq
+import array
+import traceback
+import struct
+import base64
+import zlib
+import json
+import argparse
+import os
+
+try :
+    import numpy as np
+except ImportError :
+    np = None
 
 
 DEBUG = False
 
+## lemma_3_transp scores all the triples of a cycle at once with numpy
+## when the cycle has at least this many black edges (None never does).
+NUMPY_TRIPLES = 32
+
+## The cycle table is updated for the cycles of the moved nodes (see
+## update_table) while they are at most this fraction of the nodes,
+## otherwise reading it again is cheaper.
+MOVED_FRACTION = 1/8
+
+
+## Raised when an operation receives inconsistent weights or when a
+## rule cannot find the operation it is supposed to exist. The message
+## is the one the command line version prints.
+class Sorting_Error(Exception) :
+    pass
+
+
+## Result of sorting one instance. The status is one of:
+##     ok             : the genome was sorted within the approximation;
+##     not-sorted     : no rule could be applied before the end;
+##     bound-exceeded : sorted, but distance/lower bound > approximation.
+## A genome that is already sorted and balanced has lower bound 0; its
+## distance is 0 and its approximation is taken as 1.
+class Sort_Result :
+    OK             = "ok"
+    NOT_SORTED     = "not-sorted"
+    BOUND_EXCEEDED = "bound-exceeded"
+
+    def __init__(self, operations, lower_bound, max_approx, time, status) :
+        self.operations  = operations
+        self.distance    = len(operations)
+        self.lower_bound = lower_bound
+        if lower_bound :
+            self.approx  = self.distance / lower_bound
+        else :
+            self.approx  = 1.0 if self.distance == 0 else float("inf")
+        self.max_approx  = max_approx
+        self.time        = time
+        self.status      = status
+
+        ## Filled by sort_genome, used to print the input in the
+        ## output line.
+        self.input_cycles = ""
+        self.input_wgray  = ""
+        self.input_wblack = ""
+
+        ## A Lemma_Profile if the instance was profiled.
+        self.profile = None
+
+        ## The Phase_Times of the instance, filled by sort_genome.
+        self.phases = None
+
+
+## Wall clock (perf_counter) and processor (process_time) time of the
+## phases of one instance, in the order of PHASES:
+##     parse     : reading the input lists (run_instance);
+##     construct : construct_str_cycle and the cycle graph;
+##     sort      : the sort itself, up to the Sort_Result;
+##     output    : formatting the result line.
+## mark(name) ends the phase that began at the previous mark, or when
+## the object was created (at start, if given, for the wall clock).
+PHASES = ("parse", "construct", "sort", "output")
+
+class Phase_Times :
+    def __init__(self, start = None) :
+        self.start = time.perf_counter() if start is None else start
+        self.wall  = {}
+        self.cpu   = {}
+        self.last_wall = self.start
+        self.last_cpu  = time.process_time()
+
+    def mark(self, name) :
+        wall, cpu = time.perf_counter(), time.process_time()
+        self.wall[name] = wall - self.last_wall
+        self.cpu[name]  = cpu - self.last_cpu
+        self.last_wall, self.last_cpu = wall, cpu
+
+    ## The fields appended to the result line: phase=wall/cpu, in seconds.
+    def format(self) :
+        return " ".join("%s=%f/%f" % (name, self.wall[name], self.cpu[name])
+                        for name in PHASES if name in self.wall)
+
+
+## Takes the place of the list of operations in the distance only mode
+## (see Intergenic_Rev): it keeps the number of operations of each kind
+## instead of the operations, which are never printed in this mode.
+## The sort appends only the kind of each operation, so the tuples of
+## the operations are not built at all.
+class Operation_Counts :
+    KINDS = ("DEL", "INS", "REV", "TRANSP")
+
+    def __init__(self) :
+        self.counts = dict.fromkeys(self.KINDS, 0)
+
+    def append(self, kind) :
+        self.counts[kind] += 1
+
+    def __len__(self) :
+        return sum(self.counts.values())
+
+    def __str__(self) :
+        return ",".join("%s=%d" % (kind, self.counts[kind]) for kind in self.KINDS)
+
+
+## Counters and timers of the lemmas of one sort, kept only when
+## Intergenic_Rev is created with profile = True: it then replaces its
+## lemmas, its searches and trivial_indels by the wrappers below, so a
+## sort that is not profiled runs the very same code as before. For
+## each lemma we keep, in the order of PROFILE_FIELDS:
+##     scans      : the times it was called by a search (a lemma called
+##                  by another one, e.g. lemma_6_transp, is part of it);
+##     fired      : the times it returned operations;
+##     tried      : the lemmas tried before it in the passes it fired;
+##     operations : the operations added to the sequence in those passes;
+##     seconds    : the time spent in it, whether it fired or not.
+## A pass is one call of a search; trivial_indels counts as a lemma.
+PROFILE_FIELDS = ("scans", "fired", "tried", "operations", "seconds")
+
+class Lemma_Profile :
+    def __init__(self) :
+        self.lemmas   = {}
+        self.passes   = 0
+        self.sequence = None
+        self.counted  = 0
+        self.last     = None
+        self.tried    = 0
+        self.depth    = 0
+
+    def lemma(self, name, function) :
+        entry = self.lemmas.setdefault(name, [0, 0, 0, 0, 0.0])
+        def timed(*args) :
+            if self.depth :
+                return function(*args)
+            self.depth = 1
+            start = time.perf_counter()
+            try :
+                result = function(*args)
+            finally :
+                self.depth = 0
+            entry[4] += time.perf_counter() - start
+            entry[0] += 1
+            if result :
+                entry[1] += 1
+                entry[2] += self.tried
+            self.tried += 1
+            self.last   = entry
+            return result
+        return timed
+
+    def search(self, function) :
+        def timed(*args) :
+            self.count_operations()
+            self.passes += 1
+            self.tried   = 0
+            return function(*args)
+        return timed
+
+    ## The operations added to the sequence since the last call come
+    ## from the last lemma called, the one that fired in its pass.
+    def count_operations(self) :
+        if self.sequence is None :
+            return
+        added = len(self.sequence) - self.counted
+        if added and self.last :
+            self.last[3] += added
+        self.counted += added
+
+    def to_dict(self) :
+        lemmas = dict((name, entry) for name, entry in self.lemmas.items() if entry[0])
+        return {"passes" : self.passes, "lemmas" : lemmas}
+
+    ## The profile as it is appended to the output line.
+    def encode(self) :
+        return json.dumps(self.to_dict(), separators = (",", ":"))
+
 
 #####################################################################
 ################## REPRESENTS A NODE OF A GRAPH #####################
 #####################################################################
 
+## lc_iota of the gray edges without labels. It is only read, so all
+## of them share this list.
+NO_IOTA = []
+
 class cycle_graph_node :
+    ## Thousands of nodes are alive at a time in every worker, slots
+    ## keep them without a dictionary each.
+    __slots__ = ("index", "value", "padded", "cycle", "kind", "size",
+                 "blacks", "grays", "gray_labeled", "black_labeled",
+                 "direction", "ap", "ab", "ac", "visit",
+                 "wc", "wp", "wcs", "wps", "lc", "lc_iota", "lp")
 
     def __init__(self, index, padded) :
         #index  : stores the black edge i, 0 <= i <= n+1
@@ -65,7 +265,7 @@ class cycle_graph_node :
         self.wcs                  = 0
         self.wps                  = 0
         self.lc                   = 0
-        self.lc_iota              = []
+        self.lc_iota              = NO_IOTA
         self.lp                   = 0
 
 ############################################################################
@@ -86,7 +286,57 @@ class cycle_graph_node :
 ## node(5).ap  = -2      ## node(5).ab  = -5 
 ## node(-2).ab = 2       ## node(-2).ap = 5
 
+## Categories of cycles that the lemmas look for. Each rule receives
+## the first vertex of a cycle, which holds the attributes of the whole
+## cycle (see calculate_cycles). The graph keeps the cycles of every
+## category in the order of get_cycles (see cycles_in).
+CYCLE_CATEGORIES = {
+    ## trivial, not black-labeled, and either clean and unbalanced or
+    ## gray-labeled and non-negative (lemma_5)
+    "trivial-unbalanced"  : lambda v : v.size == 1 and v.black_labeled == False and (
+                                (v.gray_labeled == False and v.blacks != v.grays) or
+                                (v.gray_labeled == True  and v.blacks <= v.grays)),
+    ## trivial, and either black-labeled or negative (lemma_6)
+    "trivial-negative"    : lambda v : (v.size == 1) and (v.black_labeled or v.blacks > v.grays),
+    "divergent-labeled"   : lambda v : (v.direction == 2) and (v.gray_labeled == True or v.black_labeled == True),
+    "divergent-clean"     : lambda v : (v.direction == 2) and (v.gray_labeled == False) and (v.black_labeled == False),
+    "nontrivial"          : lambda v : v.size > 1,
+    "long"                : lambda v : v.size > 2,
+    ## convergent, long, clean and balanced
+    "good-oriented"       : lambda v : (v.direction == 1 and v.size >= 3 and
+                                        v.gray_labeled == False and v.black_labeled == False and
+                                        v.blacks == v.grays),
+    ## convergent, long and not clean or not balanced
+    "bad-oriented"        : lambda v : (v.direction == 1 and v.size >= 3 and
+                                        not (v.gray_labeled == False and v.black_labeled == False and v.blacks == v.grays)),
+    ## convergent, non-trivial and not clean or not balanced
+    "bad"                 : lambda v : (v.direction == 1 and v.size > 1 and
+                                        not (v.gray_labeled == False and v.black_labeled == False and v.blacks == v.grays)),
+    "convergent-negative" : lambda v : v.direction == 1 and v.size >= 2 and v.blacks > v.grays,
+    "negative"            : lambda v : v.blacks > v.grays,
+    "positive"            : lambda v : v.blacks < v.grays,
+    "short-clean"         : lambda v : v.size == 2 and v.gray_labeled == False and v.black_labeled == False,
+    "positive-clean"      : lambda v : (v.size > 1 and v.blacks < v.grays and
+                                        v.gray_labeled == False and v.black_labeled == False),
+    "balanced"            : lambda v : v.grays == v.blacks,
+    "clean-balanced"      : lambda v : v.grays == v.blacks and v.black_labeled == False and v.gray_labeled == False,
+}
+
+## States of the entries of the cycle table in update_table: kept as
+## they were, with moved nodes only, or with changed nodes.
+KEPT, MOVED, CHANGED = 0, 1, 2
+
 class cycle_configuration_graph() :
+    __slots__ = ("__num_cycles", "__num_odd_cycles", "__num_balanced_cycles",
+                 "__first_indice_shift", "n", "final_n",
+                 "begin_node", "end_node", "positions",
+                 "cycle_table", "changed_nodes", "moved_nodes", "calculated_vertices",
+                 "buckets", "bucket_vertices", "cycle_sums",
+                 "edge_lists")
+
+    ## Class of the nodes created by the graph and by the insertions.
+    node_class = cycle_graph_node
+
     def __init__(self, cycles,
                  weight_gray ,
                  weight_black,
@@ -107,6 +357,32 @@ class cycle_configuration_graph() :
                                         # negative, than we know that
                                         # a mirror have occurred.
 
+        ## Cycles of the graph as returned by get_cycles. It is kept
+        ## between operations, which list the nodes they change (None
+        ## means every node) so that calculate_cycles only recomputes
+        ## the attributes of the cycles of those nodes. The nodes that
+        ## moved since the table was built (None if they are not known)
+        ## tell update_table which cycles to trace again. The number of
+        ## the cycle of each node refers to calculated_vertices.
+        self.cycle_table         = None
+        self.changed_nodes       = None
+        self.moved_nodes         = None
+        self.calculated_vertices = None
+
+        ## Numbers of the cycles of each category, in increasing order
+        ## (see cycles_in). They refer to the table bucket_vertices.
+        self.buckets             = {}
+        self.bucket_vertices     = None
+
+        ## Prefix sums of the weights of the cycles, by cycle number
+        ## (see cycle_prefix_sums). Any operation drops them.
+        self.cycle_sums          = {}
+
+        ## Black edges of the cycles sorted by position, by the first
+        ## node of the cycle (see cycle_edges). They are kept while the
+        ## cycle keeps its entry in the table.
+        self.edge_lists          = {}
+
         ## self.n is the number of black edges. Remember this graph
         ## might not be a permutation
         self.n = 0
@@ -117,10 +393,14 @@ class cycle_configuration_graph() :
           
         # Creating nodes
         node_list = []
-        node_list = [cycle_graph_node(i, False) for i in range(2*n)]
+        node_list = [self.node_class(i, False) for i in range(2*n)]
         self.begin_node = node_list[0 ]
         self.end_node   = node_list[-1]
 
+        ## The nodes are created in the order of their indices (see
+        ## reset_indices), so the list is already the positions index.
+        self.positions  = node_list
+
         # Creating ap
         for i in range(0,2*n,2) :
             node_list[i  ].ap  = node_list[i+1]
@@ -182,7 +462,8 @@ class cycle_configuration_graph() :
         insert_iota2 = insert_iota1.ac
         curr = 1
 
-        insert_iota1.lc_iota = [i for i in range(curr,curr+insert_iota1.lc)]
+        if insert_iota1.lc :
+            insert_iota1.lc_iota = [i for i in range(curr,curr+insert_iota1.lc)]
         insert_iota2.lc_iota = insert_iota1.lc_iota
         
         curr += insert_iota1.lc+1
@@ -190,7 +471,8 @@ class cycle_configuration_graph() :
         insert_iota2 = insert_iota1.ac
 
         while True :
-            insert_iota1.lc_iota = [i for i in range(curr,curr+insert_iota1.lc)]
+            if insert_iota1.lc :
+                insert_iota1.lc_iota = [i for i in range(curr,curr+insert_iota1.lc)]
             insert_iota2.lc_iota = insert_iota1.lc_iota
             
             curr += insert_iota1.lc+1
@@ -207,53 +489,30 @@ class cycle_configuration_graph() :
     ############################################################ 
     # transposition when model has no indels
     def transposition(self, i, j, k, weight_i, weight_j, weight_k) :
-        node_i = None
-        node_j = None
-        node_k = None
-
-        unp_i, unp_j, unp_k = 0,0,0
-
-        count     = 0
-        unp_count = 0
-
-        node = self.begin_node
-        # Find the black edges
-        while node :
-            count = count + 1
-            if not node.padded :
-                unp_count = unp_count + 1
-
-            if count == i :
-                node_i = node
-                unp_i  = unp_count
-            if count == j :
-                node_j = node
-                unp_j  = unp_count
-            if count == k :
-                node_k = node
-                unp_k  = unp_count
-            node = node.ap.ab
+        # Find the black edges. No node of this graph is padded, so
+        # the unpadded positions are the positions themselves.
+        node_i = self.black_edge(i)
+        node_j = self.black_edge(j)
+        node_k = self.black_edge(k)
+        unp_i, unp_j, unp_k = i, j, k
         
         if (weight_i <  0 or weight_i > node_i.wp) :
-            print("ERRO: Peso inconsistente no lado esquerdo: i (max = %s: w = %s)" % (
+            raise Sorting_Error("ERRO: Peso inconsistente no lado esquerdo: i (max = %s: w = %s)" % (
                 node_i.wp,
                 weight_i
             ) )
-            sys.exit()
 
         if (weight_j < 0 or weight_j > node_j.wp) :
-            print("ERRO: Peso inconsistente no meio:  j (max = %s: w = %s)" % (
+            raise Sorting_Error("ERRO: Peso inconsistente no meio:  j (max = %s: w = %s)" % (
                 node_j.wp,
                 weight_j
             ) )
-            sys.exit()
 
         if (weight_k < 0 or weight_k > node_k.wp) :
-            print("ERRO: Peso inconsistente no lado direito:  k (max = %s: w = %s)" % (
+            raise Sorting_Error("ERRO: Peso inconsistente no lado direito:  k (max = %s: w = %s)" % (
                 node_k.wp,
                 weight_k
             ) )
-            sys.exit()
 
 
         ## Weights that will be exchanged.
@@ -282,36 +541,19 @@ class cycle_configuration_graph() :
         
         self.__num_cycles           = False
         self.__num_odd_cycles       = False
-        self.reset_indices()
+        touched = (node_i, node_i.ap, node_j, node_j.ap, node_k, node_k.ap)
+        self.move_segments(2*i-1, 2*j-1, 2*k-1)
+        self.refresh_labels(touched)
+        self.update_cycle_table(touched, True)
         return unp_i, unp_j, unp_k
         
     def transposition2(self, i, j, k, new_weight_i, new_weight_j, new_weight_k) :
-        node_i = None
-        node_j = None
-        node_k = None
-
-        unp_i, unp_j, unp_k = 0,0,0
-
-        count     = 0
-        unp_count = 0
-
-        node = self.begin_node
-        # Find the black edges
-        while node :
-            count = count + 1
-            if not node.padded :
-                unp_count = unp_count + 1
-
-            if count == i :
-                node_i = node
-                unp_i  = unp_count
-            if count == j :
-                node_j = node
-                unp_j  = unp_count
-            if count == k :
-                node_k = node
-                unp_k  = unp_count
-            node = node.ap.ab
+        # Find the black edges. No node of this graph is padded, so
+        # the unpadded positions are the positions themselves.
+        node_i = self.black_edge(i)
+        node_j = self.black_edge(j)
+        node_k = self.black_edge(k)
+        unp_i, unp_j, unp_k = i, j, k
             
         # Change the edges
         node_i.ap.ap = node_k
@@ -333,51 +575,33 @@ class cycle_configuration_graph() :
         
         self.__num_cycles           = False
         self.__num_odd_cycles       = False
-        self.reset_indices()
+        touched = (node_i, node_i.ap, node_j, node_j.ap, node_k, node_k.ap)
+        self.move_segments(2*i-1, 2*j-1, 2*k-1)
+        self.refresh_labels(touched)
+        self.update_cycle_table(touched, True)
         return unp_i, unp_j, unp_k
     
     # reversal when model has no indels
     def reversal(self, i, j, weight) :
-        node_i = None
-        node_j = None
-
-        unp_i, unp_j = 0,0
-
-        count     = 0
-        unp_count = 0
-        ## These variables are used to return the transposition
-        ## applied as integer. ret_i, and ret_j will be the same
-        ## as i,j if we do not have ignored black edges
-        node = self.begin_node
-        # Find the black edges
-
-        while node :
-            count = count + 1
-            if not node.padded :
-                unp_count = unp_count + 1
-
-            if count == i :
-                node_i = node
-                unp_i  = unp_count
-            if count == j+1 :
-                node_j = node
-                unp_j  = unp_count - 1
-            node = node.ap.ab
+        # Find the black edges. No node of this graph is padded, so
+        # the unpadded positions are the positions themselves.
+        node_i = self.black_edge(i)
+        node_j = self.black_edge(j+1)
+        unp_i, unp_j = i, j
+        touched = (node_i, node_i.ap, node_j, node_j.ap)
 
 
         if (weight >  0 and weight > node_i.wp) :
-            print("ERRO: Peso inconsistente no lado esquerdo: i (max = %s: w = %s)" % (
+            raise Sorting_Error("ERRO: Peso inconsistente no lado esquerdo: i (max = %s: w = %s)" % (
                 node_i.wp,
                 weight
             ) )
-            sys.exit()
 
         if (weight < 0 and abs(weight) > node_j.wp) :
-            print("ERRO: Peso inconsistente no lado direito:  j (max = %s: w = %s)" % (
+            raise Sorting_Error("ERRO: Peso inconsistente no lado direito:  j (max = %s: w = %s)" % (
                 node_j.wp,
                 weight
             ) )
-            sys.exit()
 
         nweight_i = node_i.wp - weight
         nweight_j = node_j.wp + weight            
@@ -396,78 +620,37 @@ class cycle_configuration_graph() :
         self.__num_cycles           = False
         self.__num_odd_cycles       = False
         self.__num_balanced_cycles  = False                
-        self.reset_indices()
+        self.reverse_segment(2*i-1, 2*j+1)
+        self.refresh_labels(touched)
+        self.update_cycle_table(touched, True)
         return unp_i, unp_j
 
     # reversal when model has indels
     def reversal2(self, i, j, x, y, nweight_i, nweight_j) :
-        node_i = None
-        node_j = None
-
-        unp_i, unp_j = 0,0
-
-        count     = 0
-        unp_count = 0
-        ## These variables are used to return the reversal
-        ## applied as integer. ret_i, and ret_j will be the same
-        ## as i,j if we do not have ignored black edges
-        node = self.begin_node
-        # Find the black edges
-
-        while node :
-            count = count + 1
-            if not node.padded :
-                unp_count = unp_count + 1
-
-            if count == i :
-                node_i = node
-                unp_i  = unp_count
-            if count == j+1 :
-                node_j = node
-                unp_j  = unp_count - 1
-            node = node.ap.ab
+        # Find the black edges. No node of this graph is padded, so
+        # the unpadded positions are the positions themselves.
+        node_i = self.black_edge(i)
+        node_j = self.black_edge(j+1)
+        unp_i, unp_j = i, j
+        touched = (node_i, node_i.ap, node_j, node_j.ap)
 
 
         if (x < 0) or (x > sum(node_i.wp)) :
-            print("ERRO: Peso inconsistente no lado esquerdo: i (max = %s: w = %s)" % (
+            raise Sorting_Error("ERRO: Peso inconsistente no lado esquerdo: i (max = %s: w = %s)" % (
                 sum(node_i.wp),
                 str(x)
             ) )
-            sys.exit()
 
         if (y < 0) or (y > sum(node_j.wp)) :
-            print("ERRO: Peso inconsistente no lado direito:  j (max = %s: w = %s)" % (
+            raise Sorting_Error("ERRO: Peso inconsistente no lado direito:  j (max = %s: w = %s)" % (
                 sum(node_j.wp),
                 str(y)
             ) )
-            sys.exit()         
 
 
 
         # Reverse all wp's greater than one between them
-        if node_i.index > node_j.index :
-            if node_i.index > node_i.ap.index :
-                max_reverse_list = node_i.ap.ab
-            else :
-                max_reverse_list = node_i.ab
-            if node_j.index > node_j.ap.index :
-                min_reverse_list = node_j.ab
-            else :
-                min_reverse_list = node_j.ap.ab
-        else :
-            if node_j.index > node_j.ap.index :
-                max_reverse_list = node_j.ap.ab
-            else :
-                max_reverse_list = node_j.ab
-            if node_i.index > node_i.ap.index :
-                min_reverse_list = node_i.ab
-            else :
-                min_reverse_list = node_i.ap.ab
-
-        while min_reverse_list.index <= max_reverse_list.index :
-            if len(min_reverse_list.wp) > 1 :
-                min_reverse_list.wp = min_reverse_list.ap.wp = min_reverse_list.wp[::-1]
-            min_reverse_list = min_reverse_list.ap.ab
+        self.reverse_labeled_weights(2*i, 2*j)
 
 
         # Change the black edges
@@ -483,39 +666,23 @@ class cycle_configuration_graph() :
         self.__num_cycles           = False
         self.__num_odd_cycles       = False
         self.__num_balanced_cycles  = False                
-        self.reset_indices()
+        self.reverse_segment(2*i-1, 2*j+1)
+        self.refresh_labels(touched)
+        self.update_cycle_table(touched, True)
         return unp_i, unp_j
 
     def indel(self, is_insertion, i, x, elements, intergenic_regions) :
-        node_i = None
-        unp_i = 0
-
-        count     = 0
-        unp_count = 0
-        ## These variables are used to return the indel
-        ## applied as integer. ret_i will be the same
-        ## as i if we do not have ignored black edges
-
-        node = self.begin_node
-        # Find the black edges
-
-        while node :
-            count = count + 1
-            if not node.padded :
-                unp_count = unp_count + 1
-
-            if count == i :
-                node_i = node
-                unp_i  = unp_count
-            node = node.ap.ab
+        # Find the black edge. No node of this graph is padded, so
+        # the unpadded position is the position itself.
+        node_i = self.black_edge(i)
+        unp_i = i
 
         if (x > sum(node_i.wp)) :
-            print("ERRO: Posicao da delecao superior ao tamanho total da regiao intergenica: (wp = %s: del = %s: pos_x_size = %s)" % (
+            raise Sorting_Error("ERRO: Posicao da delecao superior ao tamanho total da regiao intergenica: (wp = %s: del = %s: pos_x_size = %s)" % (
                 str(node_i.wp),
                 str(intergenic_regions),
                 str(x)
             ) )
-            sys.exit()
 
         # let us check in which position of wp the indel will affect
         position_x = 0
@@ -536,10 +703,19 @@ class cycle_configuration_graph() :
 
             else : # add sizes in between and also intergenic regions. this step is applied only
                    # on trivial cycles, otherwise it must be modified to work with non-trivial cycles.
+
+                # the new black edges split the black edge of anchor, so
+                # we remember where it is to update the positions later.
+                if node_i.size == 1 :
+                    anchor = node_i
+                else :
+                    anchor = node_i.ap.ac
+                split_position = min(anchor.index, anchor.ap.index)
+
                 if node_i.size == 1 :
                     number_of_new_nodes = 2*len(elements)
                     self.n += len(elements)
-                    new_nodes = [cycle_graph_node(i, False) for i in range(number_of_new_nodes)]
+                    new_nodes = [self.node_class(i, False) for i in range(number_of_new_nodes)]
 
                     left_weight_orig = x
                     right_weight_orig = node_i.wp[0] - x
@@ -612,7 +788,7 @@ class cycle_configuration_graph() :
                     if elements[0] and elements[1] :
                         number_of_new_nodes = 2 * len(elements[0]) + 2 * len(elements[1])
                         self.n += len(elements[0]) + len(elements[1])
-                        new_nodes = [cycle_graph_node(i, False) for i in range(number_of_new_nodes)]
+                        new_nodes = [self.node_class(i, False) for i in range(number_of_new_nodes)]
 
                         # create new black and gray edges of unitary cycles
                         j, k = 1, 1
@@ -744,7 +920,7 @@ class cycle_configuration_graph() :
                     elif elements[0] :
                         number_of_new_nodes = 2 * len(elements[0])
                         self.n += len(elements[0])
-                        new_nodes = [cycle_graph_node(i, False) for i in range(number_of_new_nodes)]
+                        new_nodes = [self.node_class(i, False) for i in range(number_of_new_nodes)]
 
                         # create new black and gray edges of unitary cycles
                         j = 1
@@ -834,7 +1010,7 @@ class cycle_configuration_graph() :
                     else : # only elements[1]
                         number_of_new_nodes = 2 * len(elements[1])
                         self.n += len(elements[1])
-                        new_nodes = [cycle_graph_node(i, False) for i in range(number_of_new_nodes)]
+                        new_nodes = [self.node_class(i, False) for i in range(number_of_new_nodes)]
 
                         # create new black and gray edges of unitary cycles
                         j = 1
@@ -920,25 +1096,26 @@ class cycle_configuration_graph() :
 
                         self.set_values()
 
+                self.split_black_edge(split_position)
+                self.update_cycle_table(None, True)
+
         else : #we have a deletion
             tam_ir_removed = len(intergenic_regions)
             tam_ir_now = len(node_i.wp) - position_x
 
             if (tam_ir_removed > tam_ir_now) :
-                print("ERRO: Delecao de mais blocos de regioes intergenicas que a regiao possui: (wp = %s: del = %s: start_pos_index = %s)" % (
+                raise Sorting_Error("ERRO: Delecao de mais blocos de regioes intergenicas que a regiao possui: (wp = %s: del = %s: start_pos_index = %s)" % (
                     str(node_i.wp),
                     str(intergenic_regions),
                     str(position_x)
                 ) )
-                sys.exit()
 
             if (intergenic_regions[1+position_x:-1] != node_i.wp[1+position_x:tam_ir_removed-1]) :
-                print("ERRO: Delecao de regioes intermediarias nao consistentes com o existente: (wp = %s: del = %s: start_pos_index = %s)" % (
+                raise Sorting_Error("ERRO: Delecao de regioes intermediarias nao consistentes com o existente: (wp = %s: del = %s: start_pos_index = %s)" % (
                     str(node_i.wp),
                     str(intergenic_regions),
                     str(position_x)
                 ) )
-                sys.exit()
 
             if tam_ir_removed > 1 :
                 final_wp = node_i.wp[:position_x] + [ int(node_i.wp[position_x] - intergenic_regions[0] + node_i.wp[position_x + tam_ir_removed - 1] - intergenic_regions[-1]),] + node_i.wp[position_x + tam_ir_removed:]
@@ -954,17 +1131,17 @@ class cycle_configuration_graph() :
                 node_i.wp = node_i.ap.wp = final_wp
 
             if (node_i.wp[position_x] < 0) :
-                print("ERRO: A região intergenica resultante na posicao afetada ficou com peso negativo: (wp = %s: del = %s: start_pos_index = %s)" % (
+                raise Sorting_Error("ERRO: A região intergenica resultante na posicao afetada ficou com peso negativo: (wp = %s: del = %s: start_pos_index = %s)" % (
                     str(node_i.wp),
                     str(intergenic_regions),
                     str(position_x)
                 ) )
-                sys.exit()
 
         self.__num_cycles           = False
         self.__num_odd_cycles       = False
         self.__num_balanced_cycles  = False                
-        self.reset_indices()
+        self.refresh_labels((node_i, node_i.ap))
+        self.update_cycle_table((node_i, node_i.ap), False)
         return unp_i
 
     ############################################################                
@@ -1015,12 +1192,29 @@ class cycle_configuration_graph() :
 
             
 
+    ## Cycles in the order they are found walking from end_node to the
+    ## left, each one starting at the right node of its rightmost black
+    ## edge. After nodes moved only their cycles are traced again (see
+    ## update_table), unless the table must be read from scratch.
     def get_cycles(self, want_vertices = False) :
+        if self.cycle_table is None :
+            self.cycle_table = self.read_cycles()
+            self.moved_nodes = set()
+            self.edge_lists  = {}
+        elif self.moved_nodes :
+            self.update_table()
+        cycles, vertices, _ = self.cycle_table
+        if want_vertices :
+            return cycles, vertices
+        return cycles
+
+    def read_cycles(self) :
         self.clean_visit()        
 
         node = self.end_node        
         cycles    = []
         vertices  = []
+        num_odd   = 0
 
         while node :
             if not node.visit :
@@ -1044,11 +1238,110 @@ class cycle_configuration_graph() :
                     
                 cycles.append(tuple(cycle))
                 vertices.append(cycle_nodes)
+                if len(cycle) % 2 == 1 :
+                    num_odd = num_odd + 1
 
             node = node.ap.ab
-        if want_vertices :
-            return tuple(cycles), vertices
-        return tuple(cycles)
+        return tuple(cycles), vertices, num_odd
+
+    ## The cycles of the moved nodes take the place of the old ones in
+    ## the order of the table, the index of their first node (see
+    ## cycle_start) decreasing. A cycle with a changed node is traced
+    ## again as read_cycles does; any other one has the same nodes in
+    ## the same circular order, so its list is turned to start at its
+    ## new first node. The cycles of the other nodes keep their entries
+    ## but their numbers may shift, so we write them again in the nodes
+    ## and in the buckets. The new cycles with a changed node are left
+    ## to calculate_cycles, the others only get their number and
+    ## direction (see renumber_cycle).
+    def update_table(self) :
+        cycles, vertices, num_odd = self.cycle_table
+        moved   = self.moved_nodes
+        changed = self.changed_nodes
+        self.moved_nodes = set()
+
+        old   = sorted(set(node.cycle for node in moved))
+        seen  = set()
+        found = []
+        for r in old :
+            vertice_set = vertices[r]
+            if changed.isdisjoint(vertice_set) :
+                indices = [vertex.index for vertex in vertice_set]
+                t = indices.index(max(indices))
+                if t % 2 == 0 :
+                    cycle_nodes = vertice_set[t:] + vertice_set[:t]
+                    indices     = indices[t:] + indices[:t]
+                else :
+                    ## The first node is the ap of the one before it, so
+                    ## the cycle is read backwards.
+                    cycle_nodes = vertice_set[t::-1] + vertice_set[:t:-1]
+                    indices     = indices[t::-1] + indices[:t:-1]
+                cycle = tuple(-(index+2)/2 if index % 2 == 0 else +(index+1)/2 for index in indices[::2])
+                found.append((cycle, cycle_nodes, MOVED))
+                continue
+
+            for node in vertice_set :
+                if node in seen :
+                    continue
+                start       = self.cycle_start(node)
+                cycle       = []
+                cycle_nodes = []
+                cycle_node  = start
+                while True :
+                    if cycle_node.index % 2 == 0 :
+                        cycle.append( -(cycle_node.index+2)/2 )
+                    else :
+                        cycle.append( +(cycle_node.index+1)/2 )
+                    cycle_nodes.append(cycle_node)
+                    cycle_node = cycle_node.ap
+                    cycle_nodes.append(cycle_node)
+                    cycle_node = cycle_node.ac
+                    if cycle_node is start :
+                        break
+                seen.update(cycle_nodes)
+                found.append((tuple(cycle), cycle_nodes, CHANGED))
+
+        first   = old[0]
+        removed = set(old)
+        table   = [(cycles[i], vertices[i], KEPT) for i in range(first, len(cycles)) if i not in removed]
+        for r in old :
+            num_odd = num_odd - len(cycles[r]) % 2
+        for cycle, _, _ in found :
+            num_odd = num_odd + len(cycle) % 2
+        table.extend(found)
+        table.sort(key = lambda entry : entry[1][0].index, reverse = True)
+
+        cycles   = list(cycles[:first])
+        vertices = vertices[:first]
+        remap    = {}
+        turned   = []
+        for cycle, vertice_set, state in table :
+            i = len(vertices)
+            cycles.append(cycle)
+            vertices.append(vertice_set)
+            if state == CHANGED :
+                for vertex in vertice_set :
+                    vertex.cycle = i
+                continue
+
+            remap[vertice_set[0].cycle] = i
+            if state == MOVED :
+                direction = vertice_set[0].direction
+                self.renumber_cycle(i, cycle, vertice_set)
+                if vertice_set[0].direction != direction :
+                    turned.append(i)
+            elif vertice_set[0].cycle != i :
+                for vertex in vertice_set :
+                    vertex.cycle = i
+
+        self.cycle_table = tuple(cycles), vertices, num_odd
+        if self.bucket_vertices is self.calculated_vertices :
+            for category, bucket in self.buckets.items() :
+                self.buckets[category] = sorted([j if j < first else remap[j] for j in bucket
+                                                 if j < first or j in remap])
+            self.bucket_vertices = vertices
+            self.update_buckets(vertices, turned)
+        self.calculated_vertices = vertices
 
 
     def permutation(self) :
@@ -1086,11 +1379,26 @@ class cycle_configuration_graph() :
             else :
                 node.value = -(node.ac.value - 1)
     
+    ## Left node of the black edge i, 1 <= i <= n.
+    def black_edge(self, i) :
+        return self.node_at(2*i-2)
+
+    ## Node whose index is the given position.
+    def node_at(self, position) :
+        return self.positions[position]
+
+    ## Gives every node its index and fills self.positions, where
+    ## self.positions[p] is the node whose index is p. It walks the
+    ## whole graph, so the operations only use it when the graph is
+    ## built. Afterwards, they update the positions they change with
+    ## the methods below.
     def reset_indices(self) :
         node  = self.begin_node 
         count = 0
+        self.positions = [None] * (2*self.n)
 
         while node :
+            self.positions[count] = node
             node.index = count
 
             node.lp    = len(node.wp)-1
@@ -1099,6 +1407,7 @@ class cycle_configuration_graph() :
             node       = node.ap
             count      = count + 1
             
+            self.positions[count] = node
             node.index = count
 
             node.lp    = len(node.wp)-1
@@ -1107,6 +1416,66 @@ class cycle_configuration_graph() :
             node       = node.ab
             count      = count + 1
 
+    def renumber(self, start, end) :
+        positions = self.positions
+        for position in range(start, end) :
+            positions[position].index = position
+
+    ## Transpositions and reversals list the nodes they move, so the
+    ## cycle table can be updated instead of read again (see
+    ## update_table). Until the table is read there is nothing to update.
+    def record_moved(self, start, end) :
+        if self.moved_nodes is not None :
+            self.moved_nodes.update(self.positions[start:end])
+
+    ## A transposition exchanges the nodes in [start, middle) with the
+    ## nodes in [middle, end).
+    def move_segments(self, start, middle, end) :
+        positions = self.positions
+        positions[start:end] = positions[middle:end] + positions[start:middle]
+        self.renumber(start, end)
+        self.record_moved(start, end)
+
+    ## A reversal reverts the nodes in [start, end).
+    def reverse_segment(self, start, end) :
+        positions = self.positions
+        positions[start:end] = positions[start:end][::-1]
+        self.renumber(start, end)
+        self.record_moved(start, end)
+
+    ## An insertion placed new black edges between the two nodes of the
+    ## black edge that started at the given position. We walk from its
+    ## left node to its right node to collect them.
+    def split_black_edge(self, position) :
+        first = self.node_at(position)
+        last  = self.node_at(position+1)
+        nodes = [first]
+        node  = first
+        while node != last :
+            node = node.ap
+            nodes.append(node)
+            if node != last :
+                node = node.ab
+                nodes.append(node)
+        self.positions[position:position+2] = nodes
+        self.renumber(position, len(self.positions))
+
+    ## Reverts the intergenic regions of the labeled black edges whose
+    ## nodes are in [start, end). A reversal calls it before changing
+    ## the edges, so the regions keep their order in the new genome.
+    def reverse_labeled_weights(self, start, end) :
+        for position in range(start, end, 2) :
+            node = self.node_at(position)
+            if len(node.wp) > 1 :
+                node.wp = node.ap.wp = node.wp[::-1]
+
+    ## Operations change the weights of a few nodes, here we update the
+    ## number of labels of those nodes.
+    def refresh_labels(self, nodes) :
+        for node in nodes :
+            node.lp = len(node.wp)-1
+            node.lc = len(node.wc)-1
+
     def num_cycles(self) :
         if type(self.__num_cycles) == bool :
             self.calculate_cycles()
@@ -1120,63 +1489,270 @@ class cycle_configuration_graph() :
 
     def calculate_cycles(self) :
         cycles, vertices = self.get_cycles(want_vertices = True)
-        num_cycles = len(cycles)
-        num_odd = 0
-        is_labeled = False
+        _, _, num_odd    = self.cycle_table
 
-        for cycle in cycles :
-            if len(cycle) % 2 == 1 :
-                num_odd = num_odd + 1
-
-        self.__num_cycles           = num_cycles
+        self.__num_cycles           = len(cycles)
         self.__num_odd_cycles       = num_odd
 
-        for i in range(len(cycles)) :            
-            cycle = cycles[i]
-            size = len(cycle)
+        changed = self.changed_nodes
+        if changed is None :
+            for i in range(len(cycles)) :
+                self.calculate_cycle(i, cycles[i], vertices[i])
+            self.buckets = {}
+        elif changed or vertices is not self.calculated_vertices :
+            ## The nodes keep the number of their cycles while the
+            ## table is the same or updated (see update_table),
+            ## otherwise we look for the first node of each changed
+            ## cycle.
+            if vertices is self.calculated_vertices :
+                dirty = set(node.cycle for node in changed)
+            else :
+                first = {}
+                for i in range(len(vertices)) :
+                    first[vertices[i][0]] = i
+                dirty = set(first[self.cycle_start(node)] for node in changed)
+
+            if vertices is self.calculated_vertices :
+                for i in dirty :
+                    self.calculate_cycle(i, cycles[i], vertices[i])
+                self.update_buckets(vertices, dirty)
+            else :
+                for i in range(len(cycles)) :
+                    if i in dirty :
+                        self.calculate_cycle(i, cycles[i], vertices[i])
+                    else :
+                        self.renumber_cycle(i, cycles[i], vertices[i])
+                self.buckets = {}
 
-            direction = 1
-            for el in cycle :
-                if (el < 0) :
-                    direction = 2
-                    break
+        self.changed_nodes       = set()
+        self.calculated_vertices = vertices
 
-            blacks   = 0
-            grays    = 0
-            vertice_set = vertices[i]
-            is_gray_labeled = False
-            is_black_labeled = False
-            for vertex in vertice_set :
-                if len(vertex.wc) == 1 :
-                    vertex.lc = 0
-                    vertex.wcs = vertex.wc[0]
-                    grays   = grays   + vertex.wcs
-                else :
-                    vertex.lc = len(vertex.wc) - 1
-                    vertex.wcs = vertex.wc[0] + vertex.wc[-1]
-                    is_gray_labeled = True
-                    grays   = grays   + vertex.wcs
-                if len(vertex.wp) == 1 :
-                    vertex.lp = 0
-                    vertex.wps = vertex.wp[0]
-                    blacks  = blacks  + vertex.wps
-                else :
-                    vertex.lp = len(vertex.wp) - 1
-                    vertex.wps = vertex.wp[0] + vertex.wp[-1]
-                    is_black_labeled = True
-                    blacks  = blacks  + vertex.wps
-            grays  = grays  // 2
-            blacks = blacks // 2
+    ## Computes the attributes of the i-th cycle and stores them in all
+    ## of its vertices.
+    def calculate_cycle(self, i, cycle, vertice_set) :
+        size = len(cycle)
 
+        direction = 1
+        for el in cycle :
+            if (el < 0) :
+                direction = 2
+                break
+
+        blacks   = 0
+        grays    = 0
+        is_gray_labeled = False
+        is_black_labeled = False
+        for vertex in vertice_set :
+            if len(vertex.wc) == 1 :
+                vertex.lc = 0
+                vertex.wcs = vertex.wc[0]
+                grays   = grays   + vertex.wcs
+            else :
+                vertex.lc = len(vertex.wc) - 1
+                vertex.wcs = vertex.wc[0] + vertex.wc[-1]
+                is_gray_labeled = True
+                grays   = grays   + vertex.wcs
+            if len(vertex.wp) == 1 :
+                vertex.lp = 0
+                vertex.wps = vertex.wp[0]
+                blacks  = blacks  + vertex.wps
+            else :
+                vertex.lp = len(vertex.wp) - 1
+                vertex.wps = vertex.wp[0] + vertex.wp[-1]
+                is_black_labeled = True
+                blacks  = blacks  + vertex.wps
+        grays  = grays  // 2
+        blacks = blacks // 2
+
+        for vertex in vertice_set :
+            vertex.size      = size
+            vertex.grays     = grays
+            vertex.blacks    = blacks
+            vertex.direction = direction                
+            #vertex.kind  = kind
+            vertex.cycle = i
+            vertex.gray_labeled = is_gray_labeled
+            vertex.black_labeled = is_black_labeled
+
+    ## Nodes moved but the cycle did not change. Only its number and
+    ## its direction may be different (a reversal can turn a cycle with
+    ## black edges on both sides of the segment from convergent into
+    ## divergent and vice versa).
+    def renumber_cycle(self, i, cycle, vertice_set) :
+        direction = 1
+        for el in cycle :
+            if (el < 0) :
+                direction = 2
+                break
+        if vertice_set[0].cycle != i or vertice_set[0].direction != direction :
             for vertex in vertice_set :
-                vertex.size      = size
-                vertex.grays     = grays
-                vertex.blacks    = blacks
-                vertex.direction = direction                
-                #vertex.kind  = kind
-                vertex.cycle = i
-                vertex.gray_labeled = is_gray_labeled
-                vertex.black_labeled = is_black_labeled
+                vertex.cycle     = i
+                vertex.direction = direction
+
+    ## First node of the cycle of the given node in get_cycles, that is,
+    ## the node with the largest index.
+    def cycle_start(self, node) :
+        start   = node
+        current = node
+        while True :
+            current = current.ap
+            if current.index > start.index :
+                start = current
+            current = current.ac
+            if current == node :
+                return start
+            if current.index > start.index :
+                start = current
+
+    ## Cycles of the given category (see CYCLE_CATEGORIES) in the order
+    ## of get_cycles, so a lemma gets its first candidate right away.
+    def cycles_in(self, category) :
+        _, vertices = self.get_cycles(want_vertices = True)
+        for i in self.cycle_bucket(category) :
+            yield vertices[i]
+
+    def count_cycles(self, category) :
+        return len(self.cycle_bucket(category))
+
+    ## The bucket of a category is built the first time it is asked for
+    ## a table and updated by calculate_cycles as long as the table does
+    ## not change.
+    def cycle_bucket(self, category) :
+        _, vertices = self.get_cycles(want_vertices = True)
+        if self.bucket_vertices is not vertices :
+            self.buckets         = {}
+            self.bucket_vertices = vertices
+
+        bucket = self.buckets.get(category)
+        if bucket is None :
+            rule   = CYCLE_CATEGORIES[category]
+            bucket = [i for i in range(len(vertices)) if rule(vertices[i][0])]
+            self.buckets[category] = bucket
+        return bucket
+
+    ## With many changed cycles (e.g. after Intergenic_Rev.trivial_indels)
+    ## it is cheaper to build the buckets again when they are asked for.
+    def update_buckets(self, vertices, dirty) :
+        if self.bucket_vertices is not vertices or 8*len(dirty) > len(vertices) :
+            self.buckets = {}
+            return
+
+        for category, bucket in self.buckets.items() :
+            rule = CYCLE_CATEGORIES[category]
+            for i in dirty :
+                position = bisect.bisect_left(bucket, i)
+                present  = position < len(bucket) and bucket[position] == i
+                if rule(vertices[i][0]) :
+                    if not present :
+                        bucket.insert(position, i)
+                elif present :
+                    del bucket[position]
+
+    ## Prefix sums of the black (wp) and gray (wc) weights of the i-th
+    ## cycle, taken in the order of its vertices. Walking from a vertex
+    ## at an even place, as __sum_weight_in_segment does, we add the
+    ## black weight of the even places and the gray weight of the odd
+    ## ones; from an odd place we walk back and it is the other way
+    ## around. The sums are built the first time a cycle is asked for.
+    def cycle_prefix_sums(self, i, vertice_set) :
+        sums = self.cycle_sums.get(i)
+        if sums is not None and sums[0] is vertice_set :
+            return sums
+
+        place = {}
+        forward_blacks,  forward_grays  = [0], [0]
+        backward_blacks, backward_grays = [0], [0]
+        for t in range(0, len(vertice_set), 2) :
+            even, odd = vertice_set[t], vertice_set[t+1]
+            place[even], place[odd] = t, t+1
+            forward_blacks.append(forward_blacks[-1] + even.wp[0] + (even.wp[-1] if len(even.wp) > 1 else 0))
+            forward_grays.append(forward_grays[-1] + odd.wc[0] + (odd.wc[-1] if len(odd.wc) > 1 else 0))
+            backward_blacks.append(backward_blacks[-1] + odd.wp[0] + (odd.wp[-1] if len(odd.wp) > 1 else 0))
+            backward_grays.append(backward_grays[-1] + even.wc[0] + (even.wc[-1] if len(even.wc) > 1 else 0))
+
+        sums = (vertice_set, place, forward_blacks, forward_grays, backward_blacks, backward_grays)
+        self.cycle_sums[i] = sums
+        return sums
+
+    ## Black and gray weights of the segment of a cycle that starts at
+    ## init and goes up to end following ap and then ac, in O(1) once
+    ## the prefix sums of the cycle are built. Returns None if init and
+    ## end are not in the cycle of init.cycle at places of the same
+    ## parity, so the caller walks the segment instead.
+    def segment_weights(self, init, end) :
+        _, vertices = self.get_cycles(want_vertices = True)
+        i = init.cycle
+        if not 0 <= i < len(vertices) :
+            return None
+        _, place, forward_blacks, forward_grays, backward_blacks, backward_grays = self.cycle_prefix_sums(i, vertices[i])
+        start, stop = place.get(init), place.get(end)
+        if start is None or stop is None or start % 2 != stop % 2 :
+            return None
+
+        if start % 2 == 0 :
+            start, stop   = start // 2, stop // 2
+            blacks, grays = forward_blacks, forward_grays
+        else :
+            ## Going back from place 2u+1 we add the pairs u, u-1, ...
+            start, stop   = stop // 2 + 1, start // 2 + 1
+            blacks, grays = backward_blacks, backward_grays
+        if start > stop :
+            return (blacks[-1] - blacks[start] + blacks[stop],
+                    grays[-1]  - grays[start]  + grays[stop])
+        return blacks[stop] - blacks[start], grays[stop] - grays[start]
+
+    ## Black edges of the i-th cycle in the order of the genome: the
+    ## sorted indices of their right ends (odd indices) and the right
+    ## ends themselves. They are the nodes the walks from end_node over
+    ## ap and ab go through, so a cycle has a black edge between two
+    ## such nodes if a binary search on its indices says so. An entry
+    ## of the table that update_table keeps has the same nodes at the
+    ## same indices, so its edges are only built once.
+    def cycle_edges(self, i) :
+        _, vertices = self.get_cycles(want_vertices = True)
+        vertice_set = vertices[i]
+        edges = self.edge_lists.get(vertice_set[0])
+        if edges is None or edges[2] is not vertice_set :
+            nodes = []
+            for t in range(0, len(vertice_set), 2) :
+                if vertice_set[t].index > vertice_set[t+1].index :
+                    nodes.append(vertice_set[t])
+                else :
+                    nodes.append(vertice_set[t+1])
+            nodes.sort(key = lambda node : node.index)
+            edges = ([node.index for node in nodes], nodes, vertice_set)
+            self.edge_lists[vertice_set[0]] = edges
+        return edges[0], edges[1]
+
+    ## True if the i-th cycle has a black edge whose right end has an
+    ## index between low and high.
+    def has_edge_between(self, i, low, high) :
+        indices, _ = self.cycle_edges(i)
+        place = bisect.bisect_right(indices, low)
+        return place < len(indices) and indices[place] < high
+
+    ## The operations tell the cycle table which nodes had their edges
+    ## or weights changed (None for every node) and whether any node
+    ## moved. The table is read again if it cannot be updated, that is,
+    ## if we do not know the moved nodes or the numbers of their cycles,
+    ## or if too many nodes moved (see MOVED_FRACTION). Only transpositions
+    ## and reversals of the list backend list their moved nodes (see
+    ## record_moved): an insertion shifts the index of every node after
+    ## it and the tree backend does not enumerate the nodes it moves, so
+    ## both read the table again. Deletions only change weights.
+    def update_cycle_table(self, nodes, moved) :
+        self.cycle_sums = {}
+        if moved :
+            if (nodes is None or self.moved_nodes is None or self.cycle_table is None or
+                self.cycle_table[1] is not self.calculated_vertices or
+                len(self.moved_nodes) > MOVED_FRACTION*len(self.positions)) :
+                self.cycle_table = None
+            else :
+                self.moved_nodes.update(nodes)
+        if nodes is None :
+            self.changed_nodes = None
+        elif self.changed_nodes is not None :
+            self.changed_nodes.update(nodes)
 
     def clean_visit(self) :
         node = self.begin_node
@@ -1189,6 +1765,352 @@ class cycle_configuration_graph() :
 
 
 
+############################################################################
+########### Implicit balanced tree with the order of the genome ############
+############################################################################
+
+## The list backend above renumbers every node of a moved segment, so
+## a long reversal or transposition costs O(n). The tree backend keeps
+## the walk begin_node, ap, ab, ap, ..., end_node in an implicit treap
+## instead. Each item of the tree holds the two nodes of a white (ab)
+## edge, except for the first and the last items, which hold only
+## begin_node and end_node. The position of an item is never stored:
+## it is the number of nodes in the items to its left, so moving or
+## reverting a segment only changes O(log n) items and index queries
+## climb from the item to the root.
+
+class tree_item :
+    __slots__ = ("nodes", "count", "priority", "left", "right", "parent",
+                 "flip", "reverse")
+
+    def __init__(self, nodes, priority) :
+        self.nodes    = nodes
+        self.count    = len(nodes)  # number of nodes in the subtree
+        self.priority = priority
+        self.left     = None
+        self.right    = None
+        self.parent   = None
+
+        ## flip    : the nodes are read from the last to the first
+        ## reverse : the subtree must still be reverted (lazy flag)
+        self.flip     = False
+        self.reverse  = False
+
+def tree_count(item) :
+    if item is None :
+        return 0
+    return item.count
+
+def tree_push(item) :
+    if item.reverse :
+        item.left, item.right = item.right, item.left
+        item.flip    = not item.flip
+        item.reverse = False
+        if item.left :
+            item.left.reverse = not item.left.reverse
+        if item.right :
+            item.right.reverse = not item.right.reverse
+
+def tree_update(item) :
+    item.count = len(item.nodes) + tree_count(item.left) + tree_count(item.right)
+    if item.left :
+        item.left.parent = item
+    if item.right :
+        item.right.parent = item
+
+## Splits the tree in the first k nodes and the remaining ones. Every
+## position used by the operations is the first node of an item.
+def tree_split(item, k) :
+    if item is None :
+        return None, None
+    tree_push(item)
+    if k <= tree_count(item.left) :
+        left, right = tree_split(item.left, k)
+        item.left = right
+        tree_update(item)
+        if left :
+            left.parent = None
+        return left, item
+    else :
+        left, right = tree_split(item.right, k - tree_count(item.left) - len(item.nodes))
+        item.right = left
+        tree_update(item)
+        if right :
+            right.parent = None
+        return item, right
+
+def tree_merge(left, right) :
+    if left is None :
+        return right
+    if right is None :
+        return left
+    if left.priority > right.priority :
+        tree_push(left)
+        left.right = tree_merge(left.right, right)
+        tree_update(left)
+        return left
+    else :
+        tree_push(right)
+        right.left = tree_merge(left, right.left)
+        tree_update(right)
+        return right
+
+## Builds a tree with the items in the given order in O(len(items)),
+## as a cartesian tree of their priorities.
+def tree_build(items) :
+    stack = []
+    for item in items :
+        last = None
+        while stack and stack[-1].priority < item.priority :
+            last = stack.pop()
+        item.left = last
+        if stack :
+            stack[-1].right = item
+        stack.append(item)
+
+    if not stack :
+        return None
+    root  = stack[0]
+    order = [root]
+    for item in order :
+        if item.left :
+            order.append(item.left)
+        if item.right :
+            order.append(item.right)
+    for item in reversed(order) :
+        tree_update(item)
+    root.parent = None
+    return root
+
+## Number of nodes to the left of the item. The lazy flags of its
+## ancestors are pushed first, so the children are in their places.
+def tree_position(item) :
+    path = []
+    ancestor = item
+    while ancestor is not None :
+        path.append(ancestor)
+        ancestor = ancestor.parent
+    for ancestor in reversed(path) :
+        tree_push(ancestor)
+
+    position = tree_count(item.left)
+    while item.parent is not None :
+        if item is item.parent.right :
+            position += tree_count(item.parent.left) + len(item.parent.nodes)
+        item = item.parent
+    return position
+
+def tree_node_at(item, position) :
+    while True :
+        tree_push(item)
+        left = tree_count(item.left)
+        if position < left :
+            item = item.left
+        elif position < left + len(item.nodes) :
+            side = position - left
+            if item.flip :
+                side = len(item.nodes) - 1 - side
+            return item.nodes[side]
+        else :
+            position -= left + len(item.nodes)
+            item = item.right
+
+
+## A node of the tree backend computes its index from its item. Until
+## the node is placed in the tree (while the graph or an insertion is
+## being built), the index is the one given to it.
+class tree_graph_node(cycle_graph_node) :
+    __slots__ = ("item", "side", "fixed_index")
+
+    def __init__(self, index, padded) :
+        self.item = None
+        self.side = 0
+        cycle_graph_node.__init__(self, index, padded)
+
+    def get_index(self) :
+        item = self.item
+        if item is None :
+            return self.fixed_index
+        position = tree_position(item)
+        if item.flip :
+            return position + len(item.nodes) - 1 - self.side
+        return position + self.side
+
+    def set_index(self, index) :
+        self.fixed_index = index
+
+    index = property(get_index, set_index)
+
+
+## Same graph as cycle_configuration_graph, with the positions kept in
+## an implicit treap. Moving or reverting a segment and the indels
+## change O(log n) items of the tree instead of renumbering the
+## segment, but the cycle table is still read again after each of them
+## and every index query climbs the tree, so a whole sort is slower
+## than with the list backend (about 3x at n = 1000 and 2x at n = 3000,
+## both growing quadratically). The results are the same.
+class tree_configuration_graph(cycle_configuration_graph) :
+    __slots__  = ("random", "root", "labeled")
+    node_class = tree_graph_node
+
+    def __init__(self, cycles, weight_gray, weight_black, final_length) :
+        ## The shape of the tree does not change the result, the seed
+        ## only makes the running times reproducible.
+        self.random = random.Random(len(cycles))
+        self.root    = None
+        self.labeled = set()
+        cycle_configuration_graph.__init__(self, cycles, weight_gray, weight_black, final_length)
+        self.reset_indices()
+
+    def new_item(self, nodes) :
+        item = tree_item(nodes, self.random.random())
+        for side in range(len(nodes)) :
+            nodes[side].item = item
+            nodes[side].side = side
+        return item
+
+    ## Builds the tree from a walk over the whole graph and keeps the
+    ## set of nodes of labeled black edges, which reversals revert.
+    def reset_indices(self) :
+        self.positions = None
+        self.labeled   = set()
+        nodes = []
+        node  = self.begin_node
+        while node :
+            nodes.append(node)
+            node = node.ap
+            nodes.append(node)
+            node = node.ab
+
+        items = [self.new_item((nodes[0],))]
+        for position in range(1, len(nodes)-1, 2) :
+            items.append(self.new_item((nodes[position], nodes[position+1])))
+        items.append(self.new_item((nodes[-1],)))
+        self.root = tree_build(items)
+        self.refresh_labels(nodes)
+
+    def node_at(self, position) :
+        return tree_node_at(self.root, position)
+
+    ## The moved nodes are not enumerated here, so the cycle table is
+    ## read again after a transposition or a reversal.
+    def move_segments(self, start, middle, end) :
+        self.moved_nodes = None
+        left, rest    = tree_split(self.root, start)
+        first, rest   = tree_split(rest, middle - start)
+        second, right = tree_split(rest, end - middle)
+        self.root = tree_merge(tree_merge(left, second), tree_merge(first, right))
+        self.root.parent = None
+
+    def reverse_segment(self, start, end) :
+        self.moved_nodes = None
+        left, rest     = tree_split(self.root, start)
+        segment, right = tree_split(rest, end - start)
+        segment.reverse = not segment.reverse
+        self.root = tree_merge(tree_merge(left, segment), right)
+        self.root.parent = None
+
+    def split_black_edge(self, position) :
+        first = self.node_at(position)
+        last  = self.node_at(position+1)
+        nodes = [first]
+        node  = first.ap
+        while node != last :
+            nodes.append(node)
+            nodes.append(node.ab)
+            node = node.ab.ap
+        nodes.append(last)
+
+        items = [self.new_item((nodes[k], nodes[k+1])) for k in range(1, len(nodes)-1, 2)]
+        left, right = tree_split(self.root, position+1)
+        self.root = tree_merge(tree_merge(left, tree_build(items)), right)
+        self.root.parent = None
+        self.refresh_labels(nodes)
+
+    def reverse_labeled_weights(self, start, end) :
+        for node in list(self.labeled) :
+            index = node.index
+            if start <= index < end and index < node.ap.index :
+                node.wp = node.ap.wp = node.wp[::-1]
+
+    def refresh_labels(self, nodes) :
+        cycle_configuration_graph.refresh_labels(self, nodes)
+        for node in nodes :
+            if node.lp > 0 :
+                self.labeled.add(node)
+            else :
+                self.labeled.discard(node)
+
+
+## Graph classes that Intergenic_Rev can sort with.
+GRAPH_BACKENDS = {
+    "list" : cycle_configuration_graph,
+    "tree" : tree_configuration_graph,
+}
+
+
+############################################################################
+################ First interval that meets a given interval ################
+############################################################################
+
+## Closed intervals, each one with a place, added from the last place
+## to the first. first(low, high) is the lowest place of an interval
+## added so far that meets [low, high]: either its low end is in
+## [low, high] or it contains low. Both are kept in segment trees over
+## keys, the sorted values of every end of the intervals and of the
+## queries. As places only decrease, a tree node keeps the place of the
+## last interval that reached it, which is also the lowest one.
+
+class interval_index :
+    __slots__ = ("keys", "size", "none", "starts", "covers")
+
+    def __init__(self, keys, none) :
+        self.keys   = keys
+        self.size   = len(keys)
+        self.none   = none              # place returned if no interval meets
+        self.starts = [none] * (2*self.size) # places by low end
+        self.covers = [none] * (2*self.size) # places by covered keys
+
+    def add(self, low, high, place) :
+        low  = bisect.bisect_left(self.keys, low)  + self.size
+        high = bisect.bisect_left(self.keys, high) + self.size + 1
+
+        item = low
+        while item :
+            self.starts[item] = place
+            item >>= 1
+
+        while low < high :
+            if low & 1 :
+                self.covers[low] = place
+                low += 1
+            if high & 1 :
+                high -= 1
+                self.covers[high] = place
+            low, high = low >> 1, high >> 1
+
+    def first(self, low, high) :
+        low  = bisect.bisect_left(self.keys, low)  + self.size
+        high = bisect.bisect_left(self.keys, high) + self.size + 1
+
+        place = self.none
+        item  = low
+        while item :
+            place = min(place, self.covers[item])
+            item >>= 1
+
+        while low < high :
+            if low & 1 :
+                place = min(place, self.starts[low])
+                low += 1
+            if high & 1 :
+                high -= 1
+                place = min(place, self.starts[high])
+            low, high = low >> 1, high >> 1
+        return place
+
+
+
 ############################################################################
 ############### Do not need to sort a real permutation #####################
 ############################################################################
@@ -1201,39 +2123,95 @@ class cycle_configuration_graph() :
 ## If the input cycle configuration is a full component, then we
 ## guarantee that the final permutation is the identity.
 
+## With distance_only the sort only counts the operations of each kind
+## (see Operation_Counts) and the input is not kept as strings for the
+## output line. With profile the lemmas are timed (see Lemma_Profile).
 class Intergenic_Rev :
-    def __init__(self, cycles, wgray, wblack, final_length) :
-        self.input_cycles  = str(cycles).replace(" ", "")
-        self.input_wgray   = str(wgray).replace(" ", "")[1:-1]
-        self.input_wblack  = str(wblack).replace(" ", "")[1:-1]
+    def __init__(self, cycles, wgray, wblack, final_length, backend = "list", distance_only = False, profile = False) :
+        self.distance_only = distance_only
+        if distance_only :
+            self.input_cycles = self.input_wgray = self.input_wblack = ""
+        else :
+            self.input_cycles  = str(cycles).replace(" ", "")
+            self.input_wgray   = str(wgray).replace(" ", "")[1:-1]
+            self.input_wblack  = str(wblack).replace(" ", "")[1:-1]
                         
-        self.graph      = cycle_configuration_graph(cycles,
-                                                    wgray,
-                                                    wblack,
-                                                    final_length)
+        self.graph      = GRAPH_BACKENDS[backend](cycles,
+                                                      wgray,
+                                                      wblack,
+                                                      final_length)
         self.randomized = False
 
-    def get_num_balanced(self, vertices) :
-        num_balanced = 0
-        for vertice in vertices :
-            if vertice[0].grays == vertice[0].blacks :
-                num_balanced = num_balanced + 1
-        return num_balanced
-
-    def get_num_clean_balanced(self, vertices) :
-        num_balanced = 0
-        for vertice in vertices :
-            if vertice[0].grays == vertice[0].blacks and vertice[0].black_labeled == False and vertice[0].gray_labeled == False:
-                num_balanced = num_balanced + 1
-        return num_balanced
+        self.profile = None
+        if profile :
+            self.profile = Lemma_Profile()
+            for name in dir(self) :
+                if name.startswith("lemma_") or name == "trivial_indels" :
+                    setattr(self, name, self.profile.lemma(name, getattr(self, name)))
+                elif name.startswith("search_") and name.endswith("_indel") :
+                    setattr(self, name, self.profile.search(getattr(self, name)))
+
+    def get_num_balanced(self, graph) :
+        return graph.count_cycles("balanced")
+
+    def get_num_clean_balanced(self, graph) :
+        return graph.count_cycles("clean-balanced")
     
+    ## Every search starts with lemma_5 and lemma_6, so the sort begins
+    ## with their indels on the trivial cycles, one per iteration. An
+    ## indel that inserts no gene only changes the weights of its own
+    ## cycle and moves no node, so we apply them here in the order the
+    ## loop would and recalculate the cycles once at the end. The two
+    ## categories are heaps of cycle numbers: we recalculate only the
+    ## cycle we changed, push it back if it is still in a category and
+    ## drop the heads that are no longer in theirs. We stop at the first
+    ## indel that inserts genes and leave the rest to the loop. Returns
+    ## the number of indels applied.
+    def trivial_indels(self, graph, sequence) :
+        start = len(sequence)
+        graph.calculate_cycles()
+        cycles, vertices = graph.get_cycles(want_vertices = True)
+        unbalanced = list(graph.cycle_bucket("trivial-unbalanced"))
+        negative   = list(graph.cycle_bucket("trivial-negative"))
+        categories = ((unbalanced, CYCLE_CATEGORIES["trivial-unbalanced"]),
+                      (negative,   CYCLE_CATEGORIES["trivial-negative"]))
+
+        while True :
+            for heap, rule in categories :
+                while heap and not rule(vertices[heap[0]][0]) :
+                    heapq.heappop(heap)
+            if unbalanced :
+                i = unbalanced[0]
+                if vertices[i][0].gray_labeled :
+                    break
+                operation = self.__lemma_5_indel(vertices[i])
+            elif negative :
+                i = negative[0]
+                operation = self.__lemma_6_indel(vertices[i])
+            else :
+                break
+
+            op = self.format_node_to_operations_indel(operation)
+            graph.indel(op[0], op[1], op[2], op[3][0], op[3][1])
+            if self.distance_only :
+                sequence.append('INS' if op[0] else 'DEL')
+            else :
+                sequence.append(tuple(['INS' if op[0] else 'DEL', op[1], op[2], op[3][0][:], op[3][1][:]]))
+
+            graph.calculate_cycle(i, cycles[i], vertices[i])
+            for heap, rule in categories :
+                if rule(vertices[i][0]) :
+                    heapq.heappush(heap, i)
+
+        graph.calculate_cycles()
+        return len(sequence) - start
+
     def sort(self, start_time, allowed_ops) :
-        sequence = []
+        sequence = Operation_Counts() if self.distance_only else []
         graph = self.graph
 
         graph.calculate_cycles()
-        _, vertices = graph.get_cycles(want_vertices = True)
-        num_balanced = self.get_num_clean_balanced(vertices)
+        num_balanced = self.get_num_clean_balanced(graph)
         if DEBUG :
             print("NUM BALANCED --> %s" % num_balanced)
         if allowed_ops == 'R' :
@@ -1245,12 +2223,15 @@ class Intergenic_Rev :
         else : # ops == 'RT'
             max_approx = 4.0
             lowerb = float( graph.n - num_balanced )/2.0
+        if self.profile :
+            self.profile.sequence = sequence
+        self.trivial_indels(graph, sequence)
         while True :
             if DEBUG :
                 print(graph.get_cycles())
                 print(graph.to_string())
                 graph.calculate_cycles()
-                permaux = eval("[%s]" % graph.permutation())
+                permaux = parse_int_list(graph.permutation())
                 permauxneg = sum(1 for nneg in permaux if nneg < 0)
 
                 #_, vertices = graph.get_cycles(want_vertices = True)
@@ -1291,16 +2272,28 @@ class Intergenic_Rev :
                         print("OPERACAO", op)
                     if op[0] == 0 :
                         graph.indel(op[0], op[1],op[2],op[3][0], op[3][1])
-                        sequence.append(tuple(['DEL', op[1], op[2], op[3][0][:], op[3][1][:]]))
+                        if self.distance_only :
+                            sequence.append('DEL')
+                        else :
+                            sequence.append(tuple(['DEL', op[1], op[2], op[3][0][:], op[3][1][:]]))
                     if op[0] == 1 :
                         graph.indel(op[0], op[1],op[2],op[3][0], op[3][1])
-                        sequence.append(tuple(['INS', op[1], op[2], op[3][0][:], op[3][1][:]]))
+                        if self.distance_only :
+                            sequence.append('INS')
+                        else :
+                            sequence.append(tuple(['INS', op[1], op[2], op[3][0][:], op[3][1][:]]))
                     if op[0] == 2 :
                         graph.reversal2(op[1],op[2],op[3][0], op[3][1], op[3][2], op[3][3])
-                        sequence.append(tuple(['REV',op[1],op[2],op[3][0],op[3][1]]))
+                        if self.distance_only :
+                            sequence.append('REV')
+                        else :
+                            sequence.append(tuple(['REV',op[1],op[2],op[3][0],op[3][1]]))
                     if op[0] == 3 :
                         graph.transposition2(op[1],op[2], op[3], op[4][0], op[4][1], op[4][2])
-                        sequence.append(tuple(['TRANSP',op[1],op[2],op[3],[op[4][0][0],op[4][1][0],op[4][2][0]]]))
+                        if self.distance_only :
+                            sequence.append('TRANSP')
+                        else :
+                            sequence.append(tuple(['TRANSP',op[1],op[2],op[3],[op[4][0][0],op[4][1][0],op[4][2][0]]]))
                     if DEBUG :
                         print(graph.to_string())
                     #print(op)
@@ -1310,8 +2303,7 @@ class Intergenic_Rev :
             # Abaixo apenas depuracao        
             ##################################################
             graph.calculate_cycles()
-            _, vertices = graph.get_cycles(want_vertices = True)
-            num_balanced = self.get_num_balanced(vertices)
+            num_balanced = self.get_num_balanced(graph)
             #print(num_balanced)
             #if len(operations) > 1 :
             #    print("depois...",graph.to_string())
@@ -1321,37 +2313,25 @@ class Intergenic_Rev :
             
             
         graph.calculate_cycles()
-        _, vertices = graph.get_cycles(want_vertices = True)
-        num_balanced = 0
-        for vertice in vertices :
-            if vertice[0].grays == vertice[0].blacks :
-                num_balanced = num_balanced + 1
+        num_balanced = self.get_num_balanced(graph)
 
         if num_balanced == graph.final_n :
-            if (((1.0*len(sequence))/lowerb) <= max_approx) :
-                print('%s [%s] [%s] %d %s %f %f' % (self.input_cycles,
-                               self.input_wgray,
-                               self.input_wblack,
-                               len(sequence),
-                               str(sequence).replace(" ", ""),
-                               len(sequence)/lowerb,
-                               float(time.time() - start_time)))
+            if len(sequence) == 0 or (lowerb and ((1.0*len(sequence))/lowerb) <= max_approx) :
+                status = Sort_Result.OK
             else :
-                print('%s [%s] [%s] %d %s %f %f ERROR-LOWER-BOUND-HIGHER' % (self.input_cycles,
-                               self.input_wgray,
-                               self.input_wblack,
-                               len(sequence),
-                               str(sequence).replace(" ", ""),
-                               len(sequence)/lowerb,
-                               time.time() - start_time))
+                status = Sort_Result.BOUND_EXCEEDED
         else :
-            print('%s [%s] [%s] %d %s %f %f ERROR-NOT-SORTED' % (self.input_cycles,
-                               self.input_wgray,
-                               self.input_wblack,
-                               len(sequence),
-                               str(sequence).replace(" ", ""),
-                               len(sequence)/lowerb,
-                               time.time() - start_time))
+            status = Sort_Result.NOT_SORTED
+
+        result = Sort_Result(sequence, lowerb, max_approx,
+                             float(time.perf_counter() - start_time), status)
+        result.input_cycles = self.input_cycles
+        result.input_wgray  = self.input_wgray
+        result.input_wblack = self.input_wblack
+        if self.profile :
+            self.profile.count_operations()
+            result.profile = self.profile
+        return result
      
 
     def format_node_to_operations_indel(self,operation) :
@@ -1634,8 +2614,7 @@ class Intergenic_Rev :
                 if node.index == v_j.index :                    
                     return True
             return False
-        print ("Error: Edges in different cycles")
-        sys.exit()
+        raise Sorting_Error("Error: Edges in different cycles")
 
 
     ## Search crossing edges. The point of this method is to find a
@@ -1652,33 +2631,45 @@ class Intergenic_Rev :
         if b.index % 2 == 0 :
             b = b.ap
 
+        ## We look for a cycle with black edges between a and b (half2)
+        ## and out of them (half1), checked in the black edges of each
+        ## cycle. A trivial cycle, or one whose rightmost black edge
+        ## (its first node, see get_cycles) is not after a, cannot be.
+        _, vertices = graph.get_cycles(want_vertices = True)
         half1 = {}
         half2 = {}
-        
-        ## starting the search
-        node = graph.end_node
-        while node != b :
-            half1[node.cycle] = node
-            node = node.ap.ab
-                    
-        node = b.ap.ab
-        while node != a :
-            half2[node.cycle] = node
-            node = node.ap.ab
-        
-        node = a.ap.ab
-        while node :
-            half1[node.cycle] = node
-            node = node.ap.ab
-
-        for key in list(half1.keys()) :
-            if key in half2 :
-                a,b = half1[key], half2[key]
-                if ( key != v_i.cycle or
-                     self.__check_convergency(graph, a, b) ) :
-                    if a.index > b.index :
-                        a,b = b,a
-                    return a,b
+        order = []
+        for key in range(len(vertices)) :
+            if len(vertices[key]) == 2 or vertices[key][0].index <= a.index :
+                continue
+            indices, nodes = graph.cycle_edges(key)
+            if not graph.has_edge_between(key, a.index, b.index) :
+                continue
+            if indices[0] >= a.index and indices[-1] <= b.index :
+                continue
+
+            ## Walking from end_node to the left, a cycle enters half1
+            ## at its rightmost black edge after b, that is, in the
+            ## order of get_cycles, or else at its rightmost black edge
+            ## before a. The node kept is the leftmost one.
+            if indices[-1] > b.index :
+                order.append(((0, key), key))
+            else :
+                order.append(((1, -indices[bisect.bisect_left(indices, a.index) - 1]), key))
+            if indices[0] < a.index :
+                half1[key] = nodes[0]
+            else :
+                half1[key] = nodes[bisect.bisect_right(indices, b.index)]
+            half2[key] = nodes[bisect.bisect_right(indices, a.index)]
+        order.sort()
+
+        for _, key in order :
+            a,b = half1[key], half2[key]
+            if ( key != v_i.cycle or
+                 self.__check_convergency(graph, a, b) ) :
+                if a.index > b.index :
+                    a,b = b,a
+                return a,b
 
     ## This is an auxiliary method called in the next method for
     ## simplicity. Remember we are talking about reversals. In order
@@ -1738,6 +2729,9 @@ class Intergenic_Rev :
 
     ## use this just for transpositions
     def __sum_weight_in_segment(self, init, end) :
+        weights = self.graph.segment_weights(init, end)
+        if weights is not None :
+            return weights
         node = init
         blacks = 0
         grays  = 0
@@ -1767,25 +2761,134 @@ class Intergenic_Rev :
         ## Ja colocamos todos os pesos que tinham
         ## alguma restricao. Agora temos uma
         ## aresta preta que devemos otimizar.
-        best_weight, best_score = -1, 100000000000000
-        for last_weight in range(0, int(black_ws[(i+2)%3]+1)) :
-            complementar = black_ws[(i+2)%3] - last_weight
-            ws[(i+2)%3][0] = last_weight
-            ws[(i+2)%3][1] = complementar
-            score = (abs(gray_ws[(i+1)%3] - (ws[(i+1)%3][0] + ws[(i+2)%3][1])) +
-                     abs(gray_ws[(i+2)%3] - (ws[(i+2)%3][0] + ws[(i+3)%3][1])))
-            if last_weight >= 0 and complementar >= 0 :
-                if score < best_score :
-                    best_weight = last_weight
-                    best_score  = score
+        ##
+        ## With x as its first weight, the score is |x - P| + |x - Q|,
+        ## so any x between P and Q is a minimum. We take the smallest
+        ## one allowed, as a search from x = 0 would.
+        last = int(black_ws[(i+2)%3]+1) - 1
+        if last < 0 :
+            best_weight, best_score = -1, 100000000000000
+        else :
+            P = black_ws[(i+2)%3] + ws[(i+1)%3][0] - gray_ws[(i+1)%3]
+            Q = gray_ws[(i+2)%3] - ws[i][1]
+            best_weight = min(max(min(P, Q), 0), last)
+            best_score  = (abs(gray_ws[(i+1)%3] - (ws[(i+1)%3][0] + black_ws[(i+2)%3] - best_weight)) +
+                           abs(gray_ws[(i+2)%3] - (best_weight + ws[i][1])))
         ws[(i+2)%3][0] = best_weight
         ws[(i+2)%3][1] = black_ws[(i+2)%3] - ws[(i+2)%3][0]
         return best_score
 
-
-
+    ## Same as calling compute_score for every heaviest black edge i and
+    ## every weight wi in range(black_ws[i]+1), keeping the first one
+    ## with the lowest score. Returns (best_score, best_weight,
+    ## best_black), with best_black = -1 if no weight is feasible.
+    ##
+    ## Both P and Q of compute_score grow with wi, so the score of wi
+    ## is D + 2*max(0, wi + low - last, -(wi + high)), where low and high
+    ## are min(P, Q) and max(P, Q) at wi = 0 and D = high - low. It is
+    ## lowest on [-high, last - low] and we take the smallest feasible
+    ## weight closest to this interval.
+    def best_transposition_weights(self, gray_ws, black_ws) :
+        best_score  = 100000000000000
+        best_weight = 100000000000000
+        best_black  = -1
+        for i in (0,1,2) :
+            j, k = (i+1)%3, (i+2)%3
+            ## The weights of edges i and j must not be negative.
+            first = max(0, gray_ws[i] - black_ws[j])
+            final = min(int(black_ws[i]), black_ws[i], gray_ws[i])
+            last  = int(black_ws[k]+1) - 1
+            if first > final or last < 0 :
+                continue
+            P = black_ws[k] + black_ws[j] - gray_ws[i] - gray_ws[j]
+            Q = gray_ws[k] - black_ws[i]
+            low, high = min(P, Q), max(P, Q)
+            if final < -high :
+                weight, score = final, high - low + 2*(-final - high)
+            elif first > last - low :
+                weight, score = first, high - low + 2*(first + low - last)
+            else :
+                weight, score = max(first, -high), high - low
+            if score < best_score :
+                best_score  = score
+                best_weight = weight
+                best_black  = i
+        return best_score, best_weight, best_black
+
+
+    ## The triples lemma_3_transp stops at, found with numpy: the first
+    ## triple of find_all_triples whose best_transposition_weights
+    ## have score 0 and, if there is none, the first one with feasible
+    ## weights. Each is returned in a list, empty if there is no such
+    ## triple. Returns (None, None) if the weights are not integers, so
+    ## the caller scores the triples one by one.
+    ##
+    ## The triples with k at a given place of the cycle are scored
+    ## together, in the order find_all_triples gives them: i and j are
+    ## p and q black edges after k, for every 0 < p < q < size.
+    def score_triples(self, graph, cycle) :
+        edges = cycle[0::2]
+        size  = len(edges)
+        _, _, forward_blacks, forward_grays, _, _ = graph.cycle_prefix_sums(cycle[0].cycle, cycle)
+        index  = np.array([edge.index for edge in edges])
+        weight = np.array([edge.wp[0] for edge in edges])
+        blacks = np.array(forward_blacks)
+        grays  = np.array(forward_grays)
+        if weight.dtype.kind != "i" or blacks.dtype.kind != "i" or grays.dtype.kind != "i" :
+            return None, None
+
+        ## Weights of the segment from the black edges at places start
+        ## to the ones at places stop, as segment_weights.
+        def segment(start, stop, sums) :
+            return np.where(start <= stop, sums[stop] - sums[start], sums[-1] - sums[start] + sums[stop])
+
+        to_i, to_j = np.triu_indices(size-1, 1)
+        to_i, to_j = to_i + 1, to_j + 1
+        feasible = None
+        for place in range(size) :
+            I = (place + to_i) % size
+            J = (place + to_j) % size
+            keep = (index[place] > index[J]) & (index[J] > index[I])
+            if not keep.any() :
+                continue
+            I, J = I[keep], J[keep]
+            K = np.full(len(I), place)
+
+            black_ws, gray_ws = [], []
+            for init, end in ((I, J), (J, K), (K, I)) :
+                black_ws.append(weight[init])
+                gray_ws.append(segment(init, end, grays) - (segment(init, end, blacks) - weight[init]))
+
+            any_feasible = np.zeros(len(I), dtype = bool)
+            any_balanced = np.zeros(len(I), dtype = bool)
+            for i in (0,1,2) :
+                j, k = (i+1)%3, (i+2)%3
+                first = np.maximum(0, gray_ws[i] - black_ws[j])
+                final = np.minimum(black_ws[i], gray_ws[i])
+                last  = black_ws[k]
+                P = black_ws[k] + black_ws[j] - gray_ws[i] - gray_ws[j]
+                Q = gray_ws[k] - black_ws[i]
+                low, high = np.minimum(P, Q), np.maximum(P, Q)
+                score = np.where(final < -high, high - low + 2*(-final - high),
+                                 np.where(first > last - low, high - low + 2*(first + low - last),
+                                          high - low))
+                possible = (first <= final) & (last >= 0)
+                any_feasible |= possible
+                any_balanced |= possible & (score == 0)
+
+            if any_balanced.any() :
+                t = np.flatnonzero(any_balanced)[0]
+                return [[edges[I[t]], edges[J[t]], edges[place]]], []
+            if feasible is None and any_feasible.any() :
+                t = np.flatnonzero(any_feasible)[0]
+                feasible = [edges[I[t]], edges[J[t]], edges[place]]
+
+        return [], [feasible] if feasible else []
+
+    ## Triples (i, j, k) of black edges of the cycle with i.index <
+    ## j.index < k.index, yielded one at a time so a lemma that takes
+    ## the first usable one does not build all O(k^3) of them.
     def find_all_triples(self, cycle) :
-        triples = []
         k = cycle[0]
 
         while True :  ## Loop over k
@@ -1794,7 +2897,7 @@ class Intergenic_Rev :
                 j = i.ap.ac                
                 while True : ## Loop over j
                     if (k.index > j.index > i.index) :
-                        triples.append([i, j, k] )
+                        yield [i, j, k]
                     j = j.ap.ac
                     if j.index == k.index :
                         break
@@ -1804,175 +2907,166 @@ class Intergenic_Rev :
             k = k.ap.ac
             if k.index == cycle[0].index :
                 break
-            
-        #for triple in triples :
-        #    print("Triples: ", triple[0].index, triple[1].index, triple[2].index)        
-        return(triples)
 
+    ## The triples of find_all_triples, in the same order, that have two
+    ## adjacent black edges in the cycle. Walking from k, i is p edges
+    ## after k and j is q edges after it (0 < p < q < size), so i
+    ## follows k if p = 1, j follows i if q = p+1 and k follows j if q
+    ## = size-1: we try only these, O(k^2) instead of O(k^3).
     def find_all_triples_two_adj(self, cycle) :
-        triples = []
-        k = cycle[0]
-
-        while True :  ## Loop over k
-            i = k.ap.ac
-            while True : ## Loop over i
-                j = i.ap.ac                
-                while True : ## Loop over j
-                    if (
-                          (k.index > j.index > i.index) and
-                          (
-                              i == k.ap.ac or
-                              j == i.ap.ac or
-                              k == j.ap.ac
-                          )
-                       ) :
-                        triples.append([i, j, k] )
-                    j = j.ap.ac
-                    if j.index == k.index :
-                        break
-                i = i.ap.ac
-                if i.ap.ac.index == k.index :
-                    break            
-            k = k.ap.ac
-            if k.index == cycle[0].index :
-                break
-            
-        #for triple in triples :
-        #    print("Triples: ", triple[0].index, triple[1].index, triple[2].index)        
-        return(triples)
+        edges = [cycle[0]]
+        node  = cycle[0].ap.ac
+        while node.index != cycle[0].index :
+            edges.append(node)
+            node = node.ap.ac
+        size = len(edges)
+
+        for start in range(size) :
+            k = edges[start]
+            for p in range(1, size-1) :
+                i = edges[(start+p) % size]
+                if p == 1 :
+                    after = range(p+1, size)
+                elif p+1 == size-1 :
+                    after = (p+1,)
+                else :
+                    after = (p+1, size-1)
+                for q in after :
+                    j = edges[(start+q) % size]
+                    if (k.index > j.index > i.index) :
+                        yield [i, j, k]
 
     ## First lemma, we will try to transform a trivial not black-labeled cycle
     ## that is (i) not balanced or (ii) gray-labeled and non-negative into a 
     ## balanced clean cycle using one indel
     def lemma_5(self, graph) :
-        _, vertices = graph.get_cycles(want_vertices = True)
-        for cycle in vertices :
-            if cycle[0].size == 1 and cycle[0].black_labeled == False and (
-                 (cycle[0].gray_labeled == False and cycle[0].blacks != cycle[0].grays) or
-                 (cycle[0].gray_labeled == True  and cycle[0].blacks <= cycle[0].grays)
-            ) :
-                if cycle[0].gray_labeled == False : ## we just modify the weight of the black edge
-                    indel_position = 0
-                    indel_sequence = [int(cycle[0].wc[0] - cycle[0].wp[0]),]
-                    operation = 1
-                    pi_inserted = []
-                    if indel_sequence[0] < 0 :
-                        operation = 0
-                        indel_sequence[0] = -indel_sequence[0]
-                else : ## we must add some new elements
-                    operation = 1
-                    pi_inserted = cycle[0].lc_iota
-                    if ((cycle[0].index > cycle[0].ap.index and cycle[0].value > 0) or
-                       (cycle[0].index < cycle[0].ap.index and cycle[0].value < 0)) :
-                        pi_inserted = [-i for i in pi_inserted[::-1]]
-                        cycle[0].wc = cycle[0].ap.wc = cycle[0].wc[::-1]
-                    if (cycle[0].wc[0] >= cycle[0].wp[0]) :
-                        indel_position = cycle[0].wp[0]
-                        indel_sequence = [int(cycle[0].wc[0] - cycle[0].wp[0]),] + cycle[0].wc[1:]
-                    else :
-                        indel_position = cycle[0].wc[0]
-                        indel_sequence = [0, ] + cycle[0].wc[1:]
-                        indel_sequence[-1] = max(0,int(indel_sequence[-1] - (cycle[0].wp[0] - cycle[0].wc[0])))
-                return (operation, cycle[0], indel_position, [pi_inserted, indel_sequence])
+        for cycle in graph.cycles_in("trivial-unbalanced") :
+            return self.__lemma_5_indel(cycle)
         return None
 
+    ## The indel of lemma_5 on the trivial cycle of the given vertices.
+    def __lemma_5_indel(self, cycle) :
+        if cycle[0].gray_labeled == False : ## we just modify the weight of the black edge
+            indel_position = 0
+            indel_sequence = [int(cycle[0].wc[0] - cycle[0].wp[0]),]
+            operation = 1
+            pi_inserted = []
+            if indel_sequence[0] < 0 :
+                operation = 0
+                indel_sequence[0] = -indel_sequence[0]
+        else : ## we must add some new elements
+            operation = 1
+            pi_inserted = cycle[0].lc_iota
+            if ((cycle[0].index > cycle[0].ap.index and cycle[0].value > 0) or
+               (cycle[0].index < cycle[0].ap.index and cycle[0].value < 0)) :
+                pi_inserted = [-i for i in pi_inserted[::-1]]
+                cycle[0].wc = cycle[0].ap.wc = cycle[0].wc[::-1]
+            if (cycle[0].wc[0] >= cycle[0].wp[0]) :
+                indel_position = cycle[0].wp[0]
+                indel_sequence = [int(cycle[0].wc[0] - cycle[0].wp[0]),] + cycle[0].wc[1:]
+            else :
+                indel_position = cycle[0].wc[0]
+                indel_sequence = [0, ] + cycle[0].wc[1:]
+                indel_sequence[-1] = max(0,int(indel_sequence[-1] - (cycle[0].wp[0] - cycle[0].wc[0])))
+        return (operation, cycle[0], indel_position, [pi_inserted, indel_sequence])
+
     ## Second lemma, we will try to transform a trivial black-labeled cycle
     ## into a trivial not black-labeled cycle, and eventually apply lemma_5
     def lemma_6(self, graph) :
-        _, vertices = graph.get_cycles(want_vertices = True)
-        for cycle in vertices :
-            if (cycle[0].size == 1) and (cycle[0].black_labeled or cycle[0].blacks > cycle[0].grays) :
-                if cycle[0].black_labeled : #we will remove some alphas
-                    if (cycle[0].wp[0] >= cycle[0].grays) :
-                        indel_position = cycle[0].grays
-                        indel_sequence = [int(cycle[0].wp[0] - cycle[0].grays),] + cycle[0].wp[1:]
-                    elif (cycle[0].wp[-1] >= cycle[0].grays) :
-                        indel_position = 0
-                        indel_sequence = cycle[0].wp[:-1] + [int(cycle[0].wp[-1] - cycle[0].grays),]
-                    elif (cycle[0].wp[0] + cycle[0].wp[-1] >= cycle[0].grays) :
-                        indel_position = cycle[0].wp[0]
-                        indel_sequence = [0,] + cycle[0].wp[1:-1] + [int(cycle[0].wp[-1]+cycle[0].wp[0]-cycle[0].grays),]
-                    else : #lemma_5 will be applied after this...
-                        indel_position = cycle[0].wp[0]
-                        indel_sequence = [0,] + cycle[0].wp[1:-1] + [0,]
-                else : # we will just remove an intergenic size
-                    indel_position = 0
-                    indel_sequence = [cycle[0].blacks - cycle[0].grays]
-                return (0, cycle[0], indel_position, [[0 for _ in range(0,cycle[0].lp)], indel_sequence])
+        for cycle in graph.cycles_in("trivial-negative") :
+            return self.__lemma_6_indel(cycle)
         return None
 
+    ## The indel of lemma_6 on the trivial cycle of the given vertices.
+    def __lemma_6_indel(self, cycle) :
+        if cycle[0].black_labeled : #we will remove some alphas
+            if (cycle[0].wp[0] >= cycle[0].grays) :
+                indel_position = cycle[0].grays
+                indel_sequence = [int(cycle[0].wp[0] - cycle[0].grays),] + cycle[0].wp[1:]
+            elif (cycle[0].wp[-1] >= cycle[0].grays) :
+                indel_position = 0
+                indel_sequence = cycle[0].wp[:-1] + [int(cycle[0].wp[-1] - cycle[0].grays),]
+            elif (cycle[0].wp[0] + cycle[0].wp[-1] >= cycle[0].grays) :
+                indel_position = cycle[0].wp[0]
+                indel_sequence = [0,] + cycle[0].wp[1:-1] + [int(cycle[0].wp[-1]+cycle[0].wp[0]-cycle[0].grays),]
+            else : #lemma_5 will be applied after this...
+                indel_position = cycle[0].wp[0]
+                indel_sequence = [0,] + cycle[0].wp[1:-1] + [0,]
+        else : # we will just remove an intergenic size
+            indel_position = 0
+            indel_sequence = [cycle[0].blacks - cycle[0].grays]
+        return (0, cycle[0], indel_position, [[0 for _ in range(0,cycle[0].lp)], indel_sequence])
+
     ## Third lemma, we will try to transform a divergent cycle C into one trivial
     ## not black-labeled cycle and one cycle with the remaining edges
     ## after this lemma, we may apply lemma 5 in the trivial one.
     def lemma_7(self, graph) :
-        _, vertices = graph.get_cycles(want_vertices = True)
-        for cycle in vertices :
-            if (cycle[0].direction == 2) and (cycle[0].gray_labeled == True or cycle[0].black_labeled == True) :
-                start_point = cycle[0]
-                a = cycle[0]
-                b = a.ap.ac
-                trivial, other = None, None
-                if (a.index%2 != b.index%2) :
-                    if a.index > a.ap.index :
-                        if a.index < b.index :
-                            trivial, other = a, b
-                        else :
-                            trivial, other = b, a
+        for cycle in graph.cycles_in("divergent-labeled") :
+            start_point = cycle[0]
+            a = cycle[0]
+            b = a.ap.ac
+            trivial, other = None, None
+            if (a.index%2 != b.index%2) :
+                if a.index > a.ap.index :
+                    if a.index < b.index :
+                        trivial, other = a, b
                     else :
-                        if a.index < b.index :
-                            trivial, other = b, a
-                        else :
-                            trivial, other = a, b
-                    
+                        trivial, other = b, a
                 else :
-                    a = a.ap.ac
-                    b = b.ap.ac
-                    while (a.index != start_point.index) and (trivial == None) :
-                        if (a.index%2 != b.index%2) :
-                            if a.index > a.ap.index :
-                                if a.index < b.index :
-                                    trivial, other = a, b
-                                else :
-                                    trivial, other = b, a
+                    if a.index < b.index :
+                        trivial, other = b, a
+                    else :
+                        trivial, other = a, b
+                    
+            else :
+                a = a.ap.ac
+                b = b.ap.ac
+                while (a.index != start_point.index) and (trivial == None) :
+                    if (a.index%2 != b.index%2) :
+                        if a.index > a.ap.index :
+                            if a.index < b.index :
+                                trivial, other = a, b
                             else :
-                                if a.index < b.index :
-                                    trivial, other = b, a
-                                else :
-                                    trivial, other = a, b
-                        else :
-                            a = a.ap.ac
-                            b = b.ap.ac
-
-                if trivial != None :
-                    length_needed = trivial.wc[0]
-                    if len(trivial.wc) > 1 :
-                        length_needed += trivial.wc[-1]
-
-                    if trivial.index < other.index : ## a trivial cycle will be created in the left
-                        if (trivial.wp[0] + other.wp[0] >= length_needed) :
-                            cut_left_ir = min(length_needed, trivial.wp[0])
-                            cut_right_ir = length_needed - cut_left_ir
-                            res_left_ir = [length_needed,]
-                            res_right_ir = trivial.wp[1:][::-1] + [int(other.wp[0] + trivial.wp[0] - length_needed),] + other.wp[1:]
-                        else :
-                            cut_left_ir = trivial.wp[0]
-                            cut_right_ir = other.wp[0]
-                            res_left_ir = [int(trivial.wp[0] + other.wp[0]),]
-                            res_right_ir = trivial.wp[1:][::-1] + [0,] + other.wp[1:]
-                        return(2,trivial,other,[cut_left_ir, cut_right_ir, res_left_ir, res_right_ir])
-                    else : ## a trivial cycle will be created in the right)
-                        if (trivial.wp[-1] + other.wp[-1] >= length_needed) :
-                            already_in_the_right = min(length_needed, trivial.wp[-1])
-                            cut_right_ir = sum(trivial.wp[:-1]) + trivial.wp[-1] - already_in_the_right
-                            cut_left_ir =  sum(other.wp[:-1]) + (other.wp[-1] + trivial.wp[-1] - already_in_the_right)
-                            res_left_ir = other.wp[:-1] + [int(trivial.wp[-1] + other.wp[-1] - length_needed),] + trivial.wp[:-1][::-1] 
-                            res_right_ir = [length_needed,]
+                                trivial, other = b, a
                         else :
-                            cut_left_ir = sum(other.wp[:-1])
-                            cut_right_ir = sum(trivial.wp[:-1])
-                            res_left_ir =  other.wp[:-1] + [0,] + trivial.wp[:-1][::-1]
-                            res_right_ir = [int(other.wp[-1]+trivial.wp[-1]),]
-                        return(2,trivial,other,[cut_left_ir, cut_right_ir, res_left_ir, res_right_ir])
+                            if a.index < b.index :
+                                trivial, other = b, a
+                            else :
+                                trivial, other = a, b
+                    else :
+                        a = a.ap.ac
+                        b = b.ap.ac
+
+            if trivial != None :
+                length_needed = trivial.wc[0]
+                if len(trivial.wc) > 1 :
+                    length_needed += trivial.wc[-1]
+
+                if trivial.index < other.index : ## a trivial cycle will be created in the left
+                    if (trivial.wp[0] + other.wp[0] >= length_needed) :
+                        cut_left_ir = min(length_needed, trivial.wp[0])
+                        cut_right_ir = length_needed - cut_left_ir
+                        res_left_ir = [length_needed,]
+                        res_right_ir = trivial.wp[1:][::-1] + [int(other.wp[0] + trivial.wp[0] - length_needed),] + other.wp[1:]
+                    else :
+                        cut_left_ir = trivial.wp[0]
+                        cut_right_ir = other.wp[0]
+                        res_left_ir = [int(trivial.wp[0] + other.wp[0]),]
+                        res_right_ir = trivial.wp[1:][::-1] + [0,] + other.wp[1:]
+                    return(2,trivial,other,[cut_left_ir, cut_right_ir, res_left_ir, res_right_ir])
+                else : ## a trivial cycle will be created in the right)
+                    if (trivial.wp[-1] + other.wp[-1] >= length_needed) :
+                        already_in_the_right = min(length_needed, trivial.wp[-1])
+                        cut_right_ir = sum(trivial.wp[:-1]) + trivial.wp[-1] - already_in_the_right
+                        cut_left_ir =  sum(other.wp[:-1]) + (other.wp[-1] + trivial.wp[-1] - already_in_the_right)
+                        res_left_ir = other.wp[:-1] + [int(trivial.wp[-1] + other.wp[-1] - length_needed),] + trivial.wp[:-1][::-1] 
+                        res_right_ir = [length_needed,]
+                    else :
+                        cut_left_ir = sum(other.wp[:-1])
+                        cut_right_ir = sum(trivial.wp[:-1])
+                        res_left_ir =  other.wp[:-1] + [0,] + trivial.wp[:-1][::-1]
+                        res_right_ir = [int(other.wp[-1]+trivial.wp[-1]),]
+                    return(2,trivial,other,[cut_left_ir, cut_right_ir, res_left_ir, res_right_ir])
         return None
 
     ## Fourth lemma, we will try to transform a divergent clean cycle C:
@@ -1980,378 +3074,358 @@ class Intergenic_Rev :
     ##  ( ii) into two balanced cycles, if C is balanced
     ##  (iii) into one balanced cycle and one negative cycle otherwise
     def lemma_8(self, graph) :
-        _, vertices = graph.get_cycles(want_vertices = True)
-        for cycle in vertices :
-            if (cycle[0].direction == 2) and (cycle[0].gray_labeled == False) and (cycle[0].black_labeled == False) :
-
-                if (cycle[0].grays > cycle[0].blacks) : ## C is a positive cycle
-                    indel_sequence = [int(cycle[0].grays - cycle[0].blacks),]
-                    return(1,cycle[0], 0, [[], indel_sequence])
-                else :  
-                    for i in range(1, len(cycle) - 2, 2) :
-                        v_i           = cycle[i]
-                        
-                        partial_gray  =  v_i.wc[0]
-                        partial_black =  0
-                        for j in range(i+2, len(cycle), 2)  :
-                            v_j           = cycle[j]
-
-                            if (v_i.index%2 != v_j.index%2): ## Check divergence
-                                op = self.__indel_get_balance(v_i, v_j, partial_gray, partial_black)
-                                if op :
-                                    if op[2] >= 0 :
-                                        cut_left_ir = op[0].wp[0] - op[2]
-                                        cut_right_ir = 0
-                                        res_left_ir = [cut_left_ir,]
-                                        res_right_ir = [int(op[1].wp[0] + op[2]),]
-                                    else :
-                                        cut_left_ir = op[0].wp[0]
-                                        cut_right_ir = -op[2]
-                                        res_left_ir = [int(cut_left_ir - op[2]),]
-                                        res_right_ir = [int(op[1].wp[0] + op[2]),]
-                                    return(2,op[0],op[1],[cut_left_ir, cut_right_ir, res_left_ir, res_right_ir])
-                                
-                            ## Preparing next iteration    
-                            partial_gray  = partial_gray  + v_j.wc[0]
-                            partial_black = partial_black + v_j.wp[0]
+        for cycle in graph.cycles_in("divergent-clean") :
+
+            if (cycle[0].grays > cycle[0].blacks) : ## C is a positive cycle
+                indel_sequence = [int(cycle[0].grays - cycle[0].blacks),]
+                return(1,cycle[0], 0, [[], indel_sequence])
+            else :  
+                op = self.__search_divergent_balance(cycle)
+                if op :
+                    if op[2] >= 0 :
+                        cut_left_ir = op[0].wp[0] - op[2]
+                        cut_right_ir = 0
+                        res_left_ir = [cut_left_ir,]
+                        res_right_ir = [int(op[1].wp[0] + op[2]),]
+                    else :
+                        cut_left_ir = op[0].wp[0]
+                        cut_right_ir = -op[2]
+                        res_left_ir = [int(cut_left_ir - op[2]),]
+                        res_right_ir = [int(op[1].wp[0] + op[2]),]
+                    return(2,op[0],op[1],[cut_left_ir, cut_right_ir, res_left_ir, res_right_ir])
         return None
 
-    def lemma_alcob(self, graph) :
-        _, vertices = graph.get_cycles(want_vertices = True)
-        for cycle in vertices :
-          if cycle[0].size > 1 :#and cycle[0].grays <= cycle[0].blacks :
-            #print(str(cycle[0]),cycle[0].grays, cycle[0].blacks)
-            for i in range(1, len(cycle) - 2, 2) :
-                v_i           = cycle[i]
-                partial_gray  =  v_i.wc[0]
-                partial_black =  0
-                for j in range(i+2, len(cycle), 2)  :
-                    v_j           = cycle[j]
-                    #op = self.__indel_get_balance(v_i, v_j, partial_gray, partial_black)
-                    #if op :
-                    op = self.__search_crossing_edges(graph, v_i, v_j)
+    ## The first pair of divergent black edges v_i, v_j, at odd places
+    ## i < j of the cycle, for which __indel_get_balance finds an op,
+    ## and that op.
+    ##
+    ## Usually the pair is in the first rows, so we try them one by
+    ## one, as lemma_8 did, while it costs less than the search below.
+    ## With partial_gray and partial_black as in lemma_8, let s =
+    ## partial_gray - partial_black and X[u] the sum of wc[0] - wp[0]
+    ## over the odd places before 2u+1. Then s = X[j] - X[i] +
+    ## v_i.wp[0] and __indel_get_balance finds an op when 0 <= s <=
+    ## v_i.wp[0] + v_j.wp[0] or when the same holds for s - (grays -
+    ## blacks): that is, when [X[j] - v_j.wp[0], X[j]] meets [X[i] -
+    ## v_i.wp[0], X[i]] or this interval moved by grays - blacks. The
+    ## other rows are searched this way, from the last place to the
+    ## first, in O(k log k).
+    def __search_divergent_balance(self, cycle) :
+        edges = cycle[1::2]
+        size  = len(edges)
+        shift = cycle[0].grays - cycle[0].blacks
+
+        grays, blacks = [0], [0]
+        for v in edges :
+            grays.append(grays[-1] + v.wc[0])
+            blacks.append(blacks[-1] + v.wp[0])
+
+        budget = size * size.bit_length()
+        for first in range(size) :
+            if budget < 0 :
+                break
+            v_i = edges[first]
+            for j in range(first+1, size) :
+                if v_i.index%2 != edges[j].index%2 :
+                    op = self.__indel_get_balance(v_i, edges[j], grays[j] - grays[first], blacks[j] - blacks[first+1])
                     if op :
-                        cut_left_ir = sum(op[0].wp)
-                        cut_right_ir = 0
-                        res_left_ir = op[0].wp
-                        res_right_ir = op[1].wp
-                        return(2,op[0],op[1],[cut_left_ir, cut_right_ir, res_left_ir, res_right_ir])
+                        return op
+            budget = budget - (size - first)
+        else :
+            return None
+
+        intervals = [(grays[u] - blacks[u] - edges[u].wp[0], grays[u] - blacks[u]) for u in range(size)]
+        keys = set()
+        for low, high in intervals[first:] :
+            keys.update((low, high, low + shift, high + shift))
+        keys = sorted(keys)
+        ## Edges by the parity of their index.
+        indexes = (interval_index(keys, size), interval_index(keys, size))
+
+        pair = None
+        for u in range(size-1, first-1, -1) :
+            low, high = intervals[u]
+            divergent = indexes[1 - edges[u].index % 2]
+            j = min(divergent.first(low, high), divergent.first(low + shift, high + shift))
+            if j < size :
+                pair = u, j
+            indexes[edges[u].index % 2].add(low, high, u)
+
+        if pair :
+            i, j = pair
+            return self.__indel_get_balance(edges[i], edges[j], grays[j] - grays[i], blacks[j] - blacks[i+1])
+
+    def lemma_alcob(self, graph) :
+        for cycle in graph.cycles_in("nontrivial") :
+          #print(str(cycle[0]),cycle[0].grays, cycle[0].blacks)
+          for i in range(1, len(cycle) - 2, 2) :
+              v_i           = cycle[i]
+              partial_gray  =  v_i.wc[0]
+              partial_black =  0
+              for j in range(i+2, len(cycle), 2)  :
+                  v_j           = cycle[j]
+                  #op = self.__indel_get_balance(v_i, v_j, partial_gray, partial_black)
+                  #if op :
+                  op = self.__search_crossing_edges(graph, v_i, v_j)
+                  if op :
+                      cut_left_ir = sum(op[0].wp)
+                      cut_right_ir = 0
+                      res_left_ir = op[0].wp
+                      res_right_ir = op[1].wp
+                      return(2,op[0],op[1],[cut_left_ir, cut_right_ir, res_left_ir, res_right_ir])
                             
-                    ## Preparing next iteration    
-                    partial_gray  = partial_gray  + v_j.wc[0]
-                    partial_black = partial_black + v_j.wp[0]
+                  ## Preparing next iteration    
+                  partial_gray  = partial_gray  + v_j.wc[0]
+                  partial_black = partial_black + v_j.wp[0]
         ##if there is no crossing cycles, all long cycles are oriented.
-        for cycle in vertices :
-          if cycle[0].size > 2 :#and cycle[0].grays <= cycle[0].blacks :
-            triples = self.find_all_triples(cycle)
-            if triples :
-                op = [triples[0][1], triples[0][2]]
-                cut_left_ir = sum(op[0].wp)
-                cut_right_ir = 0
-                res_left_ir = op[0].wp
-                res_right_ir = op[1].wp
-                return(2,op[0],op[1],[cut_left_ir, cut_right_ir, res_left_ir, res_right_ir])
+        for cycle in graph.cycles_in("long") :
+          triple = next(self.find_all_triples(cycle), None)
+          if triple :
+              op = [triple[1], triple[2]]
+              cut_left_ir = sum(op[0].wp)
+              cut_right_ir = 0
+              res_left_ir = op[0].wp
+              res_right_ir = op[1].wp
+              return(2,op[0],op[1],[cut_left_ir, cut_right_ir, res_left_ir, res_right_ir])
 
         return None
 
     ## This lemma searches for an oriented convergent cycle, and will transform
     ## it into a divergent cycle
     def lemma_9(self, graph) :
-        _, vertices = graph.get_cycles(want_vertices = True)
-        for cycle in vertices :
-          if cycle[0].size > 2 :#and cycle[0].grays <= cycle[0].blacks :
-            triples = self.find_all_triples(cycle)
-            if triples :
-                op = [triples[0][1], triples[0][2]]
-                cut_left_ir = sum(op[0].wp)
-                cut_right_ir = 0
-                res_left_ir = op[0].wp
-                res_right_ir = op[1].wp
-                return(2,op[0],op[1],[cut_left_ir, cut_right_ir, res_left_ir, res_right_ir])
+        for cycle in graph.cycles_in("long") :
+          triple = next(self.find_all_triples(cycle), None)
+          if triple :
+              op = [triple[1], triple[2]]
+              cut_left_ir = sum(op[0].wp)
+              cut_right_ir = 0
+              res_left_ir = op[0].wp
+              res_right_ir = op[1].wp
+              return(2,op[0],op[1],[cut_left_ir, cut_right_ir, res_left_ir, res_right_ir])
 
         return None        
 
     ## last step: there are only non-oriented convergent cycles
     def lemma_10(self, graph) :
-        _, vertices = graph.get_cycles(want_vertices = True)
-        for cycle in vertices :
-          if cycle[0].size > 1 :#and cycle[0].grays <= cycle[0].blacks :
-            #print(str(cycle[0]),cycle[0].grays, cycle[0].blacks)
-            for i in range(1, len(cycle) - 2, 2) :
-                v_i           = cycle[i]
-                partial_gray  =  v_i.wc[0]
-                partial_black =  0
-                for j in range(i+2, len(cycle), 2)  :
-                    v_j           = cycle[j]
-                    #op = self.__indel_get_balance(v_i, v_j, partial_gray, partial_black)
-                    #if op :
-                    op = self.__search_crossing_edges(graph, v_i, v_j)
-                    if op :
-                        cut_left_ir = sum(op[0].wp)
-                        cut_right_ir = 0
-                        res_left_ir = op[0].wp
-                        res_right_ir = op[1].wp
-                        return (2,op[0],op[1],[cut_left_ir, cut_right_ir, res_left_ir, res_right_ir])
+        for cycle in graph.cycles_in("nontrivial") :
+          #print(str(cycle[0]),cycle[0].grays, cycle[0].blacks)
+          for i in range(1, len(cycle) - 2, 2) :
+              v_i           = cycle[i]
+              partial_gray  =  v_i.wc[0]
+              partial_black =  0
+              for j in range(i+2, len(cycle), 2)  :
+                  v_j           = cycle[j]
+                  #op = self.__indel_get_balance(v_i, v_j, partial_gray, partial_black)
+                  #if op :
+                  op = self.__search_crossing_edges(graph, v_i, v_j)
+                  if op :
+                      cut_left_ir = sum(op[0].wp)
+                      cut_right_ir = 0
+                      res_left_ir = op[0].wp
+                      res_right_ir = op[1].wp
+                      return (2,op[0],op[1],[cut_left_ir, cut_right_ir, res_left_ir, res_right_ir])
                             
-                    ## Preparing next iteration    
-                    partial_gray  = partial_gray  + v_j.wc[0]
-                    partial_black = partial_black + v_j.wp[0]
+                  ## Preparing next iteration    
+                  partial_gray  = partial_gray  + v_j.wc[0]
+                  partial_black = partial_black + v_j.wp[0]
 
         return None
 
     def lemma_3_transp(self, graph, hasMove = False) :
-        _, vertices = graph.get_cycles(want_vertices = True)
-        for cycle in vertices :
-            if (cycle[0].direction == 1 and ## Check if it is convergent
-                cycle[0].size      >= 3 and ## Check if it is long
-                cycle[0].gray_labeled == False and                 # not gray labeled,
-                cycle[0].black_labeled == False and                 # not black labeled, and
-                cycle[0].blacks    == cycle[0].grays ## Check if it is
-                                                     ## breakable,
-                                                     ## which means we
-                                                     ## need more
-                                                     ## weight in
-                                                     ## black edges
-                                                     ## than gray
-                                                     ## edges
-            ) :
-                triples = self.find_all_triples(cycle)
-                #for tr in triples:
-                #    print tr[0].index, tr[1].index, tr[2].index
+        for cycle in graph.cycles_in("good-oriented") :
+            #for tr in self.find_all_triples(cycle):
+            #    print tr[0].index, tr[1].index, tr[2].index
+            balanced, feasible = None, None
+            if np is not None and NUMPY_TRIPLES is not None and len(cycle) >= 2*NUMPY_TRIPLES :
+                balanced, feasible = self.score_triples(graph, cycle)
+            if balanced is None :
+                balanced, feasible = self.find_all_triples(cycle), self.find_all_triples(cycle)
               
-                for transp in triples :
-                    ## Let us compute the segment weights between
-                    ## the edges that will be broken. We will call
-                    ## it gray_weights, even though it may not
-                    ## represent weights
-                    gray_weights = []
-                    ## Pesos das arestas pretas
-                    black_weights = []
-                    ## Here I will place the transp weights. A
-                    ## soma de cada bloco tem que dar o peso da
-                    ## aresta preta correspondente.
-                    transp_weights = [[0,0],[0,0],[0,0]] 
-
-                    ## Computing the gray black weights.
-                    for i in range(len(transp)) :
-                        init, end = transp[i], transp[(i+1)%3]
-                        blacks, grays = self.__sum_weight_in_segment(init, end)
-                        blacks = blacks - init.wp[0]
-                        # transp_weights[i][0] = init.wp[0]
-                        black_weights.append(init.wp[0])
-                        gray_weights.append(grays - blacks)
-                    #print(transp[0].index, transp[1].index, transp[2].index)
-                    #print(black_weights, gray_weights)
-
-                    ## NÃ£o entendi o cÃ³digo anterior, vou criar um
-                    ## que faz mais sentido.
+            for transp in balanced :
+                ## Let us compute the segment weights between
+                ## the edges that will be broken. We will call
+                ## it gray_weights, even though it may not
+                ## represent weights
+                gray_weights = []
+                ## Pesos das arestas pretas
+                black_weights = []
+                ## Here I will place the transp weights. A
+                ## soma de cada bloco tem que dar o peso da
+                ## aresta preta correspondente.
+                transp_weights = [[0,0],[0,0],[0,0]] 
+
+                ## Computing the gray black weights.
+                for i in range(len(transp)) :
+                    init, end = transp[i], transp[(i+1)%3]
+                    blacks, grays = self.__sum_weight_in_segment(init, end)
+                    blacks = blacks - init.wp[0]
+                    # transp_weights[i][0] = init.wp[0]
+                    black_weights.append(init.wp[0])
+                    gray_weights.append(grays - blacks)
+                #print(transp[0].index, transp[1].index, transp[2].index)
+                #print(black_weights, gray_weights)
+
+                ## NÃ£o entendi o cÃ³digo anterior, vou criar um
+                ## que faz mais sentido.
                     
-                    ## Passo 1: Devo escolher uma aresta preta com
-                    ## peso maior que ou igual Ã  aresta cinza
-                    ## (funÃ§Ã£o g(.) na verdade) incidente a ela
-                    ## pela esquerda. Podemos provar que existe
-                    ## pelo menos uma satisfazendo esse critÃ©rio
-                    ## por contradiÃ§Ã£o.
-
-                    # Trocando
-                    # heaviest_black = None
-                    # for i in range(3) :
-                    #     if black_weights[i] >= gray_weights[i] :
-                    #         heaviest_black = i
-                    #         break
-
-                    best_score  = 100000000000000
-                    best_weight = 100000000000000
-                    best_black  = -1
+                ## Passo 1: Devo escolher uma aresta preta com
+                ## peso maior que ou igual Ã  aresta cinza
+                ## (funÃ§Ã£o g(.) na verdade) incidente a ela
+                ## pela esquerda. Podemos provar que existe
+                ## pelo menos uma satisfazendo esse critÃ©rio
+                ## por contradiÃ§Ã£o.
+
+                # Trocando
+                # heaviest_black = None
+                # for i in range(3) :
+                #     if black_weights[i] >= gray_weights[i] :
+                #         heaviest_black = i
+                #         break
+
+                ## Passo 2: A aresta cinza Ã  esquerda de
+                ## heaviest_black deve garantir um ciclo
+                ## balanceado porque a aresta preta tem peso
+                ## para dar a ela. O que devemos fazer agora,
+                ## Ã© garantir que as duas outras arestas
+                ## pretas vÃ£o se aproximar do peso das suas
+                ## aresta cinzas. Para isso, vou criar um
+                ## score para uma atribuiÃ§Ã£o de pesos. Esse
+                ## score Ã© simplesmente a soma absoluta da
+                ## diferenÃ§a de pesos entre as arestas pretas
+                ## e cinzas na configuraÃ§Ã£o resultante.
+                best_score, best_weight, best_black = self.best_transposition_weights(gray_weights, black_weights)
                     
-                    #print("#############################################")
-                    for heaviest_black in (0,1,2) :                            
-                        #print("########################################", heaviest_black)
-                        ## Passo 2: A aresta cinza Ã  esquerda de
-                        ## heaviest_black deve garantir um ciclo
-                        ## balanceado porque a aresta preta tem peso
-                        ## para dar a ela. O que devemos fazer agora,
-                        ## Ã© garantir que as duas outras arestas
-                        ## pretas vÃ£o se aproximar do peso das suas
-                        ## aresta cinzas. Para isso, vou criar um
-                        ## score para uma atribuiÃ§Ã£o de pesos. Esse
-                        ## score Ã© simplesmente a soma absoluta da
-                        ## diferenÃ§a de pesos entre as arestas pretas
-                        ## e cinzas na configuraÃ§Ã£o resultante.
-    
-                        #print(black_weights)    
-                        #print("++++++++++++++++++++ HEAVIEST", heaviest_black)
-    
-                        for weight in range(0, int(black_weights[heaviest_black])+1) :
-                            score = self.compute_score(gray_weights, black_weights,
-                                                       transp_weights, heaviest_black,
-                                                       weight)
-                            #print("score = %s, weight = %s" % (score, weight))
-                            #print(transp_weights) 
-    
-                            if score >= 0 and score < best_score :
-                                #print("changing")
-                                best_score  = score
-                                best_weight = weight
-                                best_black  = heaviest_black
-                                                                            
-                        #print("BEST ", best_weight, best_score)
-                        #print(best_black)
-                    if best_black != -1 and best_score == 0 :
-                        self.compute_score(gray_weights, black_weights, transp_weights,
-                                           best_black, best_weight)
+                if best_black != -1 and best_score == 0 :
+                    self.compute_score(gray_weights, black_weights, transp_weights,
+                                       best_black, best_weight)
                             
-                        #print("-------> WEIGHTS: ", black_weights, gray_weights, transp_weights, best_score)
+                    #print("-------> WEIGHTS: ", black_weights, gray_weights, transp_weights, best_score)
                         
                                     
-                        outcome = [
-                            gray_weights[0] - (transp_weights[0][0] + transp_weights[1][1]),
-                            gray_weights[1] - (transp_weights[1][0] + transp_weights[2][1]),
-                            gray_weights[2] - (transp_weights[2][0] + transp_weights[0][1])
-                        ]
+                    outcome = [
+                        gray_weights[0] - (transp_weights[0][0] + transp_weights[1][1]),
+                        gray_weights[1] - (transp_weights[1][0] + transp_weights[2][1]),
+                        gray_weights[2] - (transp_weights[2][0] + transp_weights[0][1])
+                    ]
                         
-                        end_point = 0
-                        for el in outcome :
-                            if el == 0:
-                                end_point = end_point + 1
+                    end_point = 0
+                    for el in outcome :
+                        if el == 0:
+                            end_point = end_point + 1
                         
-                        start_point = int(cycle[0].blacks  == cycle[0].grays)
+                    start_point = int(cycle[0].blacks  == cycle[0].grays)
                         
-                        #print(end_point, start_point)
-                        #print(outcome)
-                        #sys.exit()
+                    #print(end_point, start_point)
+                    #print(outcome)
+                    #sys.exit()
                         
-                        #if True :
-                        if end_point - start_point > 0 :
-                            return [(
-                                3, transp[0], transp[1], transp[2],
-                                [[transp_weights[0][0]+transp_weights[1][1]], [transp_weights[0][1]+transp_weights[2][0]], [transp_weights[1][0]+transp_weights[2][1]]]
-                            )]#transp_weights[0][0], transp_weights[1][0], transp_weights[2][0])]
-                        else :
-                            return [
-                               (3, transp[0], transp[1], transp[2],
-                                #transp_weights[0][0], transp_weights[1][0], transp_weights[2][0]),
-                                [[transp_weights[0][0]+transp_weights[1][1]], [transp_weights[0][1]+transp_weights[2][0]], [transp_weights[1][0]+transp_weights[2][1]]]),
-                                #(self.__search_trivial_unbalanced_transposition, transp[0], transp[1], transp[2])]
-                                (self.__make_sure_the_three_cycles_are_balanced, graph, transp[0], transp[1], transp[2])]
-
-                for transp in triples :
-                    ## Let us compute the segment weights between
-                    ## the edges that will be broken. We will call
-                    ## it gray_weights, even though it may not
-                    ## represent weights
-                    gray_weights = []
-                    ## Pesos das arestas pretas
-                    black_weights = []
-                    ## Here I will place the transp weights. A
-                    ## soma de cada bloco tem que dar o peso da
-                    ## aresta preta correspondente.
-                    transp_weights = [[0,0],[0,0],[0,0]] 
-
-                    ## Computing the gray black weights.
-                    for i in range(len(transp)) :
-                        init, end = transp[i], transp[(i+1)%3]
-                        blacks, grays = self.__sum_weight_in_segment(init, end)
-                        blacks = blacks - init.wp[0]
-                        # transp_weights[i][0] = init.wp[0]
-                        black_weights.append(init.wp[0])
-                        gray_weights.append(grays - blacks)
-                    #print(transp[0].index, transp[1].index, transp[2].index)
-                    #print(black_weights, gray_weights)
-
-                    ## NÃ£o entendi o cÃ³digo anterior, vou criar um
-                    ## que faz mais sentido.
+                    #if True :
+                    if end_point - start_point > 0 :
+                        return [(
+                            3, transp[0], transp[1], transp[2],
+                            [[transp_weights[0][0]+transp_weights[1][1]], [transp_weights[0][1]+transp_weights[2][0]], [transp_weights[1][0]+transp_weights[2][1]]]
+                        )]#transp_weights[0][0], transp_weights[1][0], transp_weights[2][0])]
+                    else :
+                        return [
+                           (3, transp[0], transp[1], transp[2],
+                            #transp_weights[0][0], transp_weights[1][0], transp_weights[2][0]),
+                            [[transp_weights[0][0]+transp_weights[1][1]], [transp_weights[0][1]+transp_weights[2][0]], [transp_weights[1][0]+transp_weights[2][1]]]),
+                            #(self.__search_trivial_unbalanced_transposition, transp[0], transp[1], transp[2])]
+                            (self.__make_sure_the_three_cycles_are_balanced, graph, transp[0], transp[1], transp[2])]
+
+            for transp in feasible :
+                ## Let us compute the segment weights between
+                ## the edges that will be broken. We will call
+                ## it gray_weights, even though it may not
+                ## represent weights
+                gray_weights = []
+                ## Pesos das arestas pretas
+                black_weights = []
+                ## Here I will place the transp weights. A
+                ## soma de cada bloco tem que dar o peso da
+                ## aresta preta correspondente.
+                transp_weights = [[0,0],[0,0],[0,0]] 
+
+                ## Computing the gray black weights.
+                for i in range(len(transp)) :
+                    init, end = transp[i], transp[(i+1)%3]
+                    blacks, grays = self.__sum_weight_in_segment(init, end)
+                    blacks = blacks - init.wp[0]
+                    # transp_weights[i][0] = init.wp[0]
+                    black_weights.append(init.wp[0])
+                    gray_weights.append(grays - blacks)
+                #print(transp[0].index, transp[1].index, transp[2].index)
+                #print(black_weights, gray_weights)
+
+                ## NÃ£o entendi o cÃ³digo anterior, vou criar um
+                ## que faz mais sentido.
                     
-                    ## Passo 1: Devo escolher uma aresta preta com
-                    ## peso maior que ou igual Ã  aresta cinza
-                    ## (funÃ§Ã£o g(.) na verdade) incidente a ela
-                    ## pela esquerda. Podemos provar que existe
-                    ## pelo menos uma satisfazendo esse critÃ©rio
-                    ## por contradiÃ§Ã£o.
-
-                    # Trocando
-                    # heaviest_black = None
-                    # for i in range(3) :
-                    #     if black_weights[i] >= gray_weights[i] :
-                    #         heaviest_black = i
-                    #         break
-
-                    best_score  = 100000000000000
-                    best_weight = 100000000000000
-                    best_black  = -1
+                ## Passo 1: Devo escolher uma aresta preta com
+                ## peso maior que ou igual Ã  aresta cinza
+                ## (funÃ§Ã£o g(.) na verdade) incidente a ela
+                ## pela esquerda. Podemos provar que existe
+                ## pelo menos uma satisfazendo esse critÃ©rio
+                ## por contradiÃ§Ã£o.
+
+                # Trocando
+                # heaviest_black = None
+                # for i in range(3) :
+                #     if black_weights[i] >= gray_weights[i] :
+                #         heaviest_black = i
+                #         break
+
+                ## Passo 2: A aresta cinza Ã  esquerda de
+                ## heaviest_black deve garantir um ciclo
+                ## balanceado porque a aresta preta tem peso
+                ## para dar a ela. O que devemos fazer agora,
+                ## Ã© garantir que as duas outras arestas
+                ## pretas vÃ£o se aproximar do peso das suas
+                ## aresta cinzas. Para isso, vou criar um
+                ## score para uma atribuiÃ§Ã£o de pesos. Esse
+                ## score Ã© simplesmente a soma absoluta da
+                ## diferenÃ§a de pesos entre as arestas pretas
+                ## e cinzas na configuraÃ§Ã£o resultante.
+                best_score, best_weight, best_black = self.best_transposition_weights(gray_weights, black_weights)
                     
-                    #print("#############################################")
-                    for heaviest_black in (0,1,2) :                            
-                        #print("########################################", heaviest_black)
-                        ## Passo 2: A aresta cinza Ã  esquerda de
-                        ## heaviest_black deve garantir um ciclo
-                        ## balanceado porque a aresta preta tem peso
-                        ## para dar a ela. O que devemos fazer agora,
-                        ## Ã© garantir que as duas outras arestas
-                        ## pretas vÃ£o se aproximar do peso das suas
-                        ## aresta cinzas. Para isso, vou criar um
-                        ## score para uma atribuiÃ§Ã£o de pesos. Esse
-                        ## score Ã© simplesmente a soma absoluta da
-                        ## diferenÃ§a de pesos entre as arestas pretas
-                        ## e cinzas na configuraÃ§Ã£o resultante.
-    
-                            
-                        #print("++++++++++++++++++++ HEAVIEST", heaviest_black)
-    
-                        for weight in range(0, int(black_weights[heaviest_black])+1) :
-                            score = self.compute_score(gray_weights, black_weights,
-                                                       transp_weights, heaviest_black,
-                                                       weight)
-                            #print("score = %s, weight = %s" % (score, weight))
-                            #print(transp_weights) 
-    
-                            if score >= 0 and score < best_score :
-                                #print("changing")
-                                best_score  = score
-                                best_weight = weight
-                                best_black  = heaviest_black
-                                                                            
-                        #print("BEST ", best_weight, best_score)
-                        #print(best_black)
-                    if best_black != -1 :
-                        self.compute_score(gray_weights, black_weights, transp_weights,
-                                           best_black, best_weight)
+                if best_black != -1 :
+                    self.compute_score(gray_weights, black_weights, transp_weights,
+                                       best_black, best_weight)
                             
-                        #print("-------> WEIGHTS: ", black_weights, gray_weights, transp_weights, best_score)
+                    #print("-------> WEIGHTS: ", black_weights, gray_weights, transp_weights, best_score)
                         
                                     
-                        outcome = [
-                            gray_weights[0] - (transp_weights[0][0] + transp_weights[1][1]),
-                            gray_weights[1] - (transp_weights[1][0] + transp_weights[2][1]),
-                            gray_weights[2] - (transp_weights[2][0] + transp_weights[0][1])
-                        ]
+                    outcome = [
+                        gray_weights[0] - (transp_weights[0][0] + transp_weights[1][1]),
+                        gray_weights[1] - (transp_weights[1][0] + transp_weights[2][1]),
+                        gray_weights[2] - (transp_weights[2][0] + transp_weights[0][1])
+                    ]
                         
-                        end_point = 0
-                        for el in outcome :
-                            if el == 0:
-                                end_point = end_point + 1
+                    end_point = 0
+                    for el in outcome :
+                        if el == 0:
+                            end_point = end_point + 1
                         
-                        start_point = int(cycle[0].blacks  == cycle[0].grays)
+                    start_point = int(cycle[0].blacks  == cycle[0].grays)
                         
-                        #print(end_point, start_point)
-                        #print(outcome)
-                        #sys.exit()
+                    #print(end_point, start_point)
+                    #print(outcome)
+                    #sys.exit()
                         
-                        #if True :
-                        if end_point - start_point > 0 :
-                            return [(
-                                3, transp[0], transp[1], transp[2],
-                                [[transp_weights[0][0]+transp_weights[1][1]], [transp_weights[0][1]+transp_weights[2][0]], [transp_weights[1][0]+transp_weights[2][1]]]
-                            )] #transp_weights[0][0], transp_weights[1][0],transp_weights[2][0])
+                    #if True :
+                    if end_point - start_point > 0 :
+                        return [(
+                            3, transp[0], transp[1], transp[2],
+                            [[transp_weights[0][0]+transp_weights[1][1]], [transp_weights[0][1]+transp_weights[2][0]], [transp_weights[1][0]+transp_weights[2][1]]]
+                        )] #transp_weights[0][0], transp_weights[1][0],transp_weights[2][0])
 
-                        else :
-                            return [
-                               (3, transp[0], transp[1], transp[2],
-                                #transp_weights[0][0], transp_weights[1][0], transp_weights[2][0]),
-                                [[transp_weights[0][0]+transp_weights[1][1]], [transp_weights[0][1]+transp_weights[2][0]], [transp_weights[1][0]+transp_weights[2][1]]]),
-                                #(self.__search_trivial_unbalanced_transposition, transp[0], transp[1], transp[2])]
-                                (self.__make_sure_the_three_cycles_are_balanced, graph, transp[0], transp[1], transp[2])]
-                            print("ERROR: " +  graph.to_string())
+                    else :
+                        return [
+                           (3, transp[0], transp[1], transp[2],
+                            #transp_weights[0][0], transp_weights[1][0], transp_weights[2][0]),
+                            [[transp_weights[0][0]+transp_weights[1][1]], [transp_weights[0][1]+transp_weights[2][0]], [transp_weights[1][0]+transp_weights[2][1]]]),
+                            #(self.__search_trivial_unbalanced_transposition, transp[0], transp[1], transp[2])]
+                            (self.__make_sure_the_three_cycles_are_balanced, graph, transp[0], transp[1], transp[2])]
+                        print("ERROR: " +  graph.to_string())
 
 
 
@@ -2373,62 +3447,55 @@ class Intergenic_Rev :
         if b.index % 2 == 0 :
             b = b.ap
         if c.index % 2 == 0 :
-            c = b.ap
-            
-        ## Now I create the halves
-            
-        half0 = {} ## outside
-        half1 = {}
-        half2 = {}
-
-        ## starting the search
-        graph.clean_visit()
-        node = graph.end_node
-        while node != c :
-            node.visit = 0
-            if node.cycle in half0 and node.wp[0] < half0[node.cycle].wp[0] :
-                pass
-            else :
-                half0[node.cycle] = node
-            node = node.ap.ab
-                
-        ## starting the search
-        node = c.ap.ab
-        while node != b :
-            node.visit = 1
-            if node.cycle in half1 and node.wp[0] < half1[node.cycle].wp[0] :
-                pass
-            else :
-                half1[node.cycle] = node
-            node = node.ap.ab
-                    
-        node = b.ap.ab
-        while node != a :
-            node.visit = 2            
-            if node.cycle in half2 and node.wp[0] < half2[node.cycle].wp[0] :
-                pass
-            else :
-                half2[node.cycle] = node
-            node = node.ap.ab
-        
-        node = a.ap.ab
-        while node :
-            node.visit = 0            
-            if node.cycle in half0 and node.wp[0] < half0[node.cycle].wp[0] :
-                pass
-            else :                
-                half0[node.cycle] = node
-            node = node.ap.ab
-
-        ## Let us first try interleave
-        for key in list(half0.keys()) :
-            if key in half1 and key in half2 :
-                a,b,c = half0[key], half2[key], half1[key]
-                if ( key != v_i.cycle ) :
-                    if a.index > c.index :
-                        return b, c, a
-                    else :
-                        return a, b, c
+            c = c.ap
+
+        transp = self.__search_interleaving_cycle(graph, v_i, a, b, c)
+        if transp :
+            return transp
+
+        ## Now I create the halves: the heaviest black edge (the
+        ## leftmost one on ties) of each cycle out of a and c (half0),
+        ## between b and c (half1) and between a and b (half2). Each
+        ## half lists its cycles in the order they are found walking
+        ## from end_node to the left, that is, by their rightmost black
+        ## edge in the half, with the black edges after c before the
+        ## ones before a in half0. A trivial cycle is in a single half,
+        ## so we do not need it (see below).
+        _, vertices = graph.get_cycles(want_vertices = True)
+        heaviest = lambda edges : max(edges, key = lambda node : (node.wp[0], -node.index))
+        found = ([], [], [])
+        for key in range(len(vertices)) :
+            if len(vertices[key]) == 2 :
+                continue
+            indices, nodes = graph.cycle_edges(key)
+            left   = bisect.bisect_left(indices, a.index)
+            part2  = (bisect.bisect_right(indices, a.index), bisect.bisect_left(indices, b.index))
+            part1  = (bisect.bisect_right(indices, b.index), bisect.bisect_left(indices, c.index))
+            right  = bisect.bisect_right(indices, c.index)
+            if right < len(nodes) :
+                found[0].append(((0, -indices[-1]), key, heaviest(nodes[:left] + nodes[right:])))
+            elif left > 0 :
+                found[0].append(((1, -indices[left-1]), key, heaviest(nodes[:left])))
+            if part1[0] < part1[1] :
+                found[1].append((-indices[part1[1]-1], key, heaviest(nodes[part1[0]:part1[1]])))
+            if part2[0] < part2[1] :
+                found[2].append((-indices[part2[1]-1], key, heaviest(nodes[part2[0]:part2[1]])))
+        half0, half1, half2 = [dict((key, node) for _, key, node in sorted(edges, key = lambda edge : edge[0]))
+                               for edges in found]
+
+        ## The region of each node for the search of a balanced cycle
+        ## below: the right ends of the black edges in half0, half1 and
+        ## half2 are in 0, 1 and 2, every other node is in 0.
+        ends = (a, b, c)
+        low, middle, high = a.index, b.index, c.index
+        def region(node) :
+            if node.index % 2 == 0 or node in ends :
+                return 0
+            if middle < node.index < high :
+                return 1
+            if low < node.index < middle :
+                return 2
+            return 0
 
         ## Let us clean the dictionary, there might be many unitary
         ## cycles or cycles in only one half. We do not need them.
@@ -2460,7 +3527,7 @@ class Intergenic_Rev :
                     end  = init.ap.ac
                     while keep_searching :
                         while end != init and keep_searching :
-                            if end.visit != init.visit :
+                            if region(end) != region(init) :
                                 blacks, grays = self.__sum_weight_in_segment(init, end)
                                 blacks = blacks - init.wp[0]
                                 if 0 <= grays - blacks <= init.wp[0] + end.wp[0] :
@@ -2476,7 +3543,7 @@ class Intergenic_Rev :
         
                     if found :
                         a,b,c = init, end, None
-                        visited = (init.visit, end.visit)
+                        visited = (region(init), region(end))
                         if 0 not in visited :
                             c = half0.popitem()[1]
                         elif 1 not in visited :
@@ -2509,7 +3576,46 @@ class Intergenic_Rev :
                         return b, c, a
                     else :
                         return a, b, c
-        print("""ERROR: this line should never be reached, are you sure you removed the oriented cycles? """)
+        raise Sorting_Error("""ERROR: this line should never be reached, are you sure you removed the oriented cycles? """)
+
+    ## The first step of __search_interleaving_edges, without walking
+    ## the genome: a cycle other than the one of v_i with black edges
+    ## out of a and c (half0), between b and c (half1) and between a
+    ## and b (half2), taken in the order of half0 and with the heaviest
+    ## black edge of each half (the leftmost one on ties). The halves
+    ## are checked in the black edges of each cycle, skipping the ones
+    ## that are trivial or whose rightmost black edge is not after b.
+    ## Returns None if there is no such cycle.
+    def __search_interleaving_cycle(self, graph, v_i, a, b, c) :
+        _, vertices = graph.get_cycles(want_vertices = True)
+        order = []
+        for key in range(len(vertices)) :
+            if key == v_i.cycle or len(vertices[key]) == 2 or vertices[key][0].index <= b.index :
+                continue
+            indices, nodes = graph.cycle_edges(key)
+            if not (graph.has_edge_between(key, b.index, c.index) and
+                    graph.has_edge_between(key, a.index, b.index) and
+                    (indices[0] < a.index or indices[-1] > c.index)) :
+                continue
+            ## As in __search_crossing_edges.
+            if indices[-1] > c.index :
+                order.append(((0, key), key))
+            else :
+                order.append(((1, -indices[bisect.bisect_left(indices, a.index) - 1]), key))
+        if not order :
+            return None
+
+        _, key = min(order)
+        indices, nodes = graph.cycle_edges(key)
+        heaviest = lambda edges : max(edges, key = lambda node : (node.wp[0], -node.index))
+        a, b, c = (
+            heaviest(nodes[:bisect.bisect_left(indices, a.index)] + nodes[bisect.bisect_right(indices, c.index):]),
+            heaviest(nodes[bisect.bisect_right(indices, a.index):bisect.bisect_left(indices, b.index)]),
+            heaviest(nodes[bisect.bisect_right(indices, b.index):bisect.bisect_left(indices, c.index)]))
+        if a.index > c.index :
+            return b, c, a
+        else :
+            return a, b, c
 
     ## Here we have a transposition where a and b are in the same
     ## cycle and need to get rid of weight to send to c. We need to
@@ -2592,84 +3698,70 @@ class Intergenic_Rev :
             wc = max(0,min(c.wp[0], c.wc[0] - d.wp[0]))
             return (3, a, b, c, [[wa + b.wp[0] - wb], [a.wp[0]-wa + wc], [c.wp[0] - wc + wb]])
         else :
-            print("I had a problem when finding the short crossing cycle...")
-            sys.exit(0)
+            raise Sorting_Error("I had a problem when finding the short crossing cycle...")
 
 
     ## At this point, we know that no oriented balanced cycle exists.
     def lemma_4_transp(self, graph) :
-        _, vertices = graph.get_cycles(want_vertices = True)
-        for cycle in vertices :
-            if (cycle[0].direction == 1 and ## Check if it is convergent
-                cycle[0].size      >=  3 and ## Check if it is long
-                cycle[0].blacks    == cycle[0].grays and # Check if it is balanced
-                cycle[0].gray_labeled == False and                 # not gray labeled, and
-                cycle[0].black_labeled == False                     # not black labeled
-            ) :
-                ## The following link works because no oriented
-                ## balanced exists.
-                transp = self.__search_interleaving_edges(
-                    graph,
-                    cycle[4],
-                    cycle[2],
-                    cycle[0])
-
-                ## If it is a shuffling transposition, we can do it.
-                if transp[0].cycle == transp[1].cycle == transp[2].cycle :
-                    return (3, transp[0], transp[1], transp[2],
-                            [[transp[0].wp[0]],
-                            [transp[2].wp[0]],
-                            [transp[1].wp[0]]])
-                ## If the cycles are unbalanced, we can do it.
-                if ( (transp[0].blacks != transp[0].grays) and
-                     (transp[1].blacks != transp[1].grays) and
-                     (transp[2].blacks != transp[2].grays) ) :
-                    return (3, transp[0], transp[1], transp[2],
-                            [[transp[0].wp[0]],
-                            [transp[2].wp[0]],
-                            [transp[1].wp[0]]])
+        for cycle in graph.cycles_in("good-oriented") :
+            ## The following link works because no oriented
+            ## balanced exists.
+            transp = self.__search_interleaving_edges(
+                graph,
+                cycle[4],
+                cycle[2],
+                cycle[0])
+
+            ## If it is a shuffling transposition, we can do it.
+            if transp[0].cycle == transp[1].cycle == transp[2].cycle :
+                return (3, transp[0], transp[1], transp[2],
+                        [[transp[0].wp[0]],
+                        [transp[2].wp[0]],
+                        [transp[1].wp[0]]])
+            ## If the cycles are unbalanced, we can do it.
+            if ( (transp[0].blacks != transp[0].grays) and
+                 (transp[1].blacks != transp[1].grays) and
+                 (transp[2].blacks != transp[2].grays) ) :
+                return (3, transp[0], transp[1], transp[2],
+                        [[transp[0].wp[0]],
+                        [transp[2].wp[0]],
+                        [transp[1].wp[0]]])
                 
-                ## At least one of them is balanced. So we need to be
-                ## careful at this point. We need to move a balanced
-                ## amount of weight.  We know that
-                ## self.__search_interleaving_edges places the
-                ## balanced cycle first, which is great. Also, the
-                ## returned edges are already the ones we can break,
-                ## we just need to compute weights.
-                return self.__compute_weight_to_send_to_other_cycle(transp[0], transp[1], transp[2])
+            ## At least one of them is balanced. So we need to be
+            ## careful at this point. We need to move a balanced
+            ## amount of weight.  We know that
+            ## self.__search_interleaving_edges places the
+            ## balanced cycle first, which is great. Also, the
+            ## returned edges are already the ones we can break,
+            ## we just need to compute weights.
+            return self.__compute_weight_to_send_to_other_cycle(transp[0], transp[1], transp[2])
 
     
             
     ## At this point, we know that no oriented balanced cycle exists.
     def search_nontrivial_unbalanced_transposition(self, graph) :
-        _, vertices = graph.get_cycles(want_vertices = True)
-        for cycle in vertices :
-            if (cycle[0].direction == 1 and ## Check if it is convergent
-                cycle[0].size      >= 2 and ## Check if it is nontrivial
-                cycle[0].blacks    > cycle[0].grays 
-            ) :
-                ## Let us first find another cycle where we will put
-                ## the extra weight.
-                c = None
-                for cycle1 in vertices :
-                    if (cycle1[0].blacks  < cycle1[0].grays) :
-                        c = cycle1[0]
-                        break
+        for cycle in graph.cycles_in("convergent-negative") :
+            ## Let us first find another cycle where we will put
+            ## the extra weight.
+            c = None
+            for cycle1 in graph.cycles_in("positive") :
+                c = cycle1[0]
+                break
                     
-                ## Let us find a long cycle
-                init = cycle[0]
+            ## Let us find a long cycle
+            init = cycle[0]
+            end  = init.ap.ac
+            while True : ## I will be locked in this infinity loop
+                         ## to depure if something fails
+                while end != init :
+                    op = self.__compute_weight_to_send_to_other_cycle(init, end, c) 
+                    if op :
+                        return op
+                    end = end.ap.ac
+                init = init.ap.ac
                 end  = init.ap.ac
-                while True : ## I will be locked in this infinity loop
-                             ## to depure if something fails
-                    while end != init :
-                        op = self.__compute_weight_to_send_to_other_cycle(init, end, c) 
-                        if op :
-                            return op
-                        end = end.ap.ac
-                    init = init.ap.ac
-                    end  = init.ap.ac
-                    if init == cycle[0] :
-                        break
+                if init == cycle[0] :
+                    break
 
     def __make_sure_the_three_cycles_are_balanced(self, graph, node0, node1, node2) :
         ops = []
@@ -2680,8 +3772,7 @@ class Intergenic_Rev :
         elif node2.grays == node2.blacks :
             triv_bal, a, b = node2, node0, node1
         else :
-            print("Error after applying lemma 3, no balanced cycles were generated...")
-            sys.exit(0)
+            raise Sorting_Error("Error after applying lemma 3, no balanced cycles were generated...")
 
         if (a.grays != a.blacks) and (b.grays != b.blacks) :
             if (a.blacks > a.grays) :
@@ -2825,35 +3916,33 @@ class Intergenic_Rev :
     ## than 1. Therefore we have little ammunition, our last resource
     ## is to send the extra weight somewhere.
     def search_trivial_unbalanced_transposition(self, graph) :
-        _, vertices = graph.get_cycles(want_vertices = True)
-        for cycle in vertices :
-            if (cycle[0].blacks    > cycle[0].grays) :
-
-                ## Search for other gray edges where we will send the
-                ## extra weight.
-                node1, node2 = None, None
-                node = graph.end_node                
-                while node :
-                    #####ANDRE changed != to <
-                    if (node.blacks < node.grays and
-                        node.cycle  != cycle[0].cycle) :
-                        if   not node1 :
-                            node1 = node
-                        else :
-                            node2 = node
-                            break
-                    node = node.ap.ab
-
-                ## There is only two unbalanced cycles and they are
-                ## trivial, so I pick any cycle as node2.
-                node = graph.end_node
-                while not node2 :
-                    if (node.index != node1.index and
-                        node.index != cycle[0].index) :
+        for cycle in graph.cycles_in("negative") :
+
+            ## Search for other gray edges where we will send the
+            ## extra weight.
+            node1, node2 = None, None
+            node = graph.end_node                
+            while node :
+                #####ANDRE changed != to <
+                if (node.blacks < node.grays and
+                    node.cycle  != cycle[0].cycle) :
+                    if   not node1 :
+                        node1 = node
+                    else :
                         node2 = node
-                    node = node.ap.ab
+                        break
+                node = node.ap.ab
 
-                return self.__search_trivial_unbalanced_transposition(cycle[0], node1, node2)
+            ## There is only two unbalanced cycles and they are
+            ## trivial, so I pick any cycle as node2.
+            node = graph.end_node
+            while not node2 :
+                if (node.index != node1.index and
+                    node.index != cycle[0].index) :
+                    node2 = node
+                node = node.ap.ab
+
+            return self.__search_trivial_unbalanced_transposition(cycle[0], node1, node2)
 
 
 
@@ -2994,8 +4083,7 @@ class Intergenic_Rev :
                     wc2 = need_b + wb #b.grays #b.grays-b.blacks
                     return [[a, b, c, wa, wb, wc],[b, a, c, wa2, wb2, wc2]]
 
-        print("ERRO Ops, nenhuma operacao encontrada...")
-        sys.exit()
+        raise Sorting_Error("ERRO Ops, nenhuma operacao encontrada...")
 
 
     ## At this point, we know that no blackheaviest cycle is bigger
@@ -3004,45 +4092,43 @@ class Intergenic_Rev :
     ## we can find either two negative, or two positives or one of each
     ## and create two new balanced cycles
     def search_two_trivial_unbalanced_transposition(self, graph) :
-        _, vertices = graph.get_cycles(want_vertices = True)
-        for cycle in vertices :
-            if (cycle[0].blacks    > cycle[0].grays) :
-
-                ## Search another cycle that is also negative to be node1
-                node1, node2 = None, None
+        for cycle in graph.cycles_in("negative") :
+
+            ## Search another cycle that is also negative to be node1
+            node1, node2 = None, None
+            node = graph.end_node                
+            while node :
+                if (node.blacks > node.grays and node.cycle != cycle[0].cycle) :
+                    if   not node1 :
+                        node1 = node
+                node = node.ap.ab
+
+            ## If node1 is None, then let us choose a positive cycle to be node1
+            if not node1:
                 node = graph.end_node                
                 while node :
-                    if (node.blacks > node.grays and node.cycle != cycle[0].cycle) :
-                        if   not node1 :
+                    if (node.blacks < node.grays and node.cycle != cycle[0].cycle) :
+                        if not node1 :
                             node1 = node
                     node = node.ap.ab
-
-                ## If node1 is None, then let us choose a positive cycle to be node1
-                if not node1:
-                    node = graph.end_node                
-                    while node :
-                        if (node.blacks < node.grays and node.cycle != cycle[0].cycle) :
-                            if not node1 :
-                                node1 = node
-                        node = node.ap.ab
                 
-                ## Let us find now a positive cycle (that is different from node1) to be node2
-                node = graph.end_node                
-                while node :
-                    if (node.blacks < node.grays and node.cycle != node1.cycle) :
-                        if   not node2 :
-                            node2 = node
-                    node = node.ap.ab
-
-                ## There is only two unbalanced cycles, so I pick any balanced cycle as node2.
-                node = graph.end_node
-                while not node2 :
-                    if (node.index != node1.index and
-                        node.index != cycle[0].index) :
+            ## Let us find now a positive cycle (that is different from node1) to be node2
+            node = graph.end_node                
+            while node :
+                if (node.blacks < node.grays and node.cycle != node1.cycle) :
+                    if   not node2 :
                         node2 = node
-                    node = node.ap.ab
+                node = node.ap.ab
+
+            ## There is only two unbalanced cycles, so I pick any balanced cycle as node2.
+            node = graph.end_node
+            while not node2 :
+                if (node.index != node1.index and
+                    node.index != cycle[0].index) :
+                    node2 = node
+                node = node.ap.ab
 
-                return self.__search_two_trivial_unbalanced_transposition(cycle[0], node1, node2)
+            return self.__search_two_trivial_unbalanced_transposition(cycle[0], node1, node2)
 
 
     ## Search crossing edges. The point of this method is to find a
@@ -3087,18 +4173,12 @@ class Intergenic_Rev :
 
             
     def lemma_5_transp(self, graph) :
-        _, vertices = graph.get_cycles(want_vertices = True)
-        for cycle in vertices :
-            if (
-                cycle[0].size          ==  2    and                 # non-trivial
-                cycle[0].gray_labeled  == False and                 # not gray labeled, and
-                cycle[0].black_labeled == False                     # not black labeled
-               ) :
-                a,b = cycle[0].ap.ac, cycle[0]
-                c,d = self.__search_crossing_edges_for_transposition(graph, a, b)
-                op = self.__compute_weight_to_send_to_other_cycle_two_short(a, b, c)
-                if op :
-                    return op
+        for cycle in graph.cycles_in("short-clean") :
+            a,b = cycle[0].ap.ac, cycle[0]
+            c,d = self.__search_crossing_edges_for_transposition(graph, a, b)
+            op = self.__compute_weight_to_send_to_other_cycle_two_short(a, b, c)
+            if op :
+                return op
 
     def lemma_6_transp(self, graph) :
         return self.lemma_5(graph)
@@ -3108,99 +4188,80 @@ class Intergenic_Rev :
         return self.lemma_6(graph)
 
     def lemma_8_transp(self, graph) :
-        _, vertices = graph.get_cycles(want_vertices = True)
-        for cycle in vertices :
-            if (
-                  cycle[0].size > 1 and                # non-trivial,
-                  cycle[0].blacks < cycle[0].grays and # positive,
-                  cycle[0].gray_labeled  == False and                 # not gray labeled, and
-                  cycle[0].black_labeled == False                     # not black labeled
-            ) : ## we just increase the weight of the black edge
-                indel_position = 0
-                indel_sequence = [int(cycle[0].grays - cycle[0].blacks),]
-                pi_inserted = []
-                return (1, cycle[0], indel_position, [pi_inserted, indel_sequence])
+        for cycle in graph.cycles_in("positive-clean") :
+            indel_position = 0
+            indel_sequence = [int(cycle[0].grays - cycle[0].blacks),]
+            pi_inserted = []
+            return (1, cycle[0], indel_position, [pi_inserted, indel_sequence])
         return None
 
 
     def lemma_9_transp(self, graph) :
-        _, vertices = graph.get_cycles(want_vertices = True)
-        for cycle in vertices :
-            if (cycle[0].direction == 1 and ## Check if it is convergent
-                cycle[0].size      >= 3 and ## Check if it is long
-                not (cycle[0].gray_labeled == False and cycle[0].black_labeled == False and cycle[0].blacks == cycle[0].grays) ## Check if it is a bad cycle
-            ) :
-                triples = self.find_all_triples_two_adj(cycle)
+        for cycle in graph.cycles_in("bad-oriented") :
+            first = next(self.find_all_triples_two_adj(cycle), None)
                 
-                if not triples :
-                    return None
+            if not first :
+                return None
               
-                # first let us try to create a balanced good cycle if possible
-                for transp in triples :
-                    #trivial in the left
-                    if transp[0].ap.ac == transp[1] and len(transp[1].wc) == 1 :
-                        if transp[0].wp[0] + transp[1].wp[-1] >= transp[1].wc[0] :
-                            from_left = min(transp[0].wp[0],transp[1].wc[0])
-                            from_middle = transp[1].wc[0] - from_left
-                            left_w = [] + transp[1].wc
-                            middle_w = [transp[0].wp[0]-from_left] + transp[0].wp[1:]
-                            right_w = transp[1].wp[:-1] + [transp[1].wp[-1]-from_middle + transp[2].wp[0]] + transp[2].wp[1:]
-                            return (3, transp[0], transp[1], transp[2], [left_w, middle_w, right_w])
+            # first let us try to create a balanced good cycle if possible
+            for transp in self.find_all_triples_two_adj(cycle) :
+                #trivial in the left
+                if transp[0].ap.ac == transp[1] and len(transp[1].wc) == 1 :
+                    if transp[0].wp[0] + transp[1].wp[-1] >= transp[1].wc[0] :
+                        from_left = min(transp[0].wp[0],transp[1].wc[0])
+                        from_middle = transp[1].wc[0] - from_left
+                        left_w = [] + transp[1].wc
+                        middle_w = [transp[0].wp[0]-from_left] + transp[0].wp[1:]
+                        right_w = transp[1].wp[:-1] + [transp[1].wp[-1]-from_middle + transp[2].wp[0]] + transp[2].wp[1:]
+                        return (3, transp[0], transp[1], transp[2], [left_w, middle_w, right_w])
                     
-                    if transp[1].ap.ac == transp[2] and len(transp[2].wc) == 1 :
-                        #trivial formado na direita
-                        if transp[1].wp[0] + transp[2].wp[-1] >= transp[2].wc[0] :
-                            from_middle = min(transp[1].wp[0],transp[2].wc[0])
-                            from_right = transp[2].wc[0] - from_middle
-                            left_w = transp[0].wp[:-1] + [transp[0].wp[-1] + transp[1].wp[0]-from_middle] + transp[1].wp[1:]
-                            middle_w = transp[2].wp[:-1] + [transp[2].wp[-1]-from_right]
-                            right_w = [] + transp[2].wc
-                            return (3, transp[0], transp[1], transp[2], [left_w, middle_w, right_w])
+                if transp[1].ap.ac == transp[2] and len(transp[2].wc) == 1 :
+                    #trivial formado na direita
+                    if transp[1].wp[0] + transp[2].wp[-1] >= transp[2].wc[0] :
+                        from_middle = min(transp[1].wp[0],transp[2].wc[0])
+                        from_right = transp[2].wc[0] - from_middle
+                        left_w = transp[0].wp[:-1] + [transp[0].wp[-1] + transp[1].wp[0]-from_middle] + transp[1].wp[1:]
+                        middle_w = transp[2].wp[:-1] + [transp[2].wp[-1]-from_right]
+                        right_w = [] + transp[2].wc
+                        return (3, transp[0], transp[1], transp[2], [left_w, middle_w, right_w])
                     
-                    if transp[2].ap.ac == transp[0] and len(transp[0].wc) == 1 :
-                        #trivial formado no meio
-                        if transp[2].wp[0] + transp[0].wp[-1] >= transp[0].wc[0] :
-                            from_left = min(transp[0].wp[-1],transp[0].wc[0])
-                            from_right = transp[0].wc[0] - from_left
-                            left_w = transp[0].wp[:-1] + [transp[0].wp[-1]-from_left]
-                            middle_w = [] + transp[0].wc
-                            right_w = transp[1].wp[:-1] + [ transp[1].wp[-1] + transp[2].wp[0] - from_right ] + transp[2].wp[1:]
-                            return (3, transp[0], transp[1], transp[2], [left_w, middle_w, right_w])
-
-                # it is not possible, so let us just create a trivial cycle and set 0 to its black edge weight
-                transp = triples[0]
-                if transp[0].ap.ac == transp[1] :
-                    #trivial formado na esquerda
-                    left_w   = [0]
-                    middle_w = [] + transp[0].wp
-                    right_w  = transp[1].wp[:-1] + [transp[1].wp[-1] + transp[2].wp[0]] + transp[2].wp[1:]
-                    return (3, transp[0], transp[1], transp[2], [left_w, middle_w, right_w])
+                if transp[2].ap.ac == transp[0] and len(transp[0].wc) == 1 :
+                    #trivial formado no meio
+                    if transp[2].wp[0] + transp[0].wp[-1] >= transp[0].wc[0] :
+                        from_left = min(transp[0].wp[-1],transp[0].wc[0])
+                        from_right = transp[0].wc[0] - from_left
+                        left_w = transp[0].wp[:-1] + [transp[0].wp[-1]-from_left]
+                        middle_w = [] + transp[0].wc
+                        right_w = transp[1].wp[:-1] + [ transp[1].wp[-1] + transp[2].wp[0] - from_right ] + transp[2].wp[1:]
+                        return (3, transp[0], transp[1], transp[2], [left_w, middle_w, right_w])
+
+            # it is not possible, so let us just create a trivial cycle and set 0 to its black edge weight
+            transp = first
+            if transp[0].ap.ac == transp[1] :
+                #trivial formado na esquerda
+                left_w   = [0]
+                middle_w = [] + transp[0].wp
+                right_w  = transp[1].wp[:-1] + [transp[1].wp[-1] + transp[2].wp[0]] + transp[2].wp[1:]
+                return (3, transp[0], transp[1], transp[2], [left_w, middle_w, right_w])
                 
-                if transp[1].ap.ac == transp[2] :
-                    #trivial formado na direita
-                    left_w   = transp[0].wp[:-1] + [transp[0].wp[-1] + transp[1].wp[0] ] + transp[1].wp[1:]
-                    middle_w = [] + transp[2].wp
-                    right_w  = [0]
-                    return (3, transp[0], transp[1], transp[2], [left_w, middle_w, right_w])
+            if transp[1].ap.ac == transp[2] :
+                #trivial formado na direita
+                left_w   = transp[0].wp[:-1] + [transp[0].wp[-1] + transp[1].wp[0] ] + transp[1].wp[1:]
+                middle_w = [] + transp[2].wp
+                right_w  = [0]
+                return (3, transp[0], transp[1], transp[2], [left_w, middle_w, right_w])
                 
-                else :# if transp[2].ap.ac == transp[0] :
-                    #trivial formado no meio
-                    left_w   = [] + transp[0].wp
-                    middle_w = [0]
-                    right_w  = transp[1].wp[:-1] + [ transp[1].wp[-1] + transp[2].wp[0] ] + transp[2].wp[1:]
-                    return (3, transp[0], transp[1], transp[2], [left_w, middle_w, right_w])
+            else :# if transp[2].ap.ac == transp[0] :
+                #trivial formado no meio
+                left_w   = [] + transp[0].wp
+                middle_w = [0]
+                right_w  = transp[1].wp[:-1] + [ transp[1].wp[-1] + transp[2].wp[0] ] + transp[2].wp[1:]
+                return (3, transp[0], transp[1], transp[2], [left_w, middle_w, right_w])
 
 
 
     def lemma_10_transp(self, graph) :
-        _, vertices = graph.get_cycles(want_vertices = True)
-        bad_ones = []
-        for cycle in vertices :
-            if (cycle[0].direction == 1 and ## Check if it is convergent
-                cycle[0].size      > 1 and ## Check if it is non trivial
-                not (cycle[0].gray_labeled == False and cycle[0].black_labeled == False and cycle[0].blacks == cycle[0].grays) ## Check if it is a bad cycle
-            ) :
-                bad_ones.append(cycle[0])
+        bad_ones = [cycle[0] for cycle in graph.cycles_in("bad")]
 
         if len(bad_ones) > 1 :
             first_cycle = bad_ones[0]
@@ -3230,14 +4291,7 @@ class Intergenic_Rev :
 
 
     def lemma_11_transp(self, graph) :
-        _, vertices = graph.get_cycles(want_vertices = True)
-        bad_ones = []
-        for cycle in vertices :
-            if (cycle[0].direction == 1 and ## Check if it is convergent
-                cycle[0].size       > 1 and ## Check if it is non trivial
-                not (cycle[0].gray_labeled == False and cycle[0].black_labeled == False and cycle[0].blacks == cycle[0].grays) ## Check if it is a bad cycle
-            ) :
-                bad_ones.append(cycle)
+        bad_ones = list(graph.cycles_in("bad"))
         if len(bad_ones) == 1 :
             cycle = bad_ones[0]
             if cycle[0].size > 2 :
@@ -3299,8 +4353,7 @@ class Intergenic_Rev :
 
                     # at this point if to_remove is not 0 then we have a serious problem...
                     if to_remove != 0 :
-                        print("Error in Lemma 11... the indels kept the cycle unbalanced")
-                        sys.exit(0)
+                        raise Sorting_Error("Error in Lemma 11... the indels kept the cycle unbalanced")
                     return ops
             else : #we also have gray labeled edges...
                 # at this time I will apply only an insertion. in the next
@@ -3338,14 +4391,7 @@ class Intergenic_Rev :
 
 
     def lemma_12_transp(self, graph) :
-        _, vertices = graph.get_cycles(want_vertices = True)
-        bad_ones = []
-        for cycle in vertices :
-            if (cycle[0].direction == 1 and ## Check if it is convergent
-                cycle[0].size      > 1 and ## Check if it is non trivial
-                not (cycle[0].gray_labeled == False and cycle[0].black_labeled == False and cycle[0].blacks == cycle[0].grays) ## Check if it is a bad cycle
-            ) :
-                bad_ones.append(cycle)
+        bad_ones = list(graph.cycles_in("bad"))
 
         if len(bad_ones) == 1 :
             cycle = bad_ones[0]
@@ -3573,6 +4619,218 @@ def construct_str_cycle(input_string, input_gray, input_black) :
     return(canonicals, wgray, wblack)
 
 
+## Sorts one genome and returns a Sort_Result. The parameters are the
+## lists (i), (ii) and (iii) described below and the string (iv) with
+## the allowed operations. Inconsistencies found while sorting raise
+## Sorting_Error. The time of the result starts at start_time (a
+## time.perf_counter() value), which defaults to the moment this
+## function is called; whatever ran since then (e.g. the parsing of
+## run_instance) is the parse phase of the Phase_Times of the result.
+## The phases can also be given, to be marked from their start on.
+def sort_genome(pi, breve_pi, breve_iota, allowed_ops, start_time = None, backend = "list", distance_only = False, profile = False, phases = None) :
+    if phases is None :
+        phases = Phase_Times(start_time)
+    phases.mark("parse")
+    final_length = len(breve_iota)
+
+    config, grayw, blackw = construct_str_cycle(pi, breve_iota, breve_pi)
+    sort = Intergenic_Rev(config, grayw, blackw, final_length, backend, distance_only, profile)
+    phases.mark("construct")
+    result = sort.sort(phases.start, allowed_ops)
+    phases.mark("sort")
+    result.phases = phases
+    return result
+
+## Formats a Sort_Result as the line printed by the command line version.
+## With encoded, the operations are written as in encode_operations_text
+## instead of their repr. With timing, the output phase ends here and
+## the phases are appended (see Phase_Times).
+def format_result(result, encoded = False, timing = False) :
+    if encoded :
+        operations = encode_operations_text(result.operations)
+    else :
+        operations = str(result.operations).replace(" ", "")
+    line = '%s [%s] [%s] %d %s %f %f' % (result.input_cycles,
+                                         result.input_wgray,
+                                         result.input_wblack,
+                                         result.distance,
+                                         operations,
+                                         result.approx,
+                                         result.time)
+    if result.status == Sort_Result.BOUND_EXCEEDED :
+        line += ' ERROR-LOWER-BOUND-HIGHER'
+    elif result.status == Sort_Result.NOT_SORTED :
+        line += ' ERROR-NOT-SORTED'
+    if timing and result.phases :
+        result.phases.mark("output")
+        line += ' ' + result.phases.format()
+    if result.profile :
+        line += ' profile=' + result.profile.encode()
+    return line
+
+## Formats a Sort_Result of the distance only mode. The distance, the
+## approximation and the time stay in columns 4, 6 and 7, as in
+## format_result, so stats.sh reads both; the input columns give way
+## to the lower bound, the approximation factor and the status, and
+## the sequence to the number of operations of each kind.
+def format_distance(result, timing = False) :
+    line = '%s %s %s %d %s %f %f' % (result.lower_bound,
+                                     result.max_approx,
+                                     result.status,
+                                     result.distance,
+                                     result.operations,
+                                     result.approx,
+                                     result.time)
+    if result.status == Sort_Result.BOUND_EXCEEDED :
+        line += ' ERROR-LOWER-BOUND-HIGHER'
+    elif result.status == Sort_Result.NOT_SORTED :
+        line += ' ERROR-NOT-SORTED'
+    if timing and result.phases :
+        result.phases.mark("output")
+        line += ' ' + result.phases.format()
+    if result.profile :
+        line += ' profile=' + result.profile.encode()
+    return line
+
+
+
+############################################################################
+################### Binary encoding of the operations #####################
+############################################################################
+
+## A sequence of operations is encoded as a header, an array of records
+## and an array with the genes and weights of the indels (the payload),
+## all of little-endian 64-bit integers:
+##     header  : b"OPS1", number of records, size of the payload;
+##     records : OPERATION_FIELDS integers per operation, the kind
+##               (an index of OPERATION_KINDS) followed by
+##                   DEL/INS : i, x, offset, genes, weights, nested
+##                   REV     : i, j, weight, weight, 0, 0
+##                   TRANSP  : i, j, k, weight, weight, weight
+## The genes and then the weights of an indel are in the payload from
+## offset on. An indel on a cycle of size 2 has lists of genes and a
+## list in its weights, so nested = 1 and every item is stored as -1
+## and the integer, or as the size of the list followed by the list;
+## genes and weights are then the number of payload integers they use.
+OPERATION_KINDS  = ("DEL", "INS", "REV", "TRANSP")
+OPERATION_FIELDS = 7
+OPERATION_HEADER = struct.Struct("<4sqq")
+
+def encode_nested(items, payload) :
+    start = len(payload)
+    for item in items :
+        if isinstance(item, list) :
+            payload.append(len(item))
+            payload.extend(item)
+        else :
+            payload.append(-1)
+            payload.append(item)
+    return len(payload) - start
+
+def decode_nested(payload, start, size) :
+    items, place, stop = [], start, start + size
+    while place < stop :
+        if payload[place] < 0 :
+            items.append(payload[place+1])
+            place += 2
+        else :
+            items.append(list(payload[place+1:place+1+payload[place]]))
+            place += 1 + payload[place]
+    return items
+
+## Encodes a list of operations, as in Sort_Result.operations, into the
+## records and the payload, both array("q").
+def encode_operations(operations) :
+    records = array.array("q")
+    payload = array.array("q")
+    codes   = {kind : code for code, kind in enumerate(OPERATION_KINDS)}
+    for op in operations :
+        kind = codes[op[0]]
+        if kind == 3 :
+            weights = op[4]
+            records.extend((3, op[1], op[2], op[3], weights[0], weights[1], weights[2]))
+        elif kind == 2 :
+            records.extend((2, op[1], op[2], op[3], op[4], 0, 0))
+        else :
+            genes, weights = op[3], op[4]
+            offset = len(payload)
+            if list in map(type, genes) or list in map(type, weights) :
+                records.extend((kind, op[1], op[2], offset,
+                                encode_nested(genes, payload), encode_nested(weights, payload), 1))
+            else :
+                payload.extend(genes)
+                payload.extend(weights)
+                records.extend((kind, op[1], op[2], offset, len(genes), len(weights), 0))
+    return records, payload
+
+## The encoded operations as bytes, header included.
+def operations_to_bytes(operations) :
+    records, payload = encode_operations(operations)
+    if sys.byteorder == "big" :
+        records.byteswap()
+        payload.byteswap()
+    header = OPERATION_HEADER.pack(b"OPS1", len(records) // OPERATION_FIELDS, len(payload))
+    return header + records.tobytes() + payload.tobytes()
+
+## Reads encoded operations from any buffer (bytes, a mmap of a file
+## written with operations_to_bytes, ...) without copying it: records
+## and payload are memoryviews of the buffer, and an operation is only
+## turned into the tuple of Sort_Result.operations when it is indexed.
+## With numpy, arrays() gives the records as a (n, OPERATION_FIELDS)
+## array and the payload, both views of the buffer as well.
+class Operation_Buffer :
+    def __init__(self, buffer) :
+        view = memoryview(buffer).cast("B")
+        magic, count, size = OPERATION_HEADER.unpack_from(view)
+        if magic != b"OPS1" :
+            raise ValueError("not an encoded sequence of operations")
+        if sys.byteorder == "big" :
+            raise ValueError("encoded operations are little-endian")
+        start = OPERATION_HEADER.size
+        middle = start + 8 * OPERATION_FIELDS * count
+        self.count   = count
+        self.records = view[start:middle].cast("q")
+        self.payload = view[middle:middle + 8 * size].cast("q")
+
+    def __len__(self) :
+        return self.count
+
+    def kind(self, t) :
+        return OPERATION_KINDS[self.records[OPERATION_FIELDS * t]]
+
+    def __getitem__(self, t) :
+        if not 0 <= t < self.count :
+            raise IndexError(t)
+        kind, a, b, c, d, e, f = self.records[OPERATION_FIELDS * t : OPERATION_FIELDS * (t+1)].tolist()
+        if kind <= 1 :
+            if f :
+                return (OPERATION_KINDS[kind], a, b, decode_nested(self.payload, c, d),
+                        decode_nested(self.payload, c + d, e))
+            return (OPERATION_KINDS[kind], a, b, self.payload[c:c+d].tolist(),
+                    self.payload[c+d:c+d+e].tolist())
+        if kind == 2 :
+            return ("REV", a, b, c, d)
+        return ("TRANSP", a, b, c, [d, e, f])
+
+    def __iter__(self) :
+        for t in range(self.count) :
+            yield self[t]
+
+    def arrays(self) :
+        records = np.frombuffer(self.records, dtype = np.int64).reshape(self.count, OPERATION_FIELDS)
+        return records, np.frombuffer(self.payload, dtype = np.int64)
+
+## The fifth column of the encoded output line (see format_result):
+## the bytes of operations_to_bytes, compressed with zlib (the records
+## are mostly small numbers and zeros) and in base64.
+def encode_operations_text(operations) :
+    return "b64:" + base64.b64encode(zlib.compress(operations_to_bytes(operations), 1)).decode("ascii")
+
+def decode_operations_text(text) :
+    if text.startswith("b64:") :
+        text = text[4:]
+    return Operation_Buffer(zlib.decompress(base64.b64decode(text)))
+
 ## This main function expects three lists as input (separated by spaces):
 ##     (i) a comma-separated list with integer numbers. The number 0 is considered 
 ##          an alpha that an indel will remove. Any other number must be unique, 
@@ -3586,18 +4844,156 @@ def construct_str_cycle(input_string, input_gray, input_black) :
 ##            R for reversals only (the approx in this case is 2.5);
 ##            T for transpositions only (the approx in this case is 4); or
 ##            RT for reversals and transpositions (the approx in this case is 4).
-
-if __name__ == '__main__':
-    seconds = time.time()
-    permutation = eval("[%s]" % sys.argv[1])
-    wblack = eval("[%s]" % sys.argv[2])
-    wgray  = eval("[%s]" % sys.argv[3])
-    allowed_ops = sys.argv[4]
-
-    final_length = len(wgray)
-
-    config, grayw, blackw = construct_str_cycle(permutation, wgray, wblack)
-    sort = Intergenic_Rev(config, grayw, blackw, final_length)
-    sort.sort(seconds, allowed_ops)
+##     (v) optionally, the graph backend, which can also be given as
+##         --backend: list (default) or tree (see tree_configuration_graph).
+## The options go first. When a list starts with a minus sign (e.g.
+## -3,1,2), argparse would take it for an option, so the arguments must
+## come after --:
+##     python3 r-t-rt-indel-intergenic.py --backend tree -- -3,1,2 1,1,1,1 1,1,1,1 T
+##
+## With --stream the three lists are read from the lines of a file (or
+## of stdin if no file or - is given), as in the instance files, and a
+## result line is written for each one as soon as it is sorted:
+##     python3 r-t-rt-indel-intergenic.py --stream T [--backend tree] [file]
+##     cat t_50_0.5.in | python3 r-t-rt-indel-intergenic.py --stream T
+## Unknown models and backends are rejected before anything is read.
+##
+## With --distance (in either form) only the distance and the number of
+## operations of each kind are printed (see format_distance).
+##     python3 r-t-rt-indel-intergenic.py --distance --stream T < t_50_0.5.in
+##
+## With --encoded the operations are written in base64 (see
+## encode_operations_text) instead of their repr.
+##
+## With --profile the lemmas are timed and counted (see Lemma_Profile)
+## and the profile is appended to the line as profile=<json>.
+##
+## With --timing the wall clock and processor time of each phase (see
+## Phase_Times) are appended to the line, before the profile, as
+##     parse=0.000102/0.000101 construct=... sort=... output=...
+## The time column is the wall clock time of parse, construct and sort.
+
+## Parses a comma-separated list of integers, such as the lists above,
+## without eval. A trailing comma is accepted, as eval did.
+def parse_int_list(text) :
+    text = text.strip()
+    if text.endswith(",") :
+        text = text[:-1]
+    if not text :
+        return []
+    return list(map(int, text.split(",")))
+
+## Runs a single instance given as the strings described above and
+## prints its result line, or the error message if the sorting fails.
+## The batch runner (run-unweighted.py) imports this module once and
+## calls this function for every line of an instance file, so the time
+## column is measured exactly as in the command line version: parsing,
+## construction and sorting.
+def run_instance(str_permutation, str_wblack, str_wgray, allowed_ops, backend = "list", distance_only = False, encoded = False, profile = False, timing = False) :
+    phases = Phase_Times()
+    permutation = parse_int_list(str_permutation)
+    wblack = parse_int_list(str_wblack)
+    wgray  = parse_int_list(str_wgray)
+    run_lists(permutation, wblack, wgray, allowed_ops, backend, distance_only, encoded, profile, timing, phases)
+
+## As run_instance, for an instance already given as lists of int (e.g.
+## read from a binary instance file, see binary_instances.py).
+def run_lists(permutation, wblack, wgray, allowed_ops, backend = "list", distance_only = False, encoded = False, profile = False, timing = False, phases = None) :
+    try :
+        result = sort_genome(permutation, wblack, wgray, allowed_ops, None, backend, distance_only, profile, phases)
+    except Sorting_Error as error :
+        print(error)
+        return
+    if distance_only :
+        line = format_distance(result, timing)
+    else :
+        line = format_result(result, encoded, timing)
+    print(line)
+
+## Runs every instance line (pi breve_pi breve_iota) of the given file
+## object and flushes each result line, so the output can be read by
+## the next command of a pipeline while the stream goes on. Blank lines
+## are skipped. An instance that crashes, or a line that is not an
+## instance, is reported on stderr and gets the line ERROR-CRASH
+## <exception> in place of its result, as in the batch runner, so there
+## is one output line per instance. A closed pipe stops the stream.
+def run_stream(lines, allowed_ops, backend = "list", distance_only = False, encoded = False, profile = False, timing = False) :
+    for line in lines :
+        if not line.strip() :
+            continue
+        try :
+            pi, bpi, biota = line.split()[:3]
+            run_instance(pi, bpi, biota, allowed_ops, backend, distance_only, encoded, profile, timing)
+        except BrokenPipeError :
+            raise
+        except Exception as exception :
+            traceback.print_exc()
+            print("ERROR-CRASH %s" % type(exception).__name__)
+        sys.stdout.flush()
+
+
+MODELS = ("R", "T", "RT")
+
+def main() :
+    parser = argparse.ArgumentParser(description = "Sort a genome (or a stream of them) with rearrangements and indels.",
+                                     usage = "%(prog)s [options] [--] pi breve_pi breve_iota model [backend]\n"
+                                             "       %(prog)s [options] --stream model [file]")
+    parser.add_argument("arguments", nargs = "*",
+                        help = "the three lists, the model and optionally the backend; with --stream, the instance file (- for stdin)")
+    parser.add_argument("--stream", metavar = "MODEL", choices = MODELS,
+                        help = "sort every line of the file (or of stdin) with the given model")
+    parser.add_argument("--backend", choices = sorted(GRAPH_BACKENDS),
+                        help = "graph backend (default: list)")
+    parser.add_argument("--distance", action = "store_true",
+                        help = "print only the distance and the number of operations of each kind")
+    parser.add_argument("--encoded", action = "store_true",
+                        help = "write the operations in base64 instead of their repr")
+    parser.add_argument("--profile", action = "store_true",
+                        help = "time and count the lemmas")
+    parser.add_argument("--timing", action = "store_true",
+                        help = "append the time of each phase")
+
+    args, unknown = parser.parse_known_args()
+    for arg in unknown :
+        if arg[:1] == "-" and arg[1:2].isdigit() :
+            parser.error("%s looks like an option, give the lists after -- (e.g. -- %s ...)" % (arg, arg))
+    if unknown :
+        parser.error("unrecognized arguments: %s" % " ".join(unknown))
+    arguments = args.arguments
+
+    backend = args.backend
+    if args.stream :
+        if len(arguments) > 1 :
+            parser.error("--stream takes at most one file")
+    else :
+        if len(arguments) not in (4, 5) :
+            parser.error("expected pi breve_pi breve_iota model [backend]")
+        if arguments[3] not in MODELS :
+            parser.error("unknown model %s (choose from %s)" % (arguments[3], ", ".join(MODELS)))
+        if len(arguments) == 5 :
+            if backend is not None and backend != arguments[4] :
+                parser.error("two different backends given")
+            backend = arguments[4]
+    backend = backend or "list"
+    if backend not in GRAPH_BACKENDS :
+        parser.error("unknown backend %s (choose from %s)" % (backend, ", ".join(sorted(GRAPH_BACKENDS))))
+
+    options = (backend, args.distance, args.encoded, args.profile, args.timing)
+    if args.stream :
+        try :
+            if arguments and arguments[0] != "-" :
+                with open(arguments[0]) as file :
+                    run_stream(file, args.stream, *options)
+            else :
+                run_stream(sys.stdin, args.stream, *options)
+        except BrokenPipeError :
+            ## The reader is gone (e.g. | head), so we stop. stdout goes
+            ## to devnull so the flush at exit does not fail again.
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            sys.exit(1)
+    else :
+        run_instance(arguments[0], arguments[1], arguments[2], arguments[3], *options)
 
 
+if __name__ == '__main__':
+    main()